@@ -1,8 +1,18 @@
+import json
+import os
+import tempfile
+from pathlib import Path
 import streamlit as st
 import pandas as pd
 import joblib
 import plotly.graph_objects as go
 import plotly.express as px
+from model_registry import ModelRegistry
+from batch_scoring import score_file
+from risk_rules import categoria_imc, risk_flags, fatores_do_paciente
+from percentile_index import PercentileIndex
+from similar_patients import SimilarPatients, load_neighbors
+from audit_log import AuditLog
 
 # ============================================================================
 # FUNÇÃO AUXILIAR PARA FORMATAÇÃO
@@ -224,15 +234,170 @@ with st.sidebar:
 # ============================================================================
 # CARREGAR MODELO
 # ============================================================================
+# Tiers disponíveis: o ensemble completo e o modelo destilado de baixa latência
+# (gerado por ml_pipeline_obesity.py junto com um relatório de fidelidade).
+MODEL_TIERS = {
+    "Completo (Gradient Boosting)": "obesity_pipeline.pkl",  # servido pelo model_registry
+    "Rápido (Árvore destilada)": "obesity_pipeline_lite.pkl",
+}
+
+TIER_COMPLETO = "Completo (Gradient Boosting)"
+VERSAO_AUTOMATICA = "Atual (automático)"
+
 @st.cache_resource
-def load_model():
+def load_model(path="obesity_pipeline.pkl"):
     try:
-        return joblib.load("obesity_pipeline.pkl")
+        return joblib.load(path)
     except FileNotFoundError:
-        st.error("⚠️ Modelo não encontrado! Certifique-se de que o arquivo 'obesity_pipeline.pkl' está no diretório correto.")
+        st.error(f"⚠️ Modelo não encontrado! Certifique-se de que o arquivo '{path}' está no diretório correto.")
         st.stop()
 
-model = load_model()
+@st.cache_resource
+def get_registry():
+    """Registro de versões do modelo completo; uma thread troca o modelo ao publicar nova versão"""
+    return ModelRegistry(fallback_path=MODEL_TIERS[TIER_COMPLETO]).start()
+
+registry = get_registry()
+
+@st.cache_resource
+def get_audit_log():
+    """Log de auditoria do processo: record() só enfileira, uma thread grava em lotes"""
+    return AuditLog().start()
+
+def auditar(registro):
+    """Registra a predição; avisa (sem interromper) se a fila de auditoria estiver saturada"""
+    if not get_audit_log().record(registro):
+        st.warning("⚠️ Registro de auditoria não gravado (fila cheia). Avise o suporte.")
+
+@st.cache_resource
+def get_percentile_index():
+    """Valores ordenados da população de referência por segmento, construídos uma vez por processo"""
+    return PercentileIndex.from_csv("Obesity.csv")
+
+@st.cache_resource(max_entries=4)
+def get_similar_patients(versao, _model):
+    """Índice k-NN salvo pelo treino para esta versão; sem ele, construído do Obesity.csv"""
+    index = load_neighbors(versao)
+    if index is None:
+        from obesity_schema import load_features
+        X_ref, y_ref = load_features("Obesity.csv")
+        index = SimilarPatients.from_model(_model, X_ref, y_ref, model_version=versao)
+    return index
+
+def tier_rapido_vale_a_pena(report="obesity_pipeline_lite_report.json"):
+    """O tier destilado só é oferecido se o relatório do treino mostrar ganho de latência por linha"""
+    try:
+        with open(report, encoding="utf-8") as f:
+            return json.load(f)["latency_ratio_row"] > 1
+    except (OSError, ValueError, KeyError):
+        return False
+
+tiers_disponiveis = [
+    t for t, p in MODEL_TIERS.items()
+    if os.path.exists(p) and (t == TIER_COMPLETO or tier_rapido_vale_a_pena())
+] or [TIER_COMPLETO]
+with st.sidebar:
+    tier_modelo = st.selectbox(
+        "⚙️ Modelo de Predição",
+        tiers_disponiveis,
+        help="O modelo rápido é uma versão destilada do completo, indicada para triagem em alto volume"
+    )
+    versao_fixada, versao_shadow = VERSAO_AUTOMATICA, "Nenhuma"
+    if tier_modelo == TIER_COMPLETO and registry.versions():
+        versao_fixada = st.selectbox(
+            "🏷️ Versão do modelo",
+            [VERSAO_AUTOMATICA] + registry.versions(),
+            help="Fixe uma versão publicada ou acompanhe automaticamente a versão atual do registro"
+        )
+        versao_shadow = st.selectbox(
+            "👥 Comparar com versão (shadow)",
+            ["Nenhuma"] + registry.versions(),
+            help="Executa também esta versão e mostra a predição dela ao lado, sem afetar o resultado"
+        )
+
+if tier_modelo == TIER_COMPLETO:
+    versao_modelo, model = registry.get(None if versao_fixada == VERSAO_AUTOMATICA else versao_fixada)
+    if model is None:
+        st.error(f"⚠️ Modelo não encontrado! Certifique-se de que o arquivo '{MODEL_TIERS[TIER_COMPLETO]}' está no diretório correto.")
+        st.stop()
+else:
+    versao_modelo, model = "destilado", load_model(MODEL_TIERS[tier_modelo])
+
+with st.sidebar:
+    st.caption(f"Versão ativa do modelo: `{versao_modelo}`")
+    modo = st.radio(
+        "📂 Modo de uso",
+        ["Paciente individual", "Predição em lote"],
+        help="Em lote: envie uma planilha (CSV/Parquet) com vários pacientes"
+    )
+
+# ============================================================================
+# PREDIÇÃO EM LOTE (CSV / PARQUET)
+# ============================================================================
+if modo == "Predição em lote":
+    st.markdown("## 📂 Predição em Lote")
+    st.markdown(
+        "Envie um arquivo com as mesmas colunas do formulário (em português ou nos nomes "
+        "originais do dataset). As linhas são validadas com as mesmas faixas dos campos "
+        "individuais e pontuadas em blocos; linhas inválidas recebem o motivo na coluna `status`."
+    )
+    arquivo = st.file_uploader("Arquivo de pacientes", type=["csv", "parquet"])
+    
+    if arquivo is not None and st.button("🔮 Pontuar Arquivo", use_container_width=True):
+        tipo = "parquet" if arquivo.name.lower().endswith(".parquet") else "csv"
+        # Saída num diretório temporário da sessão (apagado quando a sessão termina);
+        # a pontuação anterior é removida antes da nova
+        if "lote_dir" not in st.session_state:
+            st.session_state["lote_dir"] = tempfile.TemporaryDirectory(prefix="predicoes_")
+        anterior = st.session_state.pop("lote_resultado", None)
+        if anterior is not None:
+            Path(anterior[0]).unlink(missing_ok=True)
+        saida = str(Path(st.session_state["lote_dir"].name) / "predicoes.csv")
+        barra = st.progress(0.0, text="Pontuando...")
+        try:
+            resumo = score_file(
+                model, arquivo, saida, kind=tipo,
+                progress=lambda frac, n: barra.progress(frac, text=f"{n:,} linhas pontuadas".replace(",", "."))
+            )
+        except ValueError as e:
+            st.error(f"⚠️ {e}")
+            st.stop()
+        barra.progress(1.0, text="Concluído")
+        st.session_state["lote_resultado"] = (saida, resumo, arquivo.name)
+        # Arquivo enviado e predições ficam arquivados ao lado do log (nome = SHA-256):
+        # o registro aponta para os dois, e a coluna `linha` liga cada predição à entrada
+        registro = {
+            "tipo": "lote",
+            "versao_modelo": versao_modelo,
+            "tier": tier_modelo,
+            "arquivo": arquivo.name,
+            **resumo,
+        }
+        try:
+            log = get_audit_log()
+            registro["entrada_arquivada"], registro["sha256_entrada"] = log.archive(
+                arquivo.getvalue(), Path(arquivo.name).suffix.lower()
+            )
+            registro["saida_arquivada"], registro["sha256_saida"] = log.archive(saida, ".csv")
+        except OSError as e:
+            st.warning(f"⚠️ Arquivos do lote não arquivados na auditoria ({e}). Avise o suporte.")
+        auditar(registro)
+    
+    if "lote_resultado" in st.session_state:
+        saida, resumo, nome = st.session_state["lote_resultado"]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Linhas", f"{resumo['linhas']:,}".replace(",", "."))
+        col2.metric("Válidas", f"{resumo['validas']:,}".replace(",", "."))
+        col3.metric("Inválidas", f"{resumo['invalidas']:,}".replace(",", "."))
+        with open(saida, "rb") as f:
+            st.download_button(
+                "⬇️ Baixar Predições (CSV)",
+                data=f,
+                file_name=f"predicoes_{Path(nome).stem}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+    st.stop()
 
 # ============================================================================
 # INTRODUÇÃO E CONTEXTO
@@ -285,33 +450,19 @@ st.divider()
 # ============================================================================
 # FORMULÁRIO DE ENTRADA DE DADOS
 # ============================================================================
+# Cada widget fora de um form/fragment reexecuta o script inteiro (CSS, sidebar,
+# expanders). Aqui as medidas com o IMC ao vivo formam um fragmento próprio e os
+# demais dados ficam num st.form dentro de outro fragmento junto com os
+# resultados: ajustar sliders não reexecuta nada e o envio reexecuta só ele.
 st.markdown("## 📝 Dados do Paciente")
 
-# Criar abas para organizar melhor os inputs
-tab1, tab2, tab3 = st.tabs(["👤 Dados Pessoais", "🍽️ Hábitos Alimentares", "🏃 Estilo de Vida"])
-
-with tab1:
-    st.markdown("### Informações Demográficas")
+@st.fragment
+def painel_imc():
+    """Altura, peso e IMC calculado: alterar as medidas reexecuta só este trecho"""
+    st.markdown("### Medidas Corporais")
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        genero = st.selectbox(
-            "Gênero",
-            ["Masculino", "Feminino"],
-            help="Selecione o gênero biológico do paciente"
-        )
-    
-    with col2:
-        idade = st.number_input(
-            "Idade (anos)",
-            min_value=0.0,
-            max_value=120.0,
-            value=23.0,
-            step=1.0,
-            help="Idade do paciente em anos completos"
-        )
-    
-    with col3:
         altura = st.number_input(
             "Altura (m)",
             min_value=1.0,
@@ -319,153 +470,172 @@ with tab1:
             value=1.70,
             step=0.01,
             format="%.2f",
+            key="altura",
             help="Altura do paciente em metros"
         )
     
-    with col4:
+    with col2:
         peso = st.number_input(
             "Peso (kg)",
             min_value=20.0,
             max_value=300.0,
             value=70.0,
             step=0.1,
+            key="peso",
             help="Peso atual do paciente em quilogramas"
         )
     
     # Calcular e exibir IMC
-    if altura > 0:
-        imc = peso / (altura ** 2)
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.metric(
-                label="📊 IMC Calculado",
-                value=f"{imc:.2f}",
-                help="Índice de Massa Corporal = Peso / Altura²"
-            )
-        
-        with col2:
-            if imc < 18.5:
-                categoria_imc = "Baixo Peso"
-                cor_imc = "🟢"
-            elif imc < 25:
-                categoria_imc = "Peso Normal"
-                cor_imc = "🟢"
-            elif imc < 30:
-                categoria_imc = "Sobrepeso"
-                cor_imc = "🟡"
-            elif imc < 35:
-                categoria_imc = "Obesidade I"
-                cor_imc = "🟠"
-            elif imc < 40:
-                categoria_imc = "Obesidade II"
-                cor_imc = "🔴"
-            else:
-                categoria_imc = "Obesidade III"
-                cor_imc = "🔴"
-            
-            st.metric(
-                label="Categoria IMC",
-                value=f"{cor_imc} {categoria_imc}"
-            )
-        
-        with col3:
-            historico_familiar = st.selectbox(
-                "Histórico Familiar de Obesidade?",
-                ["Sim", "Não"],
-                help="Algum familiar direto possui histórico de obesidade?"
-            )
-
-with tab2:
-    st.markdown("### Padrões Alimentares")
+    imc = peso / (altura ** 2)
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        favc = st.selectbox(
-            "🍔 Consome alimentos hipercalóricos com frequência?",
-            ["Sim", "Não"],
-            help="Alimentos como fast food, doces, frituras, etc."
-        )
-        
-        fcvc = st.slider(
-            "🥗 Frequência de consumo de vegetais (0-3)",
-            0.0, 3.0, 2.0, 0.5,
-            help="0 = Nunca, 1 = Às vezes, 2 = Frequentemente, 3 = Sempre"
-        )
-        
-        ncp = st.slider(
-            "🍽️ Número de refeições principais por dia (1-4)",
-            1.0, 4.0, 3.0, 1.0,
-            help="Quantas refeições principais você faz por dia?"
-        )
-        
-        ch2o = st.slider(
-            "💧 Litros de água consumidos por dia (1-3)",
-            1.0, 3.0, 2.0, 0.5,
-            help="Quantidade diária de água em litros"
+    with col3:
+        st.metric(
+            label="📊 IMC Calculado",
+            value=f"{imc:.2f}",
+            help="Índice de Massa Corporal = Peso / Altura²"
         )
     
-    with col2:
-        caec = st.selectbox(
-            "🍿 Consome alimentos entre as refeições?",
-            ["Não", "Às vezes", "Frequentemente", "Sempre"],
-            help="Com que frequência belisca entre as refeições?"
-        )
-        
-        scc = st.selectbox(
-            "📊 Monitora as calorias consumidas?",
-            ["Sim", "Não"],
-            help="Você conta ou monitora as calorias que consome?"
-        )
+    with col4:
+        # Mesmas faixas da pontuação em lote e do painel (risk_rules.py)
+        categoria, cor = categoria_imc(imc)
         
-        alcool = st.selectbox(
-            "🍷 Frequência de consumo de álcool",
-            ["Não", "Às vezes", "Frequentemente", "Sempre"],
-            help="Com que frequência consome bebidas alcoólicas?"
+        st.metric(
+            label="Categoria IMC",
+            value=f"{cor[0]} {categoria[0]}"
         )
 
-with tab3:
-    st.markdown("### Atividades e Hábitos")
+painel_imc()
+
+@st.fragment
+def formulario_e_resultados():
+    """Demais dados do paciente (st.form) e resultados da predição"""
+    with st.form("dados_paciente", border=False):
+        # Criar abas para organizar melhor os inputs
+        tab1, tab2, tab3 = st.tabs(["👤 Dados Pessoais", "🍽️ Hábitos Alimentares", "🏃 Estilo de Vida"])
+        
+        with tab1:
+            st.markdown("### Informações Demográficas")
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                genero = st.selectbox(
+                    "Gênero",
+                    ["Masculino", "Feminino"],
+                    help="Selecione o gênero biológico do paciente"
+                )
+            
+            with col2:
+                idade = st.number_input(
+                    "Idade (anos)",
+                    min_value=0.0,
+                    max_value=120.0,
+                    value=23.0,
+                    step=1.0,
+                    help="Idade do paciente em anos completos"
+                )
+            
+            with col3:
+                historico_familiar = st.selectbox(
+                    "Histórico Familiar de Obesidade?",
+                    ["Sim", "Não"],
+                    help="Algum familiar direto possui histórico de obesidade?"
+                )
+        
+        with tab2:
+            st.markdown("### Padrões Alimentares")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                favc = st.selectbox(
+                    "🍔 Consome alimentos hipercalóricos com frequência?",
+                    ["Sim", "Não"],
+                    help="Alimentos como fast food, doces, frituras, etc."
+                )
+                
+                fcvc = st.slider(
+                    "🥗 Frequência de consumo de vegetais (0-3)",
+                    0.0, 3.0, 2.0, 0.5,
+                    help="0 = Nunca, 1 = Às vezes, 2 = Frequentemente, 3 = Sempre"
+                )
+                
+                ncp = st.slider(
+                    "🍽️ Número de refeições principais por dia (1-4)",
+                    1.0, 4.0, 3.0, 1.0,
+                    help="Quantas refeições principais você faz por dia?"
+                )
+                
+                ch2o = st.slider(
+                    "💧 Litros de água consumidos por dia (1-3)",
+                    1.0, 3.0, 2.0, 0.5,
+                    help="Quantidade diária de água em litros"
+                )
+            
+            with col2:
+                caec = st.selectbox(
+                    "🍿 Consome alimentos entre as refeições?",
+                    ["Não", "Às vezes", "Frequentemente", "Sempre"],
+                    help="Com que frequência belisca entre as refeições?"
+                )
+                
+                scc = st.selectbox(
+                    "📊 Monitora as calorias consumidas?",
+                    ["Sim", "Não"],
+                    help="Você conta ou monitora as calorias que consome?"
+                )
+                
+                alcool = st.selectbox(
+                    "🍷 Frequência de consumo de álcool",
+                    ["Não", "Às vezes", "Frequentemente", "Sempre"],
+                    help="Com que frequência consome bebidas alcoólicas?"
+                )
+        
+        with tab3:
+            st.markdown("### Atividades e Hábitos")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                faf = st.slider(
+                    "🏃 Frequência de atividade física (0-3)",
+                    0.0, 3.0, 1.0, 0.5,
+                    help="0 = Sedentário, 1 = 1-2 dias/semana, 2 = 3-4 dias/semana, 3 = 5+ dias/semana"
+                )
+                
+                tue = st.slider(
+                    "📱 Tempo diário em dispositivos eletrônicos (0-3)",
+                    0.0, 3.0, 1.0, 0.5,
+                    help="Horas por dia em celular, TV, computador, videogame, etc."
+                )
+            
+            with col2:
+                fuma = st.selectbox(
+                    "🚬 É fumante?",
+                    ["Não", "Sim"],
+                    help="Fuma cigarros regularmente?"
+                )
+                
+                transp = st.selectbox(
+                    "🚌 Principal meio de transporte",
+                    ["Transporte público", "Caminhada", "Automóvel", "Motocicleta", "Bicicleta"],
+                    help="Qual o meio de transporte mais utilizado no dia a dia?"
+                )
+        
+        st.divider()
+        
+        # ============================================================================
+        # BOTÃO DE PREDIÇÃO E RESULTADOS
+        # ============================================================================
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            predict_button = st.form_submit_button("🔮 Realizar Predição", use_container_width=True)
     
-    col1, col2 = st.columns(2)
+    if not predict_button:
+        return
     
-    with col1:
-        faf = st.slider(
-            "🏃 Frequência de atividade física (0-3)",
-            0.0, 3.0, 1.0, 0.5,
-            help="0 = Sedentário, 1 = 1-2 dias/semana, 2 = 3-4 dias/semana, 3 = 5+ dias/semana"
-        )
-        
-        tue = st.slider(
-            "📱 Tempo diário em dispositivos eletrônicos (0-3)",
-            0.0, 3.0, 1.0, 0.5,
-            help="Horas por dia em celular, TV, computador, videogame, etc."
-        )
+    # Medidas vêm do fragmento painel_imc
+    altura, peso = st.session_state["altura"], st.session_state["peso"]
     
-    with col2:
-        fuma = st.selectbox(
-            "🚬 É fumante?",
-            ["Não", "Sim"],
-            help="Fuma cigarros regularmente?"
-        )
-        
-        transp = st.selectbox(
-            "🚌 Principal meio de transporte",
-            ["Transporte público", "Caminhada", "Automóvel", "Motocicleta", "Bicicleta"],
-            help="Qual o meio de transporte mais utilizado no dia a dia?"
-        )
-
-st.divider()
-
-# ============================================================================
-# BOTÃO DE PREDIÇÃO E RESULTADOS
-# ============================================================================
-col1, col2, col3 = st.columns([1, 2, 1])
-with col2:
-    predict_button = st.button("🔮 Realizar Predição", use_container_width=True)
-
-if predict_button:
     # Criar dataframe com os dados de entrada
     row = pd.DataFrame([{
         "Gênero": genero,
@@ -491,10 +661,19 @@ if predict_button:
         import time
         time.sleep(1)  # Simular processamento
         
-        # Fazer predição
-        pred = model.predict(row)[0]
+        # Fazer predição (uma única passada pelo modelo: a classe é o argmax)
         proba = model.predict_proba(row)[0]
-        classes = model.named_steps["clf"].classes_
+        classes = model.classes_
+        pred = classes[proba.argmax()]
+    
+    auditar({
+        "tipo": "paciente",
+        "versao_modelo": versao_modelo,
+        "tier": tier_modelo,
+        "entrada": row.iloc[0].to_dict(),
+        "classe": pred,
+        "proba": dict(zip(classes, proba)),
+    })
     
     st.divider()
     
@@ -557,6 +736,72 @@ if predict_button:
         </div>
         """, unsafe_allow_html=True)
     
+    # Comparação com a versão shadow (não altera o resultado exibido acima)
+    if versao_shadow not in ("Nenhuma", versao_modelo):
+        _, shadow_model = registry.get(versao_shadow)
+        pred_shadow = shadow_model.predict(row)[0]
+        proba_shadow = shadow_model.predict_proba(row)[0].max() * 100
+        if pred_shadow == pred:
+            st.info(f"👥 Versão shadow `{versao_shadow}` concorda: **{formatar_nome_categoria(pred_shadow)}** ({proba_shadow:.1f}%)")
+        else:
+            st.warning(f"👥 Versão shadow `{versao_shadow}` diverge: **{formatar_nome_categoria(pred_shadow)}** ({proba_shadow:.1f}%)")
+    
+    # ============================================================================
+    # POSIÇÃO NA POPULAÇÃO DE REFERÊNCIA (PERCENTIS)
+    # ============================================================================
+    st.markdown("### 📍 Posição do Paciente na População de Referência")
+    
+    nomes_percentil = {
+        "Idade": "Idade", "Altura": "Altura", "Peso": "Peso", "IMC": "IMC",
+        "FCVC": "Consumo de vegetais", "NCP": "Refeições por dia", "Água por dia": "Água por dia",
+        "Atividade Física": "Atividade física", "Tempo em Telas": "Tempo em telas",
+    }
+    perfil = get_percentile_index().profile(row.iloc[0])
+    perfil["Nome"] = perfil["Feature"].map(nomes_percentil)
+    
+    fig_pct = go.Figure(go.Bar(
+        x=perfil["Percentil"],
+        y=perfil["Nome"],
+        orientation="h",
+        text=[f"{p:.0f}º (valor {v:g})" for p, v in zip(perfil["Percentil"], perfil["Valor"].round(2))],
+        textposition="auto",
+        marker_color=["#f44336" if p >= 90 or p <= 10 else "#667eea" for p in perfil["Percentil"]]
+    ))
+    fig_pct.add_vline(x=50, line_dash="dot", line_color="gray")
+    fig_pct.update_layout(
+        xaxis=dict(title="Percentil", range=[0, 100]),
+        yaxis=dict(autorange="reversed"),
+        height=380,
+        margin=dict(l=20, r=20, t=20, b=40),
+        showlegend=False
+    )
+    st.plotly_chart(fig_pct, use_container_width=True)
+    st.caption(
+        f"Comparação com {perfil['Segmento'].iloc[0]} ({perfil['N'].iloc[0]} pacientes do Obesity.csv). "
+        "Em vermelho, valores nos 10% extremos do grupo."
+    )
+    
+    # ============================================================================
+    # PACIENTES SEMELHANTES NO HISTÓRICO (k-NN)
+    # ============================================================================
+    st.markdown("### 👥 Pacientes Semelhantes no Histórico")
+    
+    vizinhos = get_similar_patients(versao_modelo, model).neighbors(row.iloc[0].to_dict(), k=5)
+    iguais = int((vizinhos["Classe Real"] == pred).sum())
+    mensagem = (f"{iguais} dos 5 pacientes mais parecidos do Obesity.csv têm a classe predita "
+                f"(**{formatar_nome_categoria(pred)}**).")
+    if iguais >= 3:
+        st.success(f"✅ {mensagem}")
+    else:
+        st.warning(f"⚠️ {mensagem} Vale revisar o resultado com atenção.")
+    vizinhos["Classe Real"] = vizinhos["Classe Real"].map(formatar_nome_categoria)
+    st.dataframe(
+        vizinhos.round({"Distância": 2, "Idade": 0, "Altura": 2, "Peso": 1, "Atividade Física": 1}),
+        hide_index=True,
+        use_container_width=True
+    )
+    st.caption("Distância no espaço de features do modelo (numéricas padronizadas + categorias).")
+    
     # Gráfico de probabilidades
     col1, col2 = st.columns(2)
     
@@ -688,28 +933,8 @@ if predict_button:
     with col2:
         st.markdown("### ⚠️ Fatores de Risco Identificados")
         
-        fatores_risco = []
-        
-        if imc >= 30:
-            fatores_risco.append("🔴 IMC elevado (≥30)")
-        if historico_familiar == "Sim":
-            fatores_risco.append("🟡 Histórico familiar de obesidade")
-        if favc == "Sim":
-            fatores_risco.append("🟡 Consumo frequente de alimentos hipercalóricos")
-        if fcvc < 2:
-            fatores_risco.append("🟡 Baixo consumo de vegetais")
-        if faf < 1:
-            fatores_risco.append("🔴 Sedentarismo (atividade física insuficiente)")
-        if ch2o < 2:
-            fatores_risco.append("🟡 Hidratação inadequada")
-        if tue >= 1.5:
-            fatores_risco.append("🟡 Tempo excessivo em telas")
-        if fuma == "Sim":
-            fatores_risco.append("🔴 Tabagismo")
-        if alcool in ["Frequentemente", "Sempre"]:
-            fatores_risco.append("🟠 Consumo frequente de álcool")
-        if transp == "Automóvel":
-            fatores_risco.append("🟡 Baixa atividade física no transporte")
+        # Regras declarativas compartilhadas com a pontuação em lote e o painel
+        fatores_risco = fatores_do_paciente(risk_flags(row).iloc[0])
         
         if fatores_risco:
             for fator in fatores_risco:
@@ -738,6 +963,8 @@ if predict_button:
             hide_index=False
         )
 
+formulario_e_resultados()
+
 # ============================================================================
 # FOOTER
 # ============================================================================
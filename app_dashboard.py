@@ -3,6 +3,16 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
+import plotly.io as pio
+import os
+import threading
+from collections import OrderedDict
+from model_registry import ModelRegistry, content_hash
+from chunked_aggregates import CLASSES_PAINEL, aggregate_file
+from obesity_schema import load_features, target_map_pt, translate_frame
+from risk_rules import avaliar, prevalencia
+from partial_dependence import PAIRS, load_partial_dependence
+from permutation_importance import load_importance
 
 # ============================================================================
 # CONFIGURAÇÃO DA PÁGINA
@@ -103,9 +113,21 @@ st.markdown("""
 # FUNÇÕES DE PRÉ-PROCESSAMENTO E CARREGAMENTO
 # ============================================================================
 
+# Arquivo do painel e modo de leitura: acima de LIMITE_EM_MEMORIA_MB (ou com
+# PAINEL_MODO=chunks) o arquivo não é carregado inteiro; cada recorte é agregado
+# chunk a chunk (chunked_aggregates.py), com PAINEL_JOBS workers
+DATA_PATH = os.environ.get('PAINEL_DADOS', 'Obesity.csv')
+LIMITE_EM_MEMORIA_MB = 200
+CHUNK_JOBS = int(os.environ.get('PAINEL_JOBS', '1'))
+MODO_CHUNKS = (os.environ.get('PAINEL_MODO') == 'chunks'
+               or os.path.getsize(DATA_PATH) > LIMITE_EM_MEMORIA_MB * 2 ** 20)
+
 @st.cache_data
 def load_data():
-    df = pd.read_csv('Obesity.csv')
+    df = pd.read_csv(DATA_PATH)
+    
+    # Categoria de IMC e fatores de risco com as mesmas regras do app (risk_rules.py)
+    riscos = avaliar(translate_frame(df)).drop(columns=['IMC'])
     
     # Renomear colunas
     df.columns = ['Gender', 'Age', 'Height', 'Weight', 'Family_History_with_Overweight',
@@ -113,16 +135,7 @@ def load_data():
                   'TUE', 'CALC', 'MTRANS', 'NObeyesdad']
     
     # Mapear níveis de obesidade
-    obesity_map = {
-        'Insufficient_Weight': 'Baixo Peso',
-        'Normal_Weight': 'Peso Normal',
-        'Overweight_Level_I': 'Sobrepeso I',
-        'Overweight_Level_II': 'Sobrepeso II',
-        'Obesity_Type_I': 'Obesidade I',
-        'Obesity_Type_II': 'Obesidade II',
-        'Obesity_Type_III': 'Obesidade III'
-    }
-    df['NObeyesdad_PT'] = df['NObeyesdad'].replace(obesity_map)
+    df['NObeyesdad_PT'] = df['NObeyesdad'].replace(CLASSES_PAINEL)
     
     # Criar coluna de IMC
     df['IMC'] = df['Weight'] / (df['Height'] ** 2)
@@ -134,9 +147,456 @@ def load_data():
     df['CAEC_PT'] = df['CAEC'].replace({'Sometimes': 'Às vezes', 'Frequently': 'Frequentemente', 'Always': 'Sempre', 'no': 'Não'})
     df['CALC_PT'] = df['CALC'].replace({'Sometimes': 'Às vezes', 'Frequently': 'Frequentemente', 'Always': 'Sempre', 'no': 'Não'})
     
-    return df
+    return df.join(riscos)
+
+@st.cache_data
+def dataset_version(path=DATA_PATH):
+    """Hash do conteúdo do dataset (lido em blocos), usado para invalidar caches derivados"""
+    return content_hash(path)
+
+@st.cache_resource
+def get_registry():
+    """Mesmo registro de modelos do app.py: troca de versão detectada sem reiniciar"""
+    return ModelRegistry().start()
+
+@st.cache_data(max_entries=4, show_spinner="Calculando predições do modelo...")
+def score_dataset(_modelo, versao_modelo, versao_dados, rotulos, path=DATA_PATH):
+    """Predição e confiança para todas as linhas do dataset, uma vez por versão do modelo
+    
+    Um único predict_proba vetorizado; os filtros e agregações do painel usam
+    apenas as colunas resultantes, sem chamar o modelo a cada interação. Tudo
+    que entra no resultado vem dos parâmetros (`rotulos`: classe do modelo ->
+    rótulo do painel), e o índice é o das linhas lidas de `path`.
+    """
+    X, y = load_features(path)
+    proba = _modelo.predict_proba(X)
+    idx = proba.argmax(axis=1)
+    classes = np.array([rotulos.get(c, c) for c in _modelo.classes_], dtype=object)
+    return pd.DataFrame({
+        'Predito_PT': classes[idx],
+        'Confianca': proba[np.arange(len(proba)), idx],
+        'Acerto': classes[idx] == np.array([rotulos.get(c, c) for c in y], dtype=object),
+    }, index=X.index)
+
+@st.cache_data(max_entries=16, show_spinner="Agregando o arquivo em chunks...")
+def aggregate_dataset(filtros, versao_dados, versao_modelo, _modelo, path=DATA_PATH):
+    """Agregados de um recorte (None = arquivo inteiro) lidos em chunks, sem o DataFrame em memória"""
+    return aggregate_file(path, filtros, _modelo, n_jobs=CHUNK_JOBS)
+
+@st.cache_resource
+def get_partial_dependence(versao_modelo):
+    """Curvas PDP/ICE calculadas no treino para esta versão do modelo (None se ausentes)"""
+    return load_partial_dependence(versao_modelo)
+
+@st.cache_resource
+def get_importance(versao_modelo):
+    """Importância por permutação calculada no treino para esta versão do modelo (None se ausente)"""
+    return load_importance(versao_modelo)
+
+# Rótulos do modelo (ex.: Obesidade_I) -> rótulos do painel (ex.: Obesidade I)
+rotulos = {target_map_pt[k]: v for k, v in CLASSES_PAINEL.items()}
+versao_dados = dataset_version()
+versao_modelo, modelo = get_registry().get()
+if MODO_CHUNKS:
+    df = None
+    geral = aggregate_dataset(None, versao_dados, versao_modelo, modelo)  # opções dos filtros
+else:
+    df = load_data()
+    if modelo is not None:
+        df = df.join(score_dataset(modelo, versao_modelo, versao_dados, rotulos))
+
+# Ordem das categorias
+order = ['Baixo Peso', 'Peso Normal', 'Sobrepeso I', 'Sobrepeso II', 'Obesidade I', 'Obesidade II', 'Obesidade III']
+
+# Mapa de cores
+color_map = {
+    'Baixo Peso': '#2196f3',
+    'Peso Normal': '#4caf50',
+    'Sobrepeso I': '#ffc107',
+    'Sobrepeso II': '#ff9800',
+    'Obesidade I': '#ff5722',
+    'Obesidade II': '#f44336',
+    'Obesidade III': '#b71c1c'
+}
+
+# ============================================================================
+# CACHE DE FIGURAS POR ESTADO DE FILTRO (LRU)
+# ============================================================================
+
+class FigureCache:
+    """Cache LRU de figuras serializadas (JSON), limitado pelo tamanho total em bytes"""
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # um objeto compartilhado por todas as sessões
+    
+    def get_or_build(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+        payload = build()
+        nbytes = sum(len(v) for v in payload['figs'].values())
+        with self.lock:
+            if key not in self.entries and nbytes <= self.max_bytes:
+                self.entries[key] = (payload, nbytes)
+                self.size += nbytes
+                while self.size > self.max_bytes:
+                    _, (_, freed) = self.entries.popitem(last=False)
+                    self.size -= freed
+        return payload
+    
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entradas': len(self.entries),
+            'bytes': self.size,
+            'taxa_acerto': self.hits / total if total else 0.0,
+        }
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+def filter_key(genero_filtro, idade_range, hist_familiar_filtro):
+    """Tupla normalizada do estado dos filtros (independe da ordem de seleção)"""
+    return (tuple(sorted(genero_filtro)), tuple(idade_range), tuple(sorted(hist_familiar_filtro)))
+
+def resumo_do_recorte(df_filtered):
+    """Tabelas do painel para um recorte em memória (mesmo formato de CohortAggregate.tabelas())"""
+    total_pacientes = len(df_filtered)
+    kpis = {
+        'total_pacientes': total_pacientes,
+        'perc_obesidade': df_filtered[df_filtered['NObeyesdad'].str.contains('Obesity')].shape[0] / total_pacientes,
+        'media_imc': df_filtered['IMC'].mean(),
+        'media_idade': df_filtered['Age'].mean(),
+        'media_fatores': df_filtered['N Fatores'].mean(),
+    }
+    df_hist = df_filtered.groupby('Family_History_with_Overweight_PT')['NObeyesdad'].value_counts(normalize=True).mul(100).rename('Percentual').reset_index()
+    df_hist_obesity = df_hist[df_hist['NObeyesdad'].str.contains('Obesity')]
+    numeric_cols = ['Age', 'Height', 'Weight', 'IMC', 'FCVC', 'NCP', 'CH2O', 'FAF', 'TUE']
+    tabelas = {
+        'kpis': kpis,
+        'dist': df_filtered['NObeyesdad_PT'].value_counts(),
+        'hist_obesidade': df_hist_obesity.groupby('Family_History_with_Overweight_PT')['Percentual'].sum(),
+        'medias': df_filtered.groupby('NObeyesdad_PT')[['CH2O', 'FAF']].mean(),
+        'corr': df_filtered[numeric_cols].corr().values,
+        'prev': prevalencia(df_filtered, df_filtered['NObeyesdad_PT']),
+        # Valores brutos: o px.box calcula quartis e limites exatos
+        'box': df_filtered[['NObeyesdad_PT', 'IMC', 'Age', 'FAF']],
+    }
+    
+    # Predito x real (colunas pré-calculadas em score_dataset)
+    if 'Predito_PT' in df_filtered.columns:
+        kpis['acuracia_modelo'] = df_filtered['Acerto'].mean()
+        kpis['confianca_media'] = df_filtered['Confianca'].mean()
+        tabelas['cm'] = pd.crosstab(
+            pd.Categorical(df_filtered['NObeyesdad_PT'], categories=order),
+            pd.Categorical(df_filtered['Predito_PT'], categories=order),
+            dropna=False
+        )
+        tabelas['por_classe'] = df_filtered.groupby('NObeyesdad_PT').agg(
+            Acurácia=('Acerto', 'mean'),
+            Confiança=('Confianca', 'mean')
+        )
+    return tabelas
+
+def box_figure(box, coluna, titulo):
+    """Box plot por nível de peso: px.box sobre valores brutos ou go.Box com quartis já calculados"""
+    if isinstance(box, pd.DataFrame):
+        df_box = box.copy()
+        df_box['NObeyesdad_PT'] = pd.Categorical(df_box['NObeyesdad_PT'], categories=order, ordered=True)
+        df_box = df_box.sort_values('NObeyesdad_PT')
+        return px.box(
+            df_box,
+            x='NObeyesdad_PT',
+            y=coluna,
+            color='NObeyesdad_PT',
+            color_discrete_map=color_map,
+            template="plotly_dark",
+            title=titulo
+        )
+    
+    # Modo em chunks: quartis e limites aproximados pelos histogramas do agregado
+    stats = box[coluna].reindex(order).dropna()
+    fig_box = go.Figure([
+        go.Box(
+            name=nivel,
+            x=[nivel],
+            q1=[linha['q1']], median=[linha['median']], q3=[linha['q3']],
+            lowerfence=[linha['lowerfence']], upperfence=[linha['upperfence']],
+            marker_color=color_map[nivel],
+            line_color=color_map[nivel]
+        )
+        for nivel, linha in stats.iterrows()
+    ])
+    fig_box.update_layout(template="plotly_dark", title=titulo)
+    return fig_box
+
+def build_figures(tabelas):
+    """Calcula todas as figuras do painel a partir das tabelas do recorte, em JSON"""
+    figs = {}
+    kpis = tabelas['kpis']
+    
+    # Gráfico 1: Distribuição dos Níveis de Obesidade
+    df_dist = tabelas['dist'].reset_index()
+    df_dist.columns = ['Nível de Peso', 'Contagem']
+    df_dist['Nível de Peso'] = pd.Categorical(df_dist['Nível de Peso'], categories=order, ordered=True)
+    df_dist = df_dist.sort_values('Nível de Peso')
+    
+    fig_dist = px.bar(
+        df_dist, 
+        y='Nível de Peso', 
+        x='Contagem', 
+        orientation='h',
+        color='Nível de Peso',
+        color_discrete_map=color_map,
+        template="plotly_dark",
+        title="Contagem de Pacientes por Nível de Peso"
+    )
+    fig_dist.update_layout(showlegend=False, yaxis_title=None, xaxis_title="Número de Pacientes")
+    figs['dist'] = fig_dist.to_json()
+    
+    # Gráfico 2: Histórico Familiar
+    df_hist_sum = tabelas['hist_obesidade'].rename('Percentual').rename_axis('Family_History_with_Overweight_PT').reset_index()
+    
+    fig_hist = px.pie(
+        df_hist_sum,
+        values='Percentual',
+        names='Family_History_with_Overweight_PT',
+        title='Proporção de Obesidade (I, II, III) por Histórico Familiar',
+        color_discrete_sequence=px.colors.sequential.RdBu
+    )
+    fig_hist.update_traces(textinfo='percent+label')
+    fig_hist.update_layout(showlegend=False, template="plotly_dark")
+    figs['hist'] = fig_hist.to_json()
+    
+    # Gráficos 3 e 4: médias de Consumo de Água e Atividade Física
+    medias = tabelas['medias'].reindex(order).dropna(how='all')
+    for nome, coluna, titulo, eixo_y in [
+        ('ch2o', 'CH2O', "Média de Consumo de Água (Escala 1-3) por Nível de Peso", "Média de Consumo"),
+        ('faf', 'FAF', "Média de Atividade Física (Escala 0-3) por Nível de Peso", "Média de FAF"),
+    ]:
+        df_media = pd.DataFrame({'Nível de Peso': medias.index, f'Média de {coluna}': medias[coluna].to_numpy()})
+        fig_media = px.bar(
+            df_media,
+            x='Nível de Peso',
+            y=f'Média de {coluna}',
+            color=f'Média de {coluna}',
+            template="plotly_dark",
+            title=titulo
+        )
+        fig_media.update_layout(xaxis_title=None, yaxis_title=eixo_y, showlegend=False)
+        figs[nome] = fig_media.to_json()
+    
+    # Heatmap de Correlação (variáveis numéricas relevantes)
+    corr = tabelas['corr']
+    
+    fig_heatmap = go.Figure(data=go.Heatmap(
+        z=corr,
+        x=['Idade', 'Altura', 'Peso', 'IMC', 'Consumo Vegetais', 'Nº Refeições', 'Consumo Água', 'Atividade Física', 'Tempo em Telas'],
+        y=['Idade', 'Altura', 'Peso', 'IMC', 'Consumo Vegetais', 'Nº Refeições', 'Consumo Água', 'Atividade Física', 'Tempo em Telas'],
+        colorscale='RdBu_r',
+        zmid=0,
+        text=np.round(corr, 2),
+        texttemplate='%{text}',
+        textfont={"size": 10},
+        colorbar=dict(title="Correlação")
+    ))
+    
+    fig_heatmap.update_layout(
+        title="Matriz de Correlação entre Variáveis Numéricas",
+        template="plotly_dark",
+        height=600,
+        xaxis_title=None,
+        yaxis_title=None
+    )
+    figs['heatmap'] = fig_heatmap.to_json()
+    
+    # Box Plots: IMC, Idade e Atividade Física
+    for nome, coluna, titulo, eixo_y in [
+        ('box_imc', 'IMC', "Distribuição de IMC", "IMC"),
+        ('box_age', 'Age', "Distribuição de Idade", "Idade (anos)"),
+        ('box_faf', 'FAF', "Distribuição de Atividade Física", "Frequência (0-3)"),
+    ]:
+        fig_box = box_figure(tabelas['box'], coluna, titulo)
+        fig_box.update_layout(
+            showlegend=False,
+            xaxis_title=None,
+            yaxis_title=eixo_y,
+            xaxis={'tickangle': -45}
+        )
+        figs[nome] = fig_box.to_json()
+    
+    # Prevalência de cada fator de risco por nível de peso (colunas de risk_rules)
+    df_prev = tabelas['prev'].reindex(order).dropna(how='all')
+    fig_riscos = px.imshow(
+        df_prev.T.values * 100,
+        x=list(df_prev.index),
+        y=list(df_prev.columns),
+        text_auto='.0f',
+        aspect='auto',
+        color_continuous_scale='OrRd',
+        labels=dict(x="Nível de Peso", y="Fator de Risco", color="% Pacientes"),
+        template="plotly_dark",
+        title="Prevalência dos Fatores de Risco por Nível de Peso (%)"
+    )
+    fig_riscos.update_layout(height=500, xaxis={'tickangle': -45})
+    figs['riscos'] = fig_riscos.to_json()
+    
+    # Predito x real
+    if 'cm' in tabelas:
+        fig_cm = px.imshow(
+            tabelas['cm'].values,
+            x=order,
+            y=order,
+            text_auto=True,
+            color_continuous_scale='Blues',
+            labels=dict(x="Classe Predita", y="Classe Real", color="Pacientes"),
+            template="plotly_dark",
+            title="Matriz de Confusão: Classe Real x Predição do Modelo"
+        )
+        fig_cm.update_layout(height=550)
+        figs['confusao'] = fig_cm.to_json()
+        
+        df_classe = tabelas['por_classe'].reindex(order).dropna().rename_axis('NObeyesdad_PT').reset_index()
+        df_classe = df_classe.melt(id_vars='NObeyesdad_PT', var_name='Métrica', value_name='Valor')
+        
+        fig_classe = px.bar(
+            df_classe,
+            x='NObeyesdad_PT',
+            y='Valor',
+            color='Métrica',
+            barmode='group',
+            template="plotly_dark",
+            title="Acurácia e Confiança Média por Classe Real"
+        )
+        fig_classe.update_layout(
+            xaxis_title=None,
+            yaxis=dict(title=None, tickformat='.0%', range=[0, 1.05]),
+            xaxis={'tickangle': -45},
+            legend_title_text=None
+        )
+        figs['por_classe'] = fig_classe.to_json()
+    
+    return {'kpis': kpis, 'figs': figs}
+
+def density_grid(df_filtered, x_col, y_col, x_range, y_range, bins):
+    """Agrega pacientes numa grade 2D (histogram2d por classe) e retorna um ponto por célula ocupada
+    
+    O tamanho da resposta depende só da resolução da grade (bins x bins), não do número de linhas.
+    """
+    x = df_filtered[x_col].to_numpy(dtype=float)
+    y = df_filtered[y_col].to_numpy(dtype=float)
+    codes = pd.Categorical(df_filtered['NObeyesdad_PT'], categories=order).codes
+    x_edges = np.linspace(x_range[0], x_range[1], bins + 1)
+    y_edges = np.linspace(y_range[0], y_range[1], bins + 1)
+    
+    counts = np.stack([
+        np.histogram2d(x[codes == k], y[codes == k], bins=[x_edges, y_edges])[0]
+        for k in range(len(order))
+    ])  # (classes, bins_x, bins_y)
+    total = counts.sum(axis=0)
+    ix, iy = np.nonzero(total)
+    dominante = counts[:, ix, iy].argmax(axis=0)
+    
+    return pd.DataFrame({
+        x_col: (x_edges[ix] + x_edges[ix + 1]) / 2,
+        y_col: (y_edges[iy] + y_edges[iy + 1]) / 2,
+        'Pacientes': total[ix, iy].astype(int),
+        'Classe Dominante': np.array(order)[dominante],
+        'Participação': counts[dominante, ix, iy] / total[ix, iy],
+    })
+
+def importance_figure(importancias):
+    """Barras horizontais da queda de acurácia por feature, com o desvio entre repetições"""
+    dados = importancias.iloc[::-1]
+    fig = px.bar(
+        dados, x='Importância', y='Feature', orientation='h', error_x='Desvio',
+        template="plotly_dark", color='Importância', color_continuous_scale='Purples',
+        title=f"Queda de acurácia ao embaralhar cada fator ({importancias.attrs['repeticoes']} repetições)"
+    )
+    fig.update_layout(
+        height=520, coloraxis_showscale=False, yaxis_title=None,
+        xaxis=dict(title="Queda de acurácia no holdout", tickformat='.0%')
+    )
+    return fig
+
+def pdp_figures(pdp, feature, classe):
+    """PDP de todas as classes e curvas ICE da classe escolhida, a partir das curvas salvas"""
+    curva = pd.DataFrame(pdp.curves[feature]['pdp'], columns=[rotulos.get(c, c) for c in pdp.classes])
+    curva.insert(0, feature, pdp.curves[feature]['grid'])
+    longo = curva.melt(id_vars=feature, var_name='Classe', value_name='Probabilidade')
+    categorica = pdp.curves[feature]['grid'].dtype == object
+    grafico = px.bar if categorica else px.line
+    fig_pdp = grafico(
+        longo, x=feature, y='Probabilidade', color='Classe',
+        color_discrete_map=color_map, category_orders={'Classe': order},
+        template="plotly_dark", title=f"Probabilidade média prevista x {feature}",
+        **({'barmode': 'group'} if categorica else {})
+    )
+    fig_pdp.update_layout(height=420, yaxis_tickformat='.0%', legend_title_text=None)
+
+    grid = curva[feature]
+    fig_ice = go.Figure()
+    for curva_paciente in pdp.ice(feature, classe):
+        fig_ice.add_trace(go.Scatter(
+            x=grid, y=curva_paciente, mode='lines' if not categorica else 'lines+markers',
+            line=dict(color='rgba(200, 200, 200, 0.25)', width=1), hoverinfo='skip', showlegend=False
+        ))
+    fig_ice.add_trace(go.Scatter(
+        x=grid, y=pdp.curve(feature, classe)['Probabilidade'], mode='lines+markers', name='Média (PDP)',
+        line=dict(color=color_map.get(rotulos.get(classe, classe), '#667eea'), width=4)
+    ))
+    fig_ice.update_layout(
+        template="plotly_dark", height=420, yaxis_tickformat='.0%',
+        title=f"Curvas individuais (ICE): {rotulos.get(classe, classe)}",
+        xaxis_title=feature, yaxis_title="Probabilidade"
+    )
+    return fig_pdp, fig_ice
 
-df = load_data()
+def surface_figure(pdp, pair, classe):
+    """Superfície 2-D salva (probabilidade média da classe na grade do par)"""
+    grid_a, grid_b, z = pdp.surface(pair, classe)
+    fig = go.Figure(go.Heatmap(
+        x=grid_a, y=grid_b, z=z.T, colorscale='Magma', zmin=0, zmax=1,
+        colorbar=dict(title='Prob.', tickformat='.0%'),
+        hovertemplate=f"{pair[0]}: %{{x:.2f}}<br>{pair[1]}: %{{y:.2f}}<br>Probabilidade: %{{z:.1%}}<extra></extra>"
+    ))
+    fig.update_layout(
+        template="plotly_dark", height=480, xaxis_title=pair[0], yaxis_title=pair[1],
+        title=f"{rotulos.get(classe, classe)}: {pair[0]} x {pair[1]}"
+    )
+    return fig
+
+@st.fragment
+def painel_dependencia_parcial(pdp):
+    """Seletores e gráficos de dependência parcial; só este trecho reexecuta ao mudar a seleção"""
+    nomes = {c: rotulos.get(c, c) for c in pdp.classes}
+    col_f, col_c = st.columns(2)
+    with col_f:
+        feature = st.selectbox("Fator", list(pdp.curves), index=list(pdp.curves).index('Atividade Física')
+                               if 'Atividade Física' in pdp.curves else 0)
+    with col_c:
+        classe = st.selectbox("Classe (ICE e superfície)", pdp.classes, format_func=nomes.get,
+                              index=pdp.classes.index('Obesidade_I') if 'Obesidade_I' in pdp.classes else 0)
+
+    fig_pdp, fig_ice = pdp_figures(pdp, feature, classe)
+    col_pdp, col_ice = st.columns(2)
+    with col_pdp:
+        st.plotly_chart(fig_pdp, use_container_width=True)
+    with col_ice:
+        st.plotly_chart(fig_ice, use_container_width=True)
+
+    pares = [p for p in PAIRS if p in pdp.surfaces] or list(pdp.surfaces)
+    par = st.selectbox("Par de fatores", pares, format_func=lambda p: f"{p[0]} x {p[1]}")
+    st.plotly_chart(surface_figure(pdp, par, classe), use_container_width=True)
 
 # ============================================================================
 # FUNÇÃO PRINCIPAL DO DASHBOARD
@@ -159,15 +619,24 @@ def create_dashboard():
         st.markdown("<h1 style='text-align: center; font-size: 5rem;'>🏥</h1>", unsafe_allow_html=True)
         st.title("⚙️ Filtros de Análise")
         
+        # Opções dos filtros: do DataFrame ou, em chunks, do agregado do arquivo inteiro
+        if MODO_CHUNKS:
+            generos = sorted(geral.valores['Gênero'])
+            familias = sorted(geral.valores['Histórico Familiar'])
+            min_age, max_age = int(geral.idade[0]), int(geral.idade[1])
+        else:
+            generos = df['Gender_PT'].unique()
+            familias = df['Family_History_with_Overweight_PT'].unique()
+            min_age, max_age = int(df['Age'].min()), int(df['Age'].max())
+        
         # Filtro de Gênero
         genero_filtro = st.multiselect(
             "Gênero",
-            options=df['Gender_PT'].unique(),
-            default=df['Gender_PT'].unique()
+            options=generos,
+            default=generos
         )
         
         # Filtro de Idade
-        min_age, max_age = int(df['Age'].min()), int(df['Age'].max())
         idade_range = st.slider(
             "Faixa Etária",
             min_value=min_age,
@@ -178,59 +647,64 @@ def create_dashboard():
         # Filtro de Histórico Familiar
         hist_familiar_filtro = st.multiselect(
             "Histórico Familiar de Obesidade",
-            options=df['Family_History_with_Overweight_PT'].unique(),
-            default=df['Family_History_with_Overweight_PT'].unique()
+            options=familias,
+            default=familias
         )
         
-        # Aplicar filtros
-        df_filtered = df[
-            (df['Gender_PT'].isin(genero_filtro)) &
-            (df['Age'] >= idade_range[0]) &
-            (df['Age'] <= idade_range[1]) &
-            (df['Family_History_with_Overweight_PT'].isin(hist_familiar_filtro))
-        ]
+        # Aplicar filtros: em chunks, cada recorte é uma nova passada agregada pelo arquivo
+        filtros = filter_key(genero_filtro, idade_range, hist_familiar_filtro)
+        if MODO_CHUNKS:
+            df_filtered = None
+            tudo = filtros == filter_key(generos, (min_age, max_age), familias)
+            agregado = geral if tudo else aggregate_dataset(filtros, versao_dados, versao_modelo, modelo)
+            total_filtrado = agregado.total
+        else:
+            df_filtered = df[
+                (df['Gender_PT'].isin(genero_filtro)) &
+                (df['Age'] >= idade_range[0]) &
+                (df['Age'] <= idade_range[1]) &
+                (df['Family_History_with_Overweight_PT'].isin(hist_familiar_filtro))
+            ]
+            total_filtrado = len(df_filtered)
         
-        st.info(f"Dados Filtrados: {len(df_filtered)} registros")
+        st.info(f"Dados Filtrados: {total_filtrado} registros")
 
     # Validação de dados
-    if df_filtered.empty:
+    if total_filtrado == 0:
         st.warning("Nenhum dado encontrado com os filtros selecionados.")
         return
 
-    # Ordem das categorias
-    order = ['Baixo Peso', 'Peso Normal', 'Sobrepeso I', 'Sobrepeso II', 'Obesidade I', 'Obesidade II', 'Obesidade III']
-    
-    # Mapa de cores
-    color_map = {
-        'Baixo Peso': '#2196f3',
-        'Peso Normal': '#4caf50',
-        'Sobrepeso I': '#ffc107',
-        'Sobrepeso II': '#ff9800',
-        'Obesidade I': '#ff5722',
-        'Obesidade II': '#f44336',
-        'Obesidade III': '#b71c1c'
-    }
+    # Figuras do recorte: reaproveitadas do cache quando o mesmo filtro já foi visto
+    cache = get_figure_cache()
+    chave = (filtros, versao_dados, versao_modelo)
+    resultado = cache.get_or_build(chave, lambda: build_figures(
+        agregado.tabelas() if MODO_CHUNKS else resumo_do_recorte(df_filtered)
+    ))
+    kpis = resultado['kpis']
+    figs = {nome: pio.from_json(js) for nome, js in resultado['figs'].items()}
+    
+    with st.sidebar:
+        stats = cache.stats()
+        st.caption(
+            f"Cache de gráficos: {stats['entradas']} filtros, "
+            f"{stats['bytes'] / 1024:.0f} KiB, acerto {stats['taxa_acerto'] * 100:.0f}%"
+        )
 
     # ============================================================================
     # MÉTRICAS CHAVE (KPIs)
     # ============================================================================
     st.markdown("### 🔑 Métricas Chave")
     
-    total_pacientes = len(df_filtered)
-    perc_obesidade = df_filtered[df_filtered['NObeyesdad'].str.contains('Obesity')].shape[0] / total_pacientes
-    media_imc = df_filtered['IMC'].mean()
-    media_idade = df_filtered['Age'].mean()
-    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric(label="Total de Pacientes", value=total_pacientes)
+        st.metric(label="Total de Pacientes", value=kpis['total_pacientes'])
     with col2:
-        st.metric(label="Média de Idade", value=f"{media_idade:.1f} anos")
+        st.metric(label="Média de Idade", value=f"{kpis['media_idade']:.1f} anos")
     with col3:
-        st.metric(label="Média de IMC", value=f"{media_imc:.2f}")
+        st.metric(label="Média de IMC", value=f"{kpis['media_imc']:.2f}")
     with col4:
-        st.metric(label="% Obesidade (Tipo I, II, III)", value=f"{perc_obesidade*100:.1f}%")
+        st.metric(label="% Obesidade (Tipo I, II, III)", value=f"{kpis['perc_obesidade']*100:.1f}%")
 
     st.markdown("---")
 
@@ -242,43 +716,17 @@ def create_dashboard():
     # Gráfico 1: Distribuição dos Níveis de Obesidade
     with col_dist:
         st.markdown("### 📊 Distribuição dos Níveis de Peso")
-        
-        df_dist = df_filtered['NObeyesdad_PT'].value_counts().reset_index()
-        df_dist.columns = ['Nível de Peso', 'Contagem']
-        df_dist['Nível de Peso'] = pd.Categorical(df_dist['Nível de Peso'], categories=order, ordered=True)
-        df_dist = df_dist.sort_values('Nível de Peso')
-        
-        fig_dist = px.bar(
-            df_dist, 
-            y='Nível de Peso', 
-            x='Contagem', 
-            orientation='h',
-            color='Nível de Peso',
-            color_discrete_map=color_map,
-            template="plotly_dark",
-            title="Contagem de Pacientes por Nível de Peso"
-        )
-        fig_dist.update_layout(showlegend=False, yaxis_title=None, xaxis_title="Número de Pacientes")
-        st.plotly_chart(fig_dist, use_container_width=True)
+        st.plotly_chart(figs['dist'], use_container_width=True)
 
     # Gráfico 2: Histórico Familiar
     with col_risco:
         st.markdown("### 🧬 Relação: Histórico Familiar")
-        
-        df_hist = df_filtered.groupby('Family_History_with_Overweight_PT')['NObeyesdad'].value_counts(normalize=True).mul(100).rename('Percentual').reset_index()
-        df_hist_obesity = df_hist[df_hist['NObeyesdad'].str.contains('Obesity')]
-        df_hist_sum = df_hist_obesity.groupby('Family_History_with_Overweight_PT')['Percentual'].sum().reset_index()
-        
-        fig_hist = px.pie(
-            df_hist_sum,
-            values='Percentual',
-            names='Family_History_with_Overweight_PT',
-            title='Proporção de Obesidade (I, II, III) por Histórico Familiar',
-            color_discrete_sequence=px.colors.sequential.RdBu
-        )
-        fig_hist.update_traces(textinfo='percent+label')
-        fig_hist.update_layout(showlegend=False, template="plotly_dark")
-        st.plotly_chart(fig_hist, use_container_width=True)
+        st.plotly_chart(figs['hist'], use_container_width=True)
+
+    # Fatores de risco da coorte: mesmas regras do app, avaliadas em todas as linhas
+    st.markdown("### ⚠️ Fatores de Risco na Coorte")
+    st.caption(f"Média de {kpis['media_fatores']:.1f} fatores de risco por paciente no recorte.")
+    st.plotly_chart(figs['riscos'], use_container_width=True)
 
     st.markdown("---")
 
@@ -292,42 +740,12 @@ def create_dashboard():
     # Gráfico 3: Consumo de Água
     with col_habito1:
         st.markdown("#### Média de Consumo de Água (CH2O)")
-        
-        df_ch2o = df_filtered.groupby('NObeyesdad_PT')['CH2O'].mean().reset_index()
-        df_ch2o.columns = ['Nível de Peso', 'Média de CH2O']
-        df_ch2o['Nível de Peso'] = pd.Categorical(df_ch2o['Nível de Peso'], categories=order, ordered=True)
-        df_ch2o = df_ch2o.sort_values('Nível de Peso')
-        
-        fig_ch2o = px.bar(
-            df_ch2o,
-            x='Nível de Peso',
-            y='Média de CH2O',
-            color='Média de CH2O',
-            template="plotly_dark",
-            title="Média de Consumo de Água (Escala 1-3) por Nível de Peso"
-        )
-        fig_ch2o.update_layout(xaxis_title=None, yaxis_title="Média de Consumo", showlegend=False)
-        st.plotly_chart(fig_ch2o, use_container_width=True)
+        st.plotly_chart(figs['ch2o'], use_container_width=True)
 
     # Gráfico 4: Atividade Física
     with col_habito2:
         st.markdown("#### Média de Atividade Física (FAF)")
-        
-        df_faf = df_filtered.groupby('NObeyesdad_PT')['FAF'].mean().reset_index()
-        df_faf.columns = ['Nível de Peso', 'Média de FAF']
-        df_faf['Nível de Peso'] = pd.Categorical(df_faf['Nível de Peso'], categories=order, ordered=True)
-        df_faf = df_faf.sort_values('Nível de Peso')
-        
-        fig_faf = px.bar(
-            df_faf,
-            x='Nível de Peso',
-            y='Média de FAF',
-            color='Média de FAF',
-            template="plotly_dark",
-            title="Média de Atividade Física (Escala 0-3) por Nível de Peso"
-        )
-        fig_faf.update_layout(xaxis_title=None, yaxis_title="Média de FAF", showlegend=False)
-        st.plotly_chart(fig_faf, use_container_width=True)
+        st.plotly_chart(figs['faf'], use_container_width=True)
         
     st.markdown("---")
     
@@ -338,109 +756,93 @@ def create_dashboard():
     
     # Heatmap de Correlação
     st.markdown("#### 🌡️ Mapa de Calor: Correlação entre Variáveis")
+    st.plotly_chart(figs['heatmap'], use_container_width=True)
     
-    # Selecionar variáveis numéricas relevantes
-    numeric_cols = ['Age', 'Height', 'Weight', 'IMC', 'FCVC', 'NCP', 'CH2O', 'FAF', 'TUE']
-    df_corr = df_filtered[numeric_cols].corr()
-    
-    # Criar heatmap
-    fig_heatmap = go.Figure(data=go.Heatmap(
-        z=df_corr.values,
-        x=['Idade', 'Altura', 'Peso', 'IMC', 'Consumo Vegetais', 'Nº Refeições', 'Consumo Água', 'Atividade Física', 'Tempo em Telas'],
-        y=['Idade', 'Altura', 'Peso', 'IMC', 'Consumo Vegetais', 'Nº Refeições', 'Consumo Água', 'Atividade Física', 'Tempo em Telas'],
-        colorscale='RdBu_r',
-        zmid=0,
-        text=np.round(df_corr.values, 2),
-        texttemplate='%{text}',
-        textfont={"size": 10},
-        colorbar=dict(title="Correlação")
-    ))
+    st.markdown("---")
     
-    fig_heatmap.update_layout(
-        title="Matriz de Correlação entre Variáveis Numéricas",
-        template="plotly_dark",
-        height=600,
-        xaxis_title=None,
-        yaxis_title=None
-    )
+    # Dispersão por densidade: IMC x Idade
+    st.markdown("#### 🔭 IMC x Idade por Paciente (densidade)")
+    if MODO_CHUNKS:
+        st.info("Grade de densidade indisponível com o arquivo lido em chunks: o zoom exige as linhas individuais.")
+    else:
+        st.caption(
+            "Cada ponto é uma célula da grade agregada no servidor: o tamanho indica o número de pacientes "
+            "e a cor, a classe predominante. Reduza as faixas para refinar a grade na região de interesse."
+        )
     
-    st.plotly_chart(fig_heatmap, use_container_width=True)
+        imc_min, imc_max = float(np.floor(df['IMC'].min())), float(np.ceil(df['IMC'].max()))
+        age_min, age_max = float(np.floor(df['Age'].min())), float(np.ceil(df['Age'].max()))
+        col_zoom1, col_zoom2, col_zoom3 = st.columns([2, 2, 1])
+        with col_zoom1:
+            zoom_imc = st.slider("Faixa de IMC", imc_min, imc_max, (imc_min, imc_max), step=0.5)
+        with col_zoom2:
+            zoom_idade = st.slider("Faixa de Idade (zoom)", age_min, age_max, (age_min, age_max), step=1.0)
+        with col_zoom3:
+            resolucao = st.select_slider("Resolução", options=[20, 40, 60, 80, 120], value=60)
+    
+        df_grid = density_grid(df_filtered, 'IMC', 'Age', zoom_imc, zoom_idade, resolucao)
+        fig_density = px.scatter(
+            df_grid,
+            x='IMC',
+            y='Age',
+            size='Pacientes',
+            color='Classe Dominante',
+            color_discrete_map=color_map,
+            category_orders={'Classe Dominante': order},
+            hover_data={'Pacientes': True, 'Participação': ':.0%'},
+            size_max=14,
+            template="plotly_dark",
+            title=f"{len(df_grid)} células ({resolucao}x{resolucao}) para {len(df_filtered)} pacientes"
+        )
+        fig_density.update_layout(
+            height=550,
+            xaxis=dict(title="IMC", range=list(zoom_imc)),
+            yaxis=dict(title="Idade (anos)", range=list(zoom_idade)),
+            legend_title_text=None
+        )
+        st.plotly_chart(fig_density, use_container_width=True)
     
     st.markdown("---")
     
     # Box Plots
     st.markdown("#### 📦 Distribuição de Variáveis por Nível de Obesidade")
+    if MODO_CHUNKS:
+        st.caption("Quartis e limites aproximados pelos histogramas agregados em chunks.")
     
     col_box1, col_box2, col_box3 = st.columns(3)
     
-    # Box Plot 1: IMC
     with col_box1:
-        df_box_imc = df_filtered.copy()
-        df_box_imc['NObeyesdad_PT'] = pd.Categorical(df_box_imc['NObeyesdad_PT'], categories=order, ordered=True)
-        df_box_imc = df_box_imc.sort_values('NObeyesdad_PT')
-        
-        fig_box_imc = px.box(
-            df_box_imc,
-            x='NObeyesdad_PT',
-            y='IMC',
-            color='NObeyesdad_PT',
-            color_discrete_map=color_map,
-            template="plotly_dark",
-            title="Distribuição de IMC"
-        )
-        fig_box_imc.update_layout(
-            showlegend=False,
-            xaxis_title=None,
-            yaxis_title="IMC",
-            xaxis={'tickangle': -45}
-        )
-        st.plotly_chart(fig_box_imc, use_container_width=True)
-    
-    # Box Plot 2: Idade
+        st.plotly_chart(figs['box_imc'], use_container_width=True)
     with col_box2:
-        df_box_age = df_filtered.copy()
-        df_box_age['NObeyesdad_PT'] = pd.Categorical(df_box_age['NObeyesdad_PT'], categories=order, ordered=True)
-        df_box_age = df_box_age.sort_values('NObeyesdad_PT')
-        
-        fig_box_age = px.box(
-            df_box_age,
-            x='NObeyesdad_PT',
-            y='Age',
-            color='NObeyesdad_PT',
-            color_discrete_map=color_map,
-            template="plotly_dark",
-            title="Distribuição de Idade"
-        )
-        fig_box_age.update_layout(
-            showlegend=False,
-            xaxis_title=None,
-            yaxis_title="Idade (anos)",
-            xaxis={'tickangle': -45}
-        )
-        st.plotly_chart(fig_box_age, use_container_width=True)
-    
-    # Box Plot 3: Atividade Física
+        st.plotly_chart(figs['box_age'], use_container_width=True)
     with col_box3:
-        df_box_faf = df_filtered.copy()
-        df_box_faf['NObeyesdad_PT'] = pd.Categorical(df_box_faf['NObeyesdad_PT'], categories=order, ordered=True)
-        df_box_faf = df_box_faf.sort_values('NObeyesdad_PT')
-        
-        fig_box_faf = px.box(
-            df_box_faf,
-            x='NObeyesdad_PT',
-            y='FAF',
-            color='NObeyesdad_PT',
-            color_discrete_map=color_map,
-            template="plotly_dark",
-            title="Distribuição de Atividade Física"
-        )
-        fig_box_faf.update_layout(
-            showlegend=False,
-            xaxis_title=None,
-            yaxis_title="Frequência (0-3)",
-            xaxis={'tickangle': -45}
+        st.plotly_chart(figs['box_faf'], use_container_width=True)
+    
+    st.markdown("---")
+    
+    # ============================================================================
+    # PREDIÇÕES DO MODELO X CLASSE REAL
+    # ============================================================================
+    st.markdown("### 🤖 Predições do Modelo x Classe Real")
+    
+    if 'confusao' not in figs:
+        st.info("Nenhum modelo treinado encontrado. Execute ml_pipeline_obesity.py para habilitar esta seção.")
+    else:
+        st.caption(
+            f"Modelo `{versao_modelo}`. As predições do dataset inteiro são calculadas uma vez por versão "
+            "do modelo; como este é o dataset de treino, os valores medem o ajuste, não a generalização."
         )
-        st.plotly_chart(fig_box_faf, use_container_width=True)
+        col_m1, col_m2 = st.columns(2)
+        with col_m1:
+            st.metric(label="Acurácia no Recorte", value=f"{kpis['acuracia_modelo']*100:.1f}%")
+        with col_m2:
+            st.metric(label="Confiança Média", value=f"{kpis['confianca_media']*100:.1f}%")
+        
+        col_pred1, col_pred2 = st.columns([1.2, 1])
+        with col_pred1:
+            st.plotly_chart(figs['confusao'], use_container_width=True)
+        with col_pred2:
+            st.plotly_chart(figs['por_classe'], use_container_width=True)
     
     st.markdown("---")
     
@@ -448,7 +850,33 @@ def create_dashboard():
     # INSIGHTS PARA EQUIPE MÉDICA
     # ============================================================================
     st.markdown("### 💡 Insights para a Equipe Médica")
-    
+
+    st.markdown("#### 🏷️ Fatores Usados pelo Modelo (Importância por Permutação)")
+    importancias = get_importance(versao_modelo) if modelo is not None else None
+    if importancias is None:
+        st.info("Importância dos fatores indisponível para este modelo. "
+                "Execute ml_pipeline_obesity.py para calculá-la.")
+    else:
+        st.caption(
+            f"Modelo com a configuração de `{versao_modelo}` ajustado em 80% dos dados; cada barra é a queda de "
+            f"acurácia nos {importancias.attrs['linhas']} pacientes restantes (base "
+            f"{importancias.attrs['acuracia_base'] * 100:.1f}%) quando o fator é embaralhado entre eles."
+        )
+        st.plotly_chart(importance_figure(importancias), use_container_width=True)
+
+    st.markdown("#### 📈 Efeito de Cada Fator na Predição (Dependência Parcial)")
+    pdp = get_partial_dependence(versao_modelo) if modelo is not None else None
+    if pdp is None:
+        st.info("Curvas de dependência parcial indisponíveis para este modelo. "
+                "Execute ml_pipeline_obesity.py para calculá-las.")
+    else:
+        st.caption(
+            f"Calculadas no treino do modelo `{versao_modelo}` sobre {pdp.n_background} pacientes de referência: "
+            "cada curva varia um fator mantendo os demais como estão e mostra a probabilidade prevista. "
+            "A média é a dependência parcial (PDP); as linhas finas são pacientes individuais (ICE)."
+        )
+        painel_dependencia_parcial(pdp)
+
     with st.expander("Análise Detalhada dos Fatores"):
         st.markdown("""
         O painel acima demonstra correlações importantes que podem guiar a intervenção médica:
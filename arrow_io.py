@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura e escrita em Arrow IPC / Parquet para pontuação e treino.
+
+Caminho de pontuação sem pandas: as colunas numéricas de cada RecordBatch viram
+views NumPy dos buffers Arrow (zero-copy) e são padronizadas direto na matriz de
+features; as categóricas dictionary-encoded têm apenas o *dicionário* traduzido
+e casado com as categorias do OneHotEncoder, e os índices viram one-hot por
+indexação. As predições saem como RecordBatches (classe dictionary-encoded e
+probabilidades float64), mais a categoria de IMC e os fatores de risco de
+risk_rules.py, num arquivo Arrow IPC ou Parquet.
+
+Uso:
+    python arrow_io.py entrada.parquet saida.arrow [--modelo obesity_pipeline.pkl]
+    python arrow_io.py --bench 500000     # vazão e pico de RSS: CSV x Arrow x Parquet
+"""
+import resource, subprocess, sys, time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from obesity_schema import col_map_pt, value_maps_pt, input_ranges
+from obesity_features import BMIFeatures, derived_features
+from risk_rules import REGRAS_RISCO, COLUNAS_SAIDA, avaliar, colunas_saida
+
+BATCH_ROWS = 65_536
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+
+# =========================================================
+# Leitura
+# =========================================================
+def iter_batches(path, batch_rows=BATCH_ROWS):
+    """Itera RecordBatches de um arquivo Arrow IPC (memory-mapped) ou Parquet"""
+    path = Path(path)
+    if path.suffix.lower() in ARROW_SUFFIXES:
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+    else:
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_rows)
+
+
+def read_table(path):
+    """Lê um extrato Arrow/Parquet como DataFrame (para o treino), com as colunas originais"""
+    path = Path(path)
+    if path.suffix.lower() in ARROW_SUFFIXES:
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+    else:
+        table = pq.read_table(path)
+    df = table.to_pandas()
+    # Categóricas chegam como pandas.Categorical; o pipeline espera texto simples
+    for c in df.columns[df.dtypes == "category"]:
+        df[c] = df[c].astype(object)
+    return df
+
+
+def _numeric_view(array):
+    """View NumPy float64 dos buffers Arrow; copia apenas se houver nulos ou outro tipo"""
+    if array.type != pa.float64():
+        array = array.cast(pa.float64())
+    if array.null_count == 0:
+        return array.to_numpy(zero_copy_only=True)
+    return array.to_numpy(zero_copy_only=False)  # nulos viram NaN (e a linha é inválida)
+
+
+def _category_codes(array, column, categories):
+    """Índice na lista `categories` do OneHotEncoder para cada linha (-1 = inválido)
+
+    Só o dicionário (poucos valores distintos) é traduzido e comparado; as linhas
+    são resolvidas por indexação vetorizada dos índices do dicionário.
+    """
+    if not pa.types.is_dictionary(array.type):
+        array = pc.dictionary_encode(array)
+    mapping = value_maps_pt.get(column, {})
+    position = {c: i for i, c in enumerate(categories)}
+    lookup = np.array([position.get(mapping.get(v, v), -1) for v in array.dictionary.to_pylist()] + [-1])
+    idx = array.indices.fill_null(len(lookup) - 1).to_numpy(zero_copy_only=False)
+    return lookup[idx]
+
+
+def batch_model_matrix(batch, prep):
+    """Matriz de features de um RecordBatch equivalente a prep.transform(df)
+
+    Retorna (Z, válidas). Suporta o ColumnTransformer do pipeline de treino
+    (StandardScaler + OneHotEncoder), precedido ou não do passo BMIFeatures;
+    outros pré-processamentos levantam NotImplementedError para que o chamador
+    use o caminho via pandas.
+    """
+    names = {col_map_pt.get(n, n): i for i, n in enumerate(batch.schema.names)}
+    blocks = {name: (est, cols) for name, est, cols in prep.transformers_ if est != "drop"}
+    if set(blocks) != {"num", "cat"}:
+        raise NotImplementedError("Pré-processamento sem caminho Arrow direto")
+    scaler, num_cols = blocks["num"]
+    ohe, cat_cols = blocks["cat"]
+
+    n = batch.num_rows
+    widths = [len(c) for c in ohe.categories_]
+    Z = np.zeros((n, len(num_cols) + sum(widths)))
+    valid = np.ones(n, dtype=bool)
+
+    cols = {col: _numeric_view(batch.column(names[col])) for col in num_cols if col in names}
+    if len(cols) < len(num_cols):
+        cols.update(derived_features(cols))  # colunas do passo "feat", calculadas sobre as views
+    for j, col in enumerate(num_cols):
+        x = cols[col]
+        lo, hi = input_ranges.get(col, (-np.inf, np.inf))
+        valid &= (x >= lo) & (x <= hi)  # NaN falha nas duas comparações
+        np.subtract(x, scaler.mean_[j], out=Z[:, j])
+        Z[:, j] /= scaler.scale_[j]
+
+    base = len(num_cols)
+    rows = np.arange(n)
+    for col, cats, width in zip(cat_cols, ohe.categories_, widths):
+        codes = _category_codes(batch.column(names[col]), col, list(cats))
+        ok = codes >= 0
+        valid &= ok
+        Z[rows[ok], base + codes[ok]] = 1.0
+        base += width
+    return Z, valid
+
+
+def direct_prep(prefix):
+    """O `prep` do prefixo se batch_model_matrix o reproduz ([feat BMIFeatures] -> prep), senão None"""
+    steps = [name for name, _ in getattr(prefix, "steps", [])]
+    if steps == ["prep"] or (steps == ["feat", "prep"] and type(prefix.named_steps["feat"]) is BMIFeatures):
+        return prefix.named_steps["prep"]
+    return None
+
+
+# =========================================================
+# Pontuação e escrita
+# =========================================================
+def predictions_batch(proba, valid, classes, offset):
+    """RecordBatch de saída: linha, classe (dictionary) e probabilidades por classe"""
+    n = len(proba)
+    pred_idx = pa.array(proba.argmax(axis=1).astype(np.int8), mask=~valid)
+    cols = [
+        pa.array(np.arange(offset, offset + n, dtype=np.int64)),
+        pa.DictionaryArray.from_arrays(pred_idx, pa.array(list(classes))),
+    ]
+    probaT = np.ascontiguousarray(proba.T)  # cada classe vira um buffer contíguo
+    cols += [pa.array(p, mask=~valid) for p in probaT]
+    names = ["linha", "predicao"] + [f"prob_{c}" for c in classes]
+    return pa.RecordBatch.from_arrays(cols, names=names)
+
+
+def risk_frame(batch):
+    """Categoria de IMC e fatores de risco do lote, lendo só as colunas usadas pelas regras"""
+    from obesity_schema import translate_frame
+    usadas = {"Altura", "Peso"} | {r.coluna for r in REGRAS_RISCO}
+    names = [n for n in batch.schema.names if col_map_pt.get(n, n) in usadas]
+    df = batch.select(names).to_pandas()
+    for c in df.columns[df.dtypes == "category"]:
+        df[c] = df[c].astype(object)
+    return colunas_saida(avaliar(translate_frame(df)))
+
+
+def with_risk_columns(rb, risk):
+    """Acrescenta ao RecordBatch de predições as colunas de risk_rules (categoria como dictionary)"""
+    arrays = [pa.array(risk[c]) for c in risk.columns]
+    return pa.RecordBatch.from_arrays(rb.columns + arrays, names=rb.schema.names + list(risk.columns))
+
+
+def score_arrow(pipe, src, dst, batch_rows=BATCH_ROWS):
+    """Pontua um Arrow/Parquet gravando predições em Arrow IPC ou Parquet (pelo sufixo)"""
+    # Só Pipelines conhecidos vão pelo caminho direto; o resto (ex.: FoldEnsemble) via pandas
+    prep = direct_prep(pipe[:-1]) if hasattr(pipe, "steps") else None
+    direct = prep is not None
+    if direct:
+        clf = pipe.steps[-1][1]
+    classes = list(pipe.classes_)
+    writer = None
+    n_rows = n_valid = 0
+    try:
+        for batch in iter_batches(src, batch_rows):
+            if direct:
+                Z, valid = batch_model_matrix(batch, prep)
+                proba = np.zeros((len(Z), len(classes)))
+                if valid.any():
+                    proba[valid] = clf.predict_proba(Z[valid])
+                risk = risk_frame(batch)
+            else:
+                from batch_scoring import score_chunk
+                out = score_chunk(pipe, batch.to_pandas(), classes)
+                valid = (out["status"] == "ok").to_numpy()
+                proba = np.nan_to_num(out[[f"prob_{c}" for c in classes]].to_numpy())
+                risk = out[COLUNAS_SAIDA]  # já calculadas por score_chunk
+            rb = with_risk_columns(predictions_batch(proba, valid, classes, n_rows), risk)
+            if writer is None:
+                if Path(dst).suffix.lower() in ARROW_SUFFIXES:
+                    writer = pa.ipc.new_file(str(dst), rb.schema)
+                else:
+                    writer = pq.ParquetWriter(str(dst), rb.schema)
+            writer.write_batch(rb)
+            n_rows += len(rb)
+            n_valid += int(valid.sum())
+    finally:
+        if writer is not None:
+            writer.close()
+    return {"linhas": n_rows, "validas": n_valid, "invalidas": n_rows - n_valid}
+
+
+# =========================================================
+# Benchmark: CSV x Arrow IPC x Parquet
+# =========================================================
+def _run_mode(mode, src, dst, model_path):
+    import joblib
+    pipe = joblib.load(model_path)
+    t0 = time.perf_counter()
+    if mode == "csv":
+        from batch_scoring import score_file
+        with open(src, "rb") as f:
+            res = score_file(pipe, f, dst)
+    else:
+        res = score_arrow(pipe, src, dst)
+    elapsed = time.perf_counter() - t0
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB no Linux
+    print(f"{mode:>8}: {res['linhas'] / elapsed:>10,.0f} linhas/s  pico RSS {rss_mb:,.0f} MiB")
+
+
+def benchmark(n_rows, csv_path="Obesity.csv", model_path="obesity_pipeline.pkl", workdir="."):
+    """Gera extratos de n_rows linhas e mede cada caminho num processo novo"""
+    import pandas as pd
+    work = Path(workdir)
+    df = pd.read_csv(csv_path).drop(columns=["Obesity"])
+    df = df.sample(n_rows, replace=True, random_state=0).reset_index(drop=True)
+    files = {"csv": work / "bench_in.csv", "arrow": work / "bench_in.arrow", "parquet": work / "bench_in.parquet"}
+    df.to_csv(files["csv"], index=False)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Texto repetitivo -> dictionary-encoded, como nos extratos do warehouse
+    table = table.cast(pa.schema([
+        pa.field(f.name, pa.dictionary(pa.int8(), pa.string())) if pa.types.is_string(f.type) or pa.types.is_large_string(f.type) else f
+        for f in table.schema
+    ]))
+    with pa.ipc.new_file(str(files["arrow"]), table.schema) as w:
+        for rb in table.to_batches(max_chunksize=BATCH_ROWS):
+            w.write_batch(rb)
+    pq.write_table(table, files["parquet"], row_group_size=BATCH_ROWS)
+    for mode, src in files.items():
+        dst = work / ("bench_out.csv" if mode == "csv" else f"bench_out.{mode}")
+        subprocess.run([sys.executable, __file__, "--run-mode", mode, str(src), str(dst), "--modelo", model_path], check=True)
+
+
+if __name__ == "__main__":
+    import argparse, joblib
+
+    parser = argparse.ArgumentParser(description="Pontuação via Arrow IPC / Parquet")
+    parser.add_argument("entrada", nargs="?")
+    parser.add_argument("saida", nargs="?")
+    parser.add_argument("--modelo", default="obesity_pipeline.pkl")
+    parser.add_argument("--bench", type=int, metavar="N_LINHAS")
+    parser.add_argument("--run-mode", choices=["csv", "arrow", "parquet"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.bench, model_path=args.modelo)
+    elif args.run_mode:
+        _run_mode(args.run_mode, args.entrada, args.saida, args.modelo)
+    elif args.entrada and args.saida:
+        print(score_arrow(joblib.load(args.modelo), args.entrada, args.saida))
+    else:
+        parser.error("informe entrada e saída, ou --bench")
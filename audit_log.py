@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Log de auditoria append-only das predições, gravado em lotes por uma thread.
+
+O app só enfileira o registro (fila limitada, microssegundos); uma thread em
+segundo plano agrupa os registros e grava cada lote com um único write em
+segmentos binários dentro de audit_log/:
+
+    audit-000001.log = MAGIC + registros
+    registro         = <u32 tamanho><u32 crc32> + JSON UTF-8 compacto
+
+Segmentos nunca são reescritos: cada processo cria o próprio segmento (criação
+exclusiva, O_EXCL, então dois processos nunca gravam no mesmo arquivo) e troca
+de segmento ao passar de `segment_bytes`. Uma gravação interrompida deixa no máximo
+um registro truncado no fim do segmento, que o leitor detecta pelo tamanho/CRC.
+
+Política de fsync (durabilidade x custo de disco, nunca no caminho da predição):
+    "lote"       fsync após cada lote gravado (padrão)
+    "intervalo"  no máximo um fsync a cada `fsync_interval` segundos
+    "nunca"      deixa a descarga para o sistema operacional
+
+Fila cheia nunca bloqueia a requisição: record() usa put_nowait e, se o
+escritor não acompanhar, devolve False e conta o registro como descartado.
+
+Lotes (pontuação de arquivos) não cabem num registro: archive() guarda uma
+cópia imutável do arquivo enviado e do CSV de predições em audit_log/lotes/,
+nomeada pelo SHA-256 do conteúdo, e o registro do lote aponta para as duas.
+
+Uso:
+    python audit_log.py [audit_log] [--ultimos 20] [--csv auditoria.csv]
+    python audit_log.py --bench 100000        # latência de record() e vazão por política
+"""
+import atexit, hashlib, json, os, queue, shutil, struct, sys, threading, time, uuid, zlib
+from pathlib import Path
+
+AUDIT_DIR = Path("audit_log")
+MAGIC = b"OBAUDIT1"
+HEADER = struct.Struct("<II")  # tamanho do payload, crc32 do payload
+FSYNC_POLICIES = ("lote", "intervalo", "nunca")
+ARCHIVE_DIR = "lotes"
+
+
+def _json_default(value):
+    # Escalares NumPy/pandas (probabilidades, colunas do DataFrame de entrada)
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def encode_record(record):
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class AuditLog:
+    """Fila limitada + thread escritora que grava lotes em segmentos append-only"""
+
+    def __init__(self, directory=AUDIT_DIR, max_queue=10_000, batch_records=512, flush_interval=1.0,
+                 fsync="lote", fsync_interval=5.0, segment_bytes=64 << 20):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync deve ser um de {FSYNC_POLICIES}")
+        self.directory = Path(directory)
+        self.batch_records = batch_records
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._file = None
+        self._segment = self._last_segment()
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()  # contadores atualizados por várias sessões
+        self.counts = {"registrados": 0, "gravados": 0, "descartados": 0, "lotes": 0, "fsyncs": 0}
+
+    # -----------------------------------------------------------------
+    # Lado do app
+    # -----------------------------------------------------------------
+    def record(self, record):
+        """Enfileira um registro (com carimbo de tempo); False, sem esperar, se a fila estiver cheia"""
+        record = {"ts": time.time(), **record}
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.counts["descartados"] += 1
+            return False
+        with self._lock:
+            self.counts["registrados"] += 1
+        return True
+
+    def archive(self, source, suffix=""):
+        """Cópia imutável de `source` (caminho ou bytes) em lotes/<sha256><suffix>
+
+        Retorna (caminho relativo ao diretório do log, sha256). Conteúdo repetido
+        reaproveita o arquivo existente.
+        """
+        folder = self.directory / ARCHIVE_DIR
+        folder.mkdir(parents=True, exist_ok=True)
+        tmp = folder / f".tmp-{uuid.uuid4().hex}"
+        h = hashlib.sha256()
+        with open(tmp, "wb") as out:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                h.update(source)
+                out.write(source)
+            else:
+                with open(source, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        h.update(block)
+                        out.write(block)
+            out.flush()
+            os.fsync(out.fileno())
+        digest = h.hexdigest()
+        target = folder / f"{digest}{suffix}"
+        if target.exists():
+            tmp.unlink()
+        else:
+            os.replace(tmp, target)
+        return f"{ARCHIVE_DIR}/{target.name}", digest
+
+    def flush(self, timeout=None):
+        """Espera o escritor gravar (e sincronizar) tudo que foi enfileirado até agora"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def start(self):
+        if self._thread is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)  # grava o que ainda estiver na fila ao encerrar
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {**self.counts, "fila": self._queue.qsize(), "segmento": self._segment}
+
+    # -----------------------------------------------------------------
+    # Thread escritora
+    # -----------------------------------------------------------------
+    def _last_segment(self):
+        segs = sorted(self.directory.glob("audit-*.log"))
+        return int(segs[-1].stem.split("-")[1]) if segs else 0
+
+    def _open_next_segment(self):
+        if self._file is not None:
+            self._sync(force=True)
+            self._file.close()
+        # Criação exclusiva: se outro processo já pegou o número, tenta o seguinte
+        self._segment = max(self._segment, self._last_segment())
+        while True:
+            self._segment += 1
+            path = self.directory / f"audit-{self._segment:06d}.log"
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+            except FileExistsError:
+                continue
+            break
+        self._file = os.fdopen(fd, "ab", buffering=0)
+        self._file.write(MAGIC)
+        self._sync(force=self.fsync != "nunca")
+
+    def _sync(self, force=False):
+        if self._file is None:
+            return
+        now = time.monotonic()
+        if force or self.fsync == "lote" or (self.fsync == "intervalo" and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+            self.counts["fsyncs"] += 1
+
+    def _write(self, records):
+        data = b"".join(encode_record(r) for r in records)
+        # Segmento novo por processo (nunca continua um arquivo possivelmente truncado)
+        if self._file is None or self._file.tell() + len(data) > self.segment_bytes:
+            self._open_next_segment()
+        self._file.write(data)
+        self.counts["gravados"] += len(records)
+        self.counts["lotes"] += 1
+        self._sync()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, waiters = [], []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = False
+            while item is not False:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_records:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = False
+            try:
+                if batch:
+                    self._write(batch)
+                if waiters or stop:
+                    self._sync(force=self.fsync != "nunca")
+                elif not batch and self.fsync == "intervalo":
+                    self._sync()  # fila ociosa: sincroniza o que ficou do último lote
+            except OSError as exc:  # disco cheio, permissão...: o app continua respondendo
+                with self._lock:
+                    self.counts["descartados"] += len(batch)
+                print(f"[audit_log] falha ao gravar lote: {exc}", file=sys.stderr)
+            for w in waiters:
+                w.set()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# =========================================================
+# Leitura
+# =========================================================
+def iter_records(directory=AUDIT_DIR):
+    """Registros de todos os segmentos, em ordem; para no primeiro registro truncado/corrompido"""
+    for path in sorted(Path(directory).glob("audit-*.log")):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                print(f"[audit_log] {path.name}: cabeçalho inválido, ignorado", file=sys.stderr)
+                continue
+            while True:
+                head = f.read(HEADER.size)
+                if not head:
+                    break
+                if len(head) < HEADER.size:
+                    print(f"[audit_log] {path.name}: registro truncado no fim do segmento", file=sys.stderr)
+                    break
+                size, crc = HEADER.unpack(head)
+                payload = f.read(size)
+                if len(payload) < size or zlib.crc32(payload) != crc:
+                    print(f"[audit_log] {path.name}: registro truncado/corrompido no byte {f.tell()}", file=sys.stderr)
+                    break
+                yield json.loads(payload)
+
+
+def read_frame(directory=AUDIT_DIR):
+    """Registros como DataFrame, com entradas e probabilidades em colunas próprias"""
+    import pandas as pd
+    return pd.json_normalize(list(iter_records(directory)), sep=".")
+
+
+# =========================================================
+# Benchmark: custo de record() no caminho da predição
+# =========================================================
+def benchmark(n_records, directory):
+    import shutil
+    import numpy as np
+
+    exemplo = {
+        "tipo": "paciente", "versao_modelo": "0123456789ab", "tier": "Completo",
+        "entrada": {"Gênero": "Feminino", "Idade": 23.0, "Altura": 1.62, "Peso": 64.0, "FCVC": 2.0,
+                    "Atividade Física": 0.5, "Transporte": "Transporte público"},
+        "classe": "Peso_normal", "proba": {f"classe_{i}": 1 / 7 for i in range(7)},
+    }
+    print(f"{'fsync':<11}{'p50':>9}{'p99':>9}{'máx':>10}{'vazão':>16}{'lotes':>7}{'fsyncs':>8}{'MiB':>7}")
+    for policy in FSYNC_POLICIES:
+        path = Path(directory) / f"bench_{policy}"
+        shutil.rmtree(path, ignore_errors=True)
+        log = AuditLog(path, fsync=policy).start()
+        lat = np.empty(n_records)
+        t0 = time.perf_counter()
+        for i in range(n_records):
+            t = time.perf_counter()
+            log.record(exemplo)
+            lat[i] = time.perf_counter() - t
+        log.flush()
+        elapsed = time.perf_counter() - t0
+        log.close()
+        assert sum(1 for _ in iter_records(path)) == n_records
+        size = sum(p.stat().st_size for p in path.glob("*.log")) / 2 ** 20
+        us = np.percentile(lat, [50, 99]) * 1e6
+        print(f"{policy:<11}{us[0]:>7.1f}µs{us[1]:>7.1f}µs{lat.max() * 1e3:>8.2f}ms"
+              f"{n_records / elapsed:>11,.0f} reg/s{log.counts['lotes']:>7}{log.counts['fsyncs']:>8}{size:>7.1f}")
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Leitura do log de auditoria das predições")
+    parser.add_argument("diretorio", nargs="?", default=str(AUDIT_DIR))
+    parser.add_argument("--ultimos", type=int, default=20, help="mostra os N registros mais recentes")
+    parser.add_argument("--csv", help="exporta todos os registros para este CSV")
+    parser.add_argument("--bench", type=int, metavar="N_REGISTROS")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.bench, args.diretorio)
+    else:
+        import pandas as pd
+        df = read_frame(args.diretorio)
+        print(f"{len(df)} registros em {args.diretorio}")
+        if len(df):
+            df["ts"] = pd.to_datetime(df["ts"], unit="s")
+            print(df.tail(args.ultimos).to_string(index=False))
+        if args.csv:
+            df.to_csv(args.csv, index=False)
+            print("Exportado para", args.csv)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Pontuação em lote de planilhas de pacientes (CSV ou Parquet).
+
+O arquivo é lido e pontuado em chunks: cada chunk é traduzido para PT-BR,
+validado de forma vetorizada contra as mesmas faixas do formulário do app.py,
+pontuado e escrito imediatamente no CSV de saída. Apenas um chunk de resultados
+existe em memória por vez.
+
+Uso pela linha de comando:
+    python batch_scoring.py entrada.csv saida.csv [--workers N]
+    python batch_scoring.py entrada.csv --curva        # escalabilidade de 1 a N núcleos
+"""
+import io
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from obesity_schema import translate_frame, input_ranges, input_categories, feature_order
+from risk_rules import avaliar, colunas_saida
+
+CHUNK_SIZE = 50_000
+
+
+def iter_input_chunks(source, kind="csv", chunksize=CHUNK_SIZE):
+    """Itera (chunk, fração_lida) sobre um CSV ou Parquet sem carregá-lo inteiro"""
+    if kind == "parquet":
+        import pyarrow.parquet as pq  # dependência do próprio streamlit
+        pf = pq.ParquetFile(source)
+        total, done = max(pf.metadata.num_rows, 1), 0
+        for batch in pf.iter_batches(batch_size=chunksize):
+            done += batch.num_rows
+            yield batch.to_pandas(), done / total
+        return
+
+    handle = source
+    total = None
+    if hasattr(handle, "seek"):
+        handle.seek(0, 2)
+        total = max(handle.tell(), 1)
+        handle.seek(0)
+    for chunk in pd.read_csv(handle, chunksize=chunksize):
+        # Posição do arquivo é aproximada (o leitor usa buffer), suficiente para progresso
+        yield chunk, min(handle.tell() / total, 1.0) if total else 0.0
+
+
+def validate_chunk(df):
+    """Valida um chunk já traduzido; retorna (máscara de linhas válidas, motivo por linha)
+
+    Levanta ValueError se faltar alguma coluna de entrada do modelo.
+    """
+    missing = [c for c in feature_order if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas ausentes no arquivo: {', '.join(missing)}")
+
+    invalid = {}
+    for col, (lo, hi) in input_ranges.items():
+        values = pd.to_numeric(df[col], errors="coerce")
+        invalid[col] = ~values.between(lo, hi).to_numpy()  # NaN também é inválido
+    for col, options in input_categories.items():
+        invalid[col] = ~df[col].isin(options).to_numpy()
+
+    flags = pd.DataFrame(invalid, index=df.index)
+    bad = flags.to_numpy()
+    valid = ~bad.any(axis=1)
+    # Motivo: nomes das colunas inválidas, montado só para as linhas com erro
+    reasons = np.full(len(df), "", dtype=object)
+    if not valid.all():
+        cols = np.array(flags.columns)
+        reasons[~valid] = ["inválido: " + ", ".join(cols[row]) for row in bad[~valid]]
+    return valid, reasons
+
+
+def score_chunk(model, df, classes, offset=0):
+    """Traduz, valida e pontua um chunk; retorna o DataFrame de saída do chunk"""
+    df = translate_frame(df)
+    valid, reasons = validate_chunk(df)
+
+    out = pd.DataFrame({"linha": np.arange(offset, offset + len(df))})
+    out["status"] = np.where(valid, "ok", reasons)
+    proba = np.full((len(df), len(classes)), np.nan)
+    if valid.any():
+        X = df.loc[valid, feature_order]
+        for c in input_ranges:
+            X[c] = X[c].astype(float)
+        proba[valid] = model.predict_proba(X)
+    pred = np.where(valid, np.asarray(classes, dtype=object)[np.nan_to_num(proba).argmax(axis=1)], "")
+    out["predicao"] = pred
+    for j, c in enumerate(classes):
+        out[f"prob_{c}"] = proba[:, j]
+    # Categoria de IMC e fatores de risco (risk_rules.py), vetorizados sobre o chunk
+    return out.join(colunas_saida(avaliar(df)).reset_index(drop=True))
+
+
+def score_file(model, source, out_path, kind="csv", chunksize=CHUNK_SIZE, progress=None):
+    """Pontua `source` chunk a chunk gravando em `out_path` (CSV); retorna contagens"""
+    classes = list(model.classes_)
+    n_rows = n_valid = 0
+    with open(out_path, "w", encoding="utf-8", newline="") as out:
+        for chunk, frac in iter_input_chunks(source, kind, chunksize):
+            result = score_chunk(model, chunk, classes, offset=n_rows)
+            result.to_csv(out, header=n_rows == 0, index=False)
+            n_rows += len(result)
+            n_valid += int((result["status"] == "ok").sum())
+            if progress is not None:
+                progress(frac, n_rows)
+    return {"linhas": n_rows, "validas": n_valid, "invalidas": n_rows - n_valid}
+
+
+# =========================================================
+# Pontuação paralela (multiprocessos, modelo compartilhado via fork)
+# =========================================================
+# O modelo é carregado uma vez no processo pai e fica numa global antes do fork:
+# os workers herdam as páginas de memória (copy-on-write), inclusive os arrays
+# das árvores, sem desserializar o pickle de novo. gc.freeze() evita que o coletor
+# toque nos objetos herdados e force cópias das páginas.
+_SHARED_MODEL = None
+RANGE_BYTES = 32 << 20
+_BLANK_STARTS = (b"\n\n", b"\n\r", b"\n ", b"\n\t")  # inícios possíveis de linha em branco
+
+
+def count_csv_rows(data):
+    """Registros de um trecho de CSV como o pd.read_csv os conta (linhas em branco não contam)
+
+    Levanta ValueError se alguma linha tiver aspas desbalanceadas, isto é, uma
+    quebra de linha dentro de um campo entre aspas.
+    """
+    # Caso comum (sem aspas e nenhuma linha começando por espaço ou quebra): uma linha por registro
+    if b'"' not in data and data[:1] not in b"\n\r \t" and not any(p in data for p in _BLANK_STARTS):
+        return data.count(b"\n") + bool(data[data.rfind(b"\n") + 1:].strip(b" \t\r"))
+    a = np.frombuffer(data, dtype=np.uint8)
+    nl = np.flatnonzero(a == ord("\n"))
+    ends = nl if len(a) and a[-1] == ord("\n") else np.append(nl, len(a))
+    starts = np.concatenate([[0], nl + 1])[:len(ends)]
+    # Linhas só com espaços, tabs ou "\r" são puladas pelo leitor
+    visible = np.concatenate([[0], np.cumsum(~np.isin(a, np.frombuffer(b" \t\r\n", dtype=np.uint8)))])
+    quotes = np.flatnonzero(a == ord('"'))
+    if len(quotes) and ((np.searchsorted(quotes, ends) - np.searchsorted(quotes, starts)) % 2).any():
+        raise ValueError("quebra de linha dentro de campo entre aspas")
+    return int((visible[ends] > visible[starts]).sum())
+
+
+def csv_byte_ranges(path, range_bytes=RANGE_BYTES):
+    """Divide o CSV em faixas de bytes alinhadas a quebras de linha
+
+    Retorna (cabeçalho, [(início, fim, n_registros), ...]); sem faixas para um
+    arquivo vazio ou só com cabeçalho. Levanta ValueError se houver quebras de
+    linha dentro de campos entre aspas (as faixas cortariam registros).
+    """
+    import mmap
+    if Path(path).stat().st_size == 0:
+        return b"", []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        header_end = mm.find(b"\n") + 1 or size
+        header = mm[:header_end]
+        count_csv_rows(header)
+        ranges, start = [], header_end
+        while start < size:
+            end = min(start + range_bytes, size)
+            if end < size:
+                nl = mm.find(b"\n", end)
+                end = size if nl < 0 else nl + 1
+            ranges.append((start, end, count_csv_rows(mm[start:end])))
+            start = end
+    return header, ranges
+
+
+def _score_range(task):
+    path, header, start, end, offset, part_path, write_header = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    chunk = pd.read_csv(io.BytesIO(header + data))
+    result = score_chunk(_SHARED_MODEL, chunk, list(_SHARED_MODEL.classes_), offset=offset)
+    result.to_csv(part_path, header=write_header, index=False)
+    return len(result), int((result["status"] == "ok").sum())
+
+
+def score_file_parallel(model, path, out_path, n_workers=None, range_bytes=RANGE_BYTES, progress=None):
+    """Pontua um CSV em paralelo; a saída é idêntica à de score_file, na mesma ordem
+
+    Cai para o modo sequencial quando o sistema não suporta fork, quando o
+    arquivo não tem linhas de dados ou quando há quebras de linha entre aspas.
+    """
+    global _SHARED_MODEL
+    import gc, multiprocessing as mp, os, shutil, tempfile
+
+    try:
+        header, ranges = csv_byte_ranges(path, range_bytes)
+    except ValueError:
+        ranges = None  # campos com quebra de linha: só o leitor sequencial numera certo
+    if "fork" not in mp.get_all_start_methods() or not ranges:
+        with open(path, "rb") as f:
+            return score_file(model, f, out_path, progress=progress)
+
+    offsets = np.concatenate([[0], np.cumsum([r[2] for r in ranges])[:-1]]).astype(int)
+    n_workers = n_workers or os.cpu_count()
+    n_rows = n_valid = 0
+    with tempfile.TemporaryDirectory(prefix="scoring_") as tmp:
+        parts = [os.path.join(tmp, f"part_{i:06d}.csv") for i in range(len(ranges))]
+        tasks = [(str(path), header, r[0], r[1], int(off), part, i == 0)
+                 for i, (r, off, part) in enumerate(zip(ranges, offsets, parts))]
+        _SHARED_MODEL = model
+        gc.freeze()
+        try:
+            with mp.get_context("fork").Pool(n_workers) as pool, open(out_path, "wb") as out:
+                # imap preserva a ordem: cada parte é anexada assim que ela e as anteriores terminam
+                for i, (rows, ok) in enumerate(pool.imap(_score_range, tasks)):
+                    with open(parts[i], "rb") as part:
+                        shutil.copyfileobj(part, out)
+                    os.remove(parts[i])
+                    n_rows += rows
+                    n_valid += ok
+                    if progress is not None:
+                        progress((i + 1) / len(tasks), n_rows)
+        finally:
+            gc.unfreeze()
+            _SHARED_MODEL = None
+    return {"linhas": n_rows, "validas": n_valid, "invalidas": n_rows - n_valid}
+
+
+def scaling_curve(model, path, max_workers=None, range_bytes=RANGE_BYTES):
+    """Tempo de pontuação de 1 a N processos, conferindo que a saída não muda"""
+    import hashlib, os, tempfile, time
+
+    def digest(p):
+        with open(p, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    max_workers = max_workers or os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp:
+        ref = os.path.join(tmp, "ref.csv")
+        t0 = time.perf_counter()
+        with open(path, "rb") as f:
+            score_file(model, f, ref)
+        base = time.perf_counter() - t0
+        ref_digest = digest(ref)
+        print(f"sequencial: {base:.2f}s")
+        for n in sorted({1, 2, 4, 8, 16, 32, max_workers}):
+            if n > max_workers:
+                continue
+            out = os.path.join(tmp, f"par_{n}.csv")
+            t0 = time.perf_counter()
+            score_file_parallel(model, path, out, n_workers=n, range_bytes=range_bytes)
+            elapsed = time.perf_counter() - t0
+            same = digest(out) == ref_digest
+            print(f"{n:>3} processos: {elapsed:.2f}s  speedup {base / elapsed:.2f}x  saída idêntica: {same}")
+
+
+if __name__ == "__main__":
+    import argparse, joblib
+
+    parser = argparse.ArgumentParser(description="Pontuação em lote de pacientes")
+    parser.add_argument("entrada")
+    parser.add_argument("saida", nargs="?")
+    parser.add_argument("--modelo", default="obesity_pipeline.pkl")
+    parser.add_argument("--workers", type=int, default=1, help="processos (apenas CSV); 0 = todos os núcleos")
+    parser.add_argument("--curva", action="store_true", help="mede a curva de escalabilidade de 1 a N processos")
+    args = parser.parse_args()
+
+    src = Path(args.entrada)
+    model = joblib.load(args.modelo)
+    kind = "parquet" if src.suffix.lower() in (".parquet", ".pq") else "csv"
+    if args.curva:
+        scaling_curve(model, src, args.workers or None)
+    elif args.saida is None:
+        parser.error("informe o arquivo de saída")
+    elif kind == "csv" and args.workers != 1:
+        print(score_file_parallel(model, src, args.saida, n_workers=args.workers or None))
+    else:
+        with open(src, "rb") as f:
+            print(score_file(model, f, args.saida, kind=kind))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Estudo: quanto dá para reduzir n_estimators / max_depth com as features de IMC.
+
+Compara o modelo atual (sem features derivadas, 100 árvores de profundidade 3)
+com variantes menores que incluem o passo BMIFeatures, usando a CV repetida com
+cache (cv_store) e medindo a latência de inferência do pipeline completo.
+
+Uso:
+    python bmi_feature_study.py [--tolerancia 0.002] [--repeticoes 2]
+"""
+import argparse, time
+
+import numpy as np
+import pandas as pd
+
+from cv_store import repeated_cv
+from obesity_features import build_pipeline
+from obesity_schema import load_features, numeric_features
+
+
+def latency(pipe, X, repeat=50):
+    """Mediana (ms) de predict_proba de uma linha e de um lote de 10 mil linhas"""
+    row = X.iloc[[0]]
+    batch = X.sample(10_000, replace=True, random_state=0)
+    per_row = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        pipe.predict_proba(row)
+        per_row.append(time.perf_counter() - t0)
+    per_batch = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        pipe.predict_proba(batch)
+        per_batch.append(time.perf_counter() - t0)
+    return np.median(per_row) * 1000, np.median(per_batch) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tolerancia", type=float, default=0.002,
+                        help="perda máxima de acurácia média de CV aceita em relação ao modelo atual")
+    parser.add_argument("--repeticoes", type=int, default=2)
+    args = parser.parse_args()
+
+    X, y = load_features()
+    cat_cols = [c for c in X.columns if c not in numeric_features]
+    seeds = tuple(range(42, 42 + args.repeticoes))
+
+    configs = [("atual", False, 100, 3)]
+    configs += [("IMC", True, n, d) for d in (2, 3) for n in (10, 20, 30, 50, 75, 100)]
+
+    rows = []
+    for nome, bmi, n_est, depth in configs:
+        pipe = build_pipeline(numeric_features, cat_cols, bmi=bmi, n_estimators=n_est, max_depth=depth)
+        cv = repeated_cv(pipe, X, y, seeds=seeds)
+        lat_row, lat_batch = latency(pipe.fit(X, y), X)
+        rows.append({"variante": nome, "n_estimators": n_est, "max_depth": depth,
+                     "acc_media": cv["accuracy"].mean(), "acc_desvio": cv["accuracy"].std(),
+                     "latencia_linha_ms": lat_row, "latencia_lote10k_ms": lat_batch})
+        print(rows[-1])
+
+    res = pd.DataFrame(rows)
+    base = res.iloc[0]
+    ok = res[(res["variante"] == "IMC") & (res["acc_media"] >= base["acc_media"] - args.tolerancia)]
+    print("\n", res.round(4).to_string(index=False))
+    if ok.empty:
+        print("\nNenhuma variante menor manteve a acurácia dentro da tolerância.")
+    else:
+        best = ok.sort_values("latencia_lote10k_ms").iloc[0]
+        print(f"\nMenor custo mantendo a acurácia (tolerância {args.tolerancia}): "
+              f"n_estimators={best['n_estimators']}, max_depth={best['max_depth']} -> "
+              f"acc {best['acc_media']:.4f} vs {base['acc_media']:.4f}; lote 10k "
+              f"{best['latencia_lote10k_ms']:.0f} ms vs {base['latencia_lote10k_ms']:.0f} ms "
+              f"({base['latencia_lote10k_ms'] / best['latencia_lote10k_ms']:.1f}x mais rápido)")
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+Agregados combináveis do painel (app_dashboard.py) para arquivos maiores que a memória.
+
+O arquivo é lido em chunks (pd.read_csv(chunksize=...) ou lotes de um Parquet)
+e cada chunk vira um CohortAggregate pequeno, de tamanho fixo, com tudo que o
+painel desenha:
+
+    contagens por classe, somas por classe das numéricas (médias), contagens
+    histórico familiar x classe, fatores de risco por classe (risk_rules.py),
+    momentos centrados para a correlação (n, médias, co-momentos; combinados
+    pela fórmula de Chan, estável mesmo com bilhões de linhas), histogramas
+    de grade fixa por classe para os box plots e, com modelo, matriz de
+    confusão e soma das confianças.
+
+Agregados se combinam com merge() em qualquer ordem, então os chunks podem ser
+processados por workers do joblib (resultados consumidos conforme ficam
+prontos, com no máximo `2 * n_jobs` chunks em voo). O pico de memória depende
+do tamanho do chunk, não do arquivo. Quartis e limites dos box plots vêm dos
+histogramas (resolução de BOX_BINS); o resto é exato.
+
+Uso (pico de memória e tempo: arquivo inteiro x chunks, com conferência):
+    python chunked_aggregates.py [Obesity.csv] [--linhas 2000000] [--chunk 200000] [--jobs 1]
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from obesity_schema import target_col, target_map_pt, translate_frame
+from risk_rules import REGRAS_RISCO, avaliar
+
+# Classes do CSV -> rótulos do painel (mesma ordem das barras e cores)
+CLASSES_PAINEL = {
+    'Insufficient_Weight': 'Baixo Peso',
+    'Normal_Weight': 'Peso Normal',
+    'Overweight_Level_I': 'Sobrepeso I',
+    'Overweight_Level_II': 'Sobrepeso II',
+    'Obesity_Type_I': 'Obesidade I',
+    'Obesity_Type_II': 'Obesidade II',
+    'Obesity_Type_III': 'Obesidade III',
+}
+CLASSES = list(CLASSES_PAINEL)
+ROTULOS = list(CLASSES_PAINEL.values())
+
+# Numéricas da correlação, na ordem do mapa de calor do painel
+NUMERICAS = ["Idade", "Altura", "Peso", "IMC", "FCVC", "NCP", "Água por dia", "Atividade Física", "Tempo em Telas"]
+
+# Box plots: coluna do agregado -> (nome no painel, início, fim, largura do bin)
+BOX_BINS = {
+    "IMC": ("IMC", 10.0, 70.0, 0.05),
+    "Idade": ("Age", 0.0, 100.0, 0.1),
+    "Atividade Física": ("FAF", 0.0, 3.0, 0.01),
+}
+
+CHUNK_ROWS = 200_000
+
+
+def _box_stats(counts, start, width, vmin, vmax):
+    """Quartis e limites (1,5 x IQR, presos ao mínimo/máximo) a partir de um histograma"""
+    cum = np.cumsum(counts)
+    def quantil(q):
+        alvo = q * cum[-1]
+        i = int(np.searchsorted(cum, alvo))
+        antes = cum[i] - counts[i]
+        return float(np.clip(start + (i + (alvo - antes) / counts[i]) * width, vmin, vmax))
+    q1, med, q3 = quantil(0.25), quantil(0.5), quantil(0.75)
+    iqr = q3 - q1
+    return {"q1": q1, "median": med, "q3": q3,
+            "lowerfence": max(vmin, q1 - 1.5 * iqr), "upperfence": min(vmax, q3 + 1.5 * iqr)}
+
+
+class CohortAggregate:
+    """Estatísticas de um recorte em arrays de tamanho fixo; merge() combina dois recortes disjuntos"""
+
+    def __init__(self):
+        C, K, R = len(CLASSES), len(NUMERICAS), len(REGRAS_RISCO)
+        self.n = np.zeros(C, dtype=np.int64)
+        self.soma = np.zeros((C, K))
+        self.cont = np.zeros((C, K), dtype=np.int64)
+        self.fatores = np.zeros(C)
+        self.flags = np.zeros((C, R), dtype=np.int64)
+        self.familia = {}                       # valor -> contagem por classe
+        self.n_cc, self.media, self.m2 = 0, np.zeros(K), np.zeros((K, K))  # linhas completas
+        self.hist = {c: np.zeros((C, int(round((fim - ini) / w))), dtype=np.int64)
+                     for c, (_, ini, fim, w) in BOX_BINS.items()}
+        self.minimo = {c: np.full(C, np.inf) for c in BOX_BINS}
+        self.maximo = {c: np.full(C, -np.inf) for c in BOX_BINS}
+        self.confusao = None                    # (real x predita) com modelo
+        self.confianca = None
+        self.valores = {"Gênero": set(), "Histórico Familiar": set()}
+        self.idade = (np.inf, -np.inf)
+
+    @property
+    def total(self):
+        return int(self.n.sum())
+
+    # -----------------------------------------------------------------
+    # Um chunk
+    # -----------------------------------------------------------------
+    @classmethod
+    def from_chunk(cls, chunk, filtros=None, modelo=None):
+        """Agregado de um chunk do CSV original; `filtros` = (gêneros, (idade mín, máx), históricos)"""
+        agg = cls()
+        pt = translate_frame(chunk)
+        mask = pt[target_col].isin(CLASSES)
+        if filtros is not None:
+            generos, (idade_min, idade_max), familias = filtros
+            mask &= (pt["Gênero"].isin(list(generos)) & pt["Idade"].between(idade_min, idade_max)
+                     & pt["Histórico Familiar"].isin(list(familias)))
+        pt = pt[mask]
+        if pt.empty:
+            return agg
+        C = len(CLASSES)
+        codes = pd.Categorical(pt[target_col], categories=CLASSES).codes.astype(np.int64)
+        av = avaliar(pt)
+        valores = np.column_stack([av["IMC"].to_numpy() if c == "IMC" else pt[c].to_numpy(dtype=float)
+                                   for c in NUMERICAS])
+        presente = ~np.isnan(valores)
+
+        agg.n = np.bincount(codes, minlength=C)
+        for k in range(len(NUMERICAS)):
+            agg.soma[:, k] = np.bincount(codes, weights=np.where(presente[:, k], valores[:, k], 0.0), minlength=C)
+            agg.cont[:, k] = np.bincount(codes, weights=presente[:, k], minlength=C).astype(np.int64)
+        agg.fatores = np.bincount(codes, weights=av["N Fatores"].to_numpy(dtype=float), minlength=C)
+        for r, regra in enumerate(REGRAS_RISCO):
+            agg.flags[:, r] = np.bincount(codes, weights=av[regra.id].to_numpy(dtype=float), minlength=C)
+        familia = pt["Histórico Familiar"].to_numpy(dtype=object)
+        for v in pd.unique(familia):
+            agg.familia[v] = np.bincount(codes[familia == v], minlength=C)
+
+        completas = valores[presente.all(axis=1)]
+        if len(completas):
+            agg.n_cc, agg.media = len(completas), completas.mean(axis=0)
+            centrado = completas - agg.media
+            agg.m2 = centrado.T @ centrado
+
+        for c, (_, ini, fim, w) in BOX_BINS.items():
+            x = valores[:, NUMERICAS.index(c)]
+            ok = ~np.isnan(x)
+            nb = agg.hist[c].shape[1]
+            b = np.clip(((x[ok] - ini) / w).astype(np.int64), 0, nb - 1)
+            agg.hist[c] = np.bincount(codes[ok] * nb + b, minlength=C * nb).reshape(C, nb)
+            extremos = pd.Series(x[ok]).groupby(codes[ok]).agg(["min", "max"])
+            agg.minimo[c][extremos.index] = extremos["min"].to_numpy()
+            agg.maximo[c][extremos.index] = extremos["max"].to_numpy()
+
+        if modelo is not None:
+            proba = modelo.predict_proba(pt.drop(columns=[target_col]))
+            de_modelo = {target_map_pt[c]: i for i, c in enumerate(CLASSES)}
+            pred = np.array([de_modelo.get(c, -1) for c in modelo.classes_])[proba.argmax(axis=1)]
+            agg.confusao = np.bincount(codes * C + pred, minlength=C * C).reshape(C, C)
+            agg.confianca = np.bincount(codes, weights=proba.max(axis=1), minlength=C)
+
+        agg.valores = {c: set(pt[c].dropna()) for c in agg.valores}
+        agg.idade = (float(pt["Idade"].min()), float(pt["Idade"].max()))
+        return agg
+
+    # -----------------------------------------------------------------
+    # Combinação
+    # -----------------------------------------------------------------
+    def merge(self, other):
+        """Acumula `other` (recorte disjunto) neste agregado e o retorna"""
+        self.n += other.n
+        self.soma += other.soma
+        self.cont += other.cont
+        self.fatores += other.fatores
+        self.flags += other.flags
+        for v, cont in other.familia.items():
+            self.familia[v] = self.familia.get(v, 0) + cont
+        if other.n_cc:
+            n = self.n_cc + other.n_cc
+            delta = other.media - self.media
+            self.m2 = self.m2 + other.m2 + np.outer(delta, delta) * self.n_cc * other.n_cc / n
+            self.media = self.media + delta * other.n_cc / n
+            self.n_cc = n
+        for c in BOX_BINS:
+            self.hist[c] += other.hist[c]
+            self.minimo[c] = np.minimum(self.minimo[c], other.minimo[c])
+            self.maximo[c] = np.maximum(self.maximo[c], other.maximo[c])
+        if other.confusao is not None:
+            self.confusao = other.confusao + (0 if self.confusao is None else self.confusao)
+            self.confianca = other.confianca + (0 if self.confianca is None else self.confianca)
+        for c in self.valores:
+            self.valores[c] |= other.valores[c]
+        self.idade = (min(self.idade[0], other.idade[0]), max(self.idade[1], other.idade[1]))
+        return self
+
+    # -----------------------------------------------------------------
+    # Tabelas do painel
+    # -----------------------------------------------------------------
+    def tabelas(self):
+        """Mesmas tabelas que app_dashboard.resumo_do_recorte calcula sobre um DataFrame em memória"""
+        presentes = self.n > 0
+        rotulos = np.array(ROTULOS)[presentes]
+        obesidade = np.array(["Obesity" in c for c in CLASSES])
+        col = {c: NUMERICAS.index(c) for c in NUMERICAS}
+        total = self.total
+        kpis = {
+            'total_pacientes': total,
+            'perc_obesidade': self.n[obesidade].sum() / total,
+            'media_imc': self.soma[:, col["IMC"]].sum() / self.cont[:, col["IMC"]].sum(),
+            'media_idade': self.soma[:, col["Idade"]].sum() / self.cont[:, col["Idade"]].sum(),
+            'media_fatores': self.fatores.sum() / total,
+        }
+        hist_obesidade = pd.Series({v: 100 * cont[obesidade].sum() / cont.sum()
+                                    for v, cont in self.familia.items()}).sort_index()  # ordem do groupby
+        medias = pd.DataFrame({
+            'CH2O': self.soma[:, col["Água por dia"]] / self.cont[:, col["Água por dia"]],
+            'FAF': self.soma[:, col["Atividade Física"]] / self.cont[:, col["Atividade Física"]],
+        }, index=ROTULOS)[presentes]
+        desvio = np.sqrt(np.diag(self.m2))
+        corr = self.m2 / np.outer(desvio, desvio)
+        prev = pd.DataFrame(self.flags[presentes] / self.n[presentes, None], index=rotulos,
+                            columns=[r.descricao for r in REGRAS_RISCO])
+        box = {}
+        for c, (nome, ini, _, w) in BOX_BINS.items():
+            box[nome] = pd.DataFrame([
+                _box_stats(self.hist[c][i], ini, w, self.minimo[c][i], self.maximo[c][i])
+                for i in np.flatnonzero(self.hist[c].sum(axis=1))
+            ], index=np.array(ROTULOS)[self.hist[c].sum(axis=1) > 0])
+        out = {'kpis': kpis, 'dist': pd.Series(self.n[presentes], index=rotulos),
+               'hist_obesidade': hist_obesidade[hist_obesidade > 0], 'medias': medias,
+               'corr': corr, 'prev': prev, 'box': box}
+        if self.confusao is not None:
+            acertos = np.diag(self.confusao)
+            kpis['acuracia_modelo'] = acertos.sum() / total
+            kpis['confianca_media'] = self.confianca.sum() / total
+            out['cm'] = pd.DataFrame(self.confusao, index=ROTULOS, columns=ROTULOS)
+            out['por_classe'] = pd.DataFrame({
+                'Acurácia': acertos[presentes] / self.n[presentes],
+                'Confiança': self.confianca[presentes] / self.n[presentes],
+            }, index=rotulos)
+        return out
+
+
+# =========================================================
+# Leitura em chunks
+# =========================================================
+def iter_chunks(path, chunksize=CHUNK_ROWS):
+    """DataFrames de até `chunksize` linhas de um CSV ou Parquet, sem carregar o arquivo"""
+    if Path(path).suffix.lower() == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def aggregate_file(path, filtros=None, modelo=None, chunksize=CHUNK_ROWS, n_jobs=1):
+    """CohortAggregate do arquivo inteiro, chunk a chunk (em paralelo com n_jobs != 1)"""
+    chunks = iter_chunks(path, chunksize)
+    if n_jobs == 1:
+        partes = (CohortAggregate.from_chunk(c, filtros, modelo) for c in chunks)
+    else:
+        partes = Parallel(n_jobs=n_jobs, return_as="generator_unordered", pre_dispatch="2*n_jobs")(
+            delayed(CohortAggregate.from_chunk)(c, filtros, modelo) for c in chunks
+        )
+    total = CohortAggregate()
+    for parte in partes:
+        total.merge(parte)
+    return total
+
+
+if __name__ == "__main__":
+    import argparse, resource, subprocess, sys, tempfile, time
+
+    parser = argparse.ArgumentParser(description="Agregados do painel em chunks: memória e tempo")
+    parser.add_argument("dados", nargs="?", default="Obesity.csv")
+    parser.add_argument("--linhas", type=int, default=2_000_000, help="tamanho do arquivo ampliado")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--medir", choices=["inteiro", "chunks"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        # Processo filho: uma única estratégia, para o pico de memória (ru_maxrss) ser só dela
+        t0 = time.perf_counter()
+        if args.medir == "inteiro":
+            agg = CohortAggregate.from_chunk(pd.read_csv(args.dados))
+        else:
+            agg = aggregate_file(args.dados, chunksize=args.chunk, n_jobs=args.jobs)
+        agg.tabelas()
+        print(time.perf_counter() - t0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, agg.total)
+        sys.exit()
+
+    # Conferência: chunks pequenos (com filtro) dão as mesmas tabelas que o arquivo inteiro
+    filtros = (("Feminino", "Masculino"), (18, 40), ("Sim", "Não"))
+    inteiro = CohortAggregate.from_chunk(pd.read_csv(args.dados), filtros).tabelas()
+    em_chunks = aggregate_file(args.dados, filtros, chunksize=97).tabelas()
+    assert inteiro['kpis'].keys() == em_chunks['kpis'].keys()
+    assert np.allclose(list(inteiro['kpis'].values()), list(em_chunks['kpis'].values()))
+    for nome in ('dist', 'hist_obesidade', 'medias', 'prev'):
+        pd.testing.assert_frame_equal(pd.DataFrame(inteiro[nome]), pd.DataFrame(em_chunks[nome]).loc[pd.DataFrame(inteiro[nome]).index])
+    assert np.allclose(inteiro['corr'], em_chunks['corr'])
+    print(f"Conferência ok: {inteiro['kpis']['total_pacientes']} pacientes no recorte, chunks de 97 linhas")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        grande = Path(tmp) / "grande.csv"
+        base = pd.read_csv(args.dados)
+        idx = np.random.default_rng(0).integers(0, len(base), args.linhas)
+        for i in range(0, args.linhas, 500_000):  # escrito aos poucos, sem o arquivo inteiro na memória
+            base.iloc[idx[i:i + 500_000]].to_csv(grande, mode="a", header=i == 0, index=False)
+        print(f"Arquivo ampliado: {args.linhas:,} linhas, {grande.stat().st_size / 2 ** 20:.0f} MiB")
+        for modo in ("inteiro", "chunks"):
+            out = subprocess.run([sys.executable, __file__, str(grande), "--medir", modo,
+                                  "--chunk", str(args.chunk), "--jobs", str(args.jobs)],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            segundos, pico_mb, n = float(out[0]), float(out[1]), int(out[2])
+            print(f"{modo:<8} {segundos:7.2f}s  pico {pico_mb:8.0f} MiB  ({n:,} pacientes)")
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Validação cruzada estratificada repetida, paralela e com cache em disco.
+
+Cada fold (semente x partição) roda como um job independente (joblib) e o
+resultado é gravado em .cv_cache/ sob a chave
+    (hash dos dados, hash dos parâmetros do pipeline + versões das bibliotecas
+     + código dos módulos locais do pipeline, semente, fold)
+de modo que repetir um experimento só calcula os folds que ainda faltam.
+Com keep_models=True o modelo de cada fold e as probabilidades out-of-fold
+também são guardados, para exportar os folds como ensemble (fold_ensemble.py).
+Grupos (StratifiedGroupKFold) e pesos por linha entram na chave dos dados; os
+pesos vão para o fit do último passo e ponderam as métricas do fold
+(row_dedup.py: linhas deduplicadas com peso = número de cópias).
+"""
+import functools, hashlib, importlib, inspect, os, platform, sys, tempfile, time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy import stats
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, recall_score
+from sklearn.model_selection import StratifiedGroupKFold, StratifiedKFold
+
+from model_registry import FILE_MODE
+
+CV_CACHE_DIR = Path(".cv_cache")
+
+# Módulos do projeto cujo código entra em todo fit (features derivadas e esquema
+# das colunas); os módulos dos passos do Pipeline são somados em code_hash()
+PIPELINE_MODULES = ("obesity_features", "obesity_schema")
+_PROJECT_DIR = Path(__file__).resolve().parent
+
+
+def data_hash(X, y):
+    """Hash vetorizado do conteúdo de X e y (independe do índice)"""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    h.update(pd.util.hash_pandas_object(pd.Series(np.asarray(y, dtype=object)), index=False).to_numpy().tobytes())
+    h.update(",".join(map(str, X.columns)).encode())
+    return h.hexdigest()[:16]
+
+
+def library_versions():
+    """Versões que influenciam o resultado de um fit (um upgrade invalida os caches)"""
+    import sklearn, scipy
+    return {"python": platform.python_version(), "sklearn": sklearn.__version__,
+            "numpy": np.__version__, "scipy": scipy.__version__, "pandas": pd.__version__}
+
+
+def project_module(obj):
+    """Nome do módulo do projeto que define `obj` (módulo, função, classe ou instância), ou None"""
+    if inspect.ismodule(obj):
+        name = obj.__name__
+    elif inspect.isfunction(obj) or inspect.isclass(obj):
+        name = obj.__module__
+    else:
+        name = type(obj).__module__
+    module = sys.modules.get(name)
+    path = getattr(module, "__file__", None)
+    if name == "__main__" or not path:  # o script em execução entra pelo código da etapa
+        return None
+    return name if Path(path).resolve().parent == _PROJECT_DIR else None
+
+
+@functools.lru_cache(maxsize=None)
+def _source_hash(names):
+    seen, todo = set(), list(names)
+    while todo:
+        name = todo.pop()
+        if name not in seen:
+            seen.add(name)
+            todo.extend(filter(None, map(project_module, vars(importlib.import_module(name)).values())))
+    h = hashlib.sha256()
+    for name in sorted(seen):
+        h.update(inspect.getsource(importlib.import_module(name)).encode())
+    return h.hexdigest()[:16]
+
+
+def source_hash(names):
+    """Hash do código-fonte dos módulos do projeto `names` e dos que eles usam (fecho transitivo)"""
+    return _source_hash(tuple(sorted(set(names))))
+
+
+def referenced_modules(fn):
+    """Módulos do projeto usados por uma função: globais citados (ou importados) no código dela
+    e das funções aninhadas"""
+    names, codes = set(), [fn.__code__] if hasattr(fn, "__code__") else []
+    while codes:
+        code = codes.pop()
+        for n in code.co_names:
+            if n in fn.__globals__:
+                names.add(project_module(fn.__globals__[n]))
+            elif n in sys.modules:  # import dentro da função
+                names.add(project_module(sys.modules[n]))
+        codes.extend(c for c in code.co_consts if inspect.iscode(c))
+    for cell in getattr(fn, "__closure__", None) or ():
+        try:
+            names.add(project_module(cell.cell_contents))
+        except ValueError:  # célula ainda vazia
+            pass
+    names.discard(None)
+    return names
+
+
+def code_hash(pipe):
+    """Hash do código-fonte dos módulos do projeto usados pelo pipeline
+
+    Parâmetros iguais com outra fórmula (ex.: IMC em BMIFeatures) dão outro
+    hash, então folds e modelos em cache não sobrevivem a mudanças de código.
+    """
+    objs = [pipe, *pipe.get_params(deep=True).values()]
+    return source_hash(set(PIPELINE_MODULES) | {project_module(o) for o in objs} - {None})
+
+
+def params_hash(pipe):
+    """Hash da configuração do pipeline (estimadores não treinados, hiperparâmetros e código)"""
+    return joblib.hash((clone(pipe), library_versions(), code_hash(pipe)))[:16]
+
+
+def fit_params(pipe, sample_weight):
+    """Parâmetros de fit que levam sample_weight ao último passo do Pipeline"""
+    if sample_weight is None:
+        return {}
+    return {f"{pipe.steps[-1][0]}__sample_weight": sample_weight}
+
+
+def _fold_path(cache_dir, dhash, phash, seed, fold):
+    return Path(cache_dir) / f"{dhash}_{phash}_s{seed}_f{fold}.joblib"
+
+
+def _model_path(fold_path):
+    return fold_path.with_suffix(".model.joblib")
+
+
+def _atomic_dump(value, path):
+    # Escrita atômica: jobs paralelos nunca deixam um arquivo pela metade
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    os.close(fd)
+    joblib.dump(value, tmp)
+    os.chmod(tmp, FILE_MODE)  # mkstemp cria 0600
+    os.replace(tmp, path)
+
+
+def _run_fold(pipe, X, y, train_idx, test_idx, path, classes, keep_model=False, sample_weight=None):
+    w_train = w_test = None
+    if sample_weight is not None:
+        w_train, w_test = sample_weight[train_idx], sample_weight[test_idx]
+    t0 = time.perf_counter()
+    model = clone(pipe).fit(X.iloc[train_idx], y.iloc[train_idx], **fit_params(pipe, w_train))
+    fit_seconds = time.perf_counter() - t0
+    y_true = y.iloc[test_idx]
+    proba = model.predict_proba(X.iloc[test_idx])
+    y_pred = model.classes_[proba.argmax(axis=1)]
+    result = {
+        "accuracy": accuracy_score(y_true, y_pred, sample_weight=w_test),
+        "recall": dict(zip(classes, recall_score(y_true, y_pred, labels=classes, average=None,
+                                                 sample_weight=w_test, zero_division=0))),
+        "fit_seconds": fit_seconds,
+    }
+    if keep_model:
+        _atomic_dump({"model": model, "test_idx": test_idx, "proba": proba}, _model_path(path))
+    _atomic_dump(result, path)
+    return result
+
+
+def repeated_cv(pipe, X, y, n_splits=5, seeds=(42, 43, 44), n_jobs=-1, cache_dir=CV_CACHE_DIR, keep_models=False,
+                groups=None, sample_weight=None):
+    """Roda (ou reaproveita do cache) sementes x folds; retorna um DataFrame por fold
+
+    keep_models=True guarda também os modelos dos folds da primeira semente;
+    os caminhos ficam em results.attrs["model_paths"] (ver load_fold_models).
+    Com `groups`, linhas do mesmo grupo nunca ficam em treino e teste do mesmo fold.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    y = pd.Series(np.asarray(y, dtype=object), index=X.index)
+    classes = sorted(y.unique())
+    dhash, phash = data_hash(X, y), params_hash(pipe)
+    if groups is not None or sample_weight is not None:
+        sample_weight = None if sample_weight is None else np.asarray(sample_weight, dtype=float)
+        dhash = joblib.hash((dhash, groups, sample_weight))[:16]
+
+    tasks, cached = [], 0
+    for seed in seeds:
+        splitter = StratifiedKFold if groups is None else StratifiedGroupKFold
+        cv = splitter(n_splits=n_splits, shuffle=True, random_state=seed)
+        for fold, (tr, te) in enumerate(cv.split(X, y, groups)):
+            path = _fold_path(cache_dir, dhash, phash, seed, fold)
+            keep = keep_models and seed == seeds[0]
+            if path.exists() and (not keep or _model_path(path).exists()):
+                cached += 1
+            else:
+                tasks.append((seed, fold, tr, te, path, keep))
+
+    if tasks:
+        Parallel(n_jobs=n_jobs)(
+            delayed(_run_fold)(pipe, X, y, tr, te, path, classes, keep, sample_weight)
+            for _, _, tr, te, path, keep in tasks
+        )
+
+    rows = []
+    for seed in seeds:
+        for fold in range(n_splits):
+            res = joblib.load(_fold_path(cache_dir, dhash, phash, seed, fold))
+            rows.append({"seed": seed, "fold": fold, "accuracy": res["accuracy"],
+                         "fit_seconds": res["fit_seconds"],
+                         **{f"recall_{c}": r for c, r in res["recall"].items()}})
+    results = pd.DataFrame(rows)
+    results.attrs.update(cached=cached, computed=len(tasks), data_hash=dhash, params_hash=phash)
+    if keep_models:
+        results.attrs["model_paths"] = [
+            str(_model_path(_fold_path(cache_dir, dhash, phash, seeds[0], fold))) for fold in range(n_splits)
+        ]
+    return results
+
+
+def load_fold_models(results, n_rows):
+    """(modelos, probabilidades out-of-fold) dos folds guardados com keep_models=True
+
+    Cada linha aparece no teste de exatamente um fold, então as probabilidades
+    out-of-fold cobrem o dataset inteiro sem nenhum fit adicional.
+    """
+    models, oof = [], None
+    for path in results.attrs["model_paths"]:
+        art = joblib.load(path)
+        models.append(art["model"])
+        if oof is None:
+            oof = np.full((n_rows, art["proba"].shape[1]), np.nan)
+        oof[art["test_idx"]] = art["proba"]
+    return models, oof
+
+
+def summarize(results, confidence=0.95):
+    """Média, desvio e intervalo de confiança (t de Student) por métrica
+
+    Os folds de repetições diferentes não são independentes, então o IC é
+    otimista; serve para comparar modelos avaliados com as mesmas partições.
+    """
+    metrics = ["accuracy"] + [c for c in results.columns if c.startswith("recall_")]
+    n = len(results)
+    t = stats.t.ppf((1 + confidence) / 2, df=n - 1) if n > 1 else np.nan
+    out = []
+    for m in metrics:
+        mean, std = results[m].mean(), results[m].std(ddof=1)
+        half = t * std / np.sqrt(n)
+        out.append({"métrica": m, "média": mean, "desvio": std, "ic_inf": mean - half, "ic_sup": mean + half})
+    return pd.DataFrame(out).set_index("métrica")
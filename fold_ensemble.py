@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Ensemble dos modelos da validação cruzada (soft voting), no lugar do refit final.
+
+A CV de 5 folds já treina cinco pipelines completos, cada um em 80% dos dados.
+Guardando esses modelos (cv_store.repeated_cv(..., keep_models=True)) o
+artefato de produção passa a ser a média das probabilidades dos cinco, e as
+probabilidades out-of-fold dão métricas de todo o dataset sem holdout nem fit
+final: o treino inteiro custa só a CV. Em troca, a inferência roda cinco
+pipelines em vez de um (ver o benchmark abaixo).
+
+Uso (tempo de treino e custo de inferência contra o refit único):
+    python fold_ensemble.py [Obesity.csv] [--jobs -1]
+"""
+import time
+
+import numpy as np
+from sklearn.metrics import accuracy_score, log_loss, recall_score
+
+
+def oof_metrics(y, oof_proba, classes, sample_weight=None):
+    """Acurácia, log-loss e recall por classe das probabilidades out-of-fold"""
+    y_true = np.asarray(y, dtype=object)
+    y_pred = np.asarray(classes, dtype=object)[oof_proba.argmax(axis=1)]
+    return {
+        "accuracy": float(accuracy_score(y_true, y_pred, sample_weight=sample_weight)),
+        "log_loss": float(log_loss(y_true, oof_proba, labels=list(classes), sample_weight=sample_weight)),
+        "recall": dict(zip(classes, recall_score(y_true, y_pred, labels=list(classes), average=None,
+                                                 sample_weight=sample_weight, zero_division=0).tolist())),
+    }
+
+
+class FoldEnsemble:
+    """Média de predict_proba dos modelos dos folds; mesma interface de predição do Pipeline"""
+
+    def __init__(self, models, oof_metrics=None):
+        if not models:
+            raise ValueError("FoldEnsemble precisa de ao menos um modelo")
+        self.classes_ = models[0].classes_
+        for m in models[1:]:
+            if list(m.classes_) != list(self.classes_):
+                raise ValueError("Os modelos dos folds não têm as mesmas classes")
+        self.models = list(models)
+        self.oof_metrics = oof_metrics or {}
+
+    def predict_proba(self, X):
+        proba = self.models[0].predict_proba(X)
+        for m in self.models[1:]:
+            proba = proba + m.predict_proba(X)
+        return proba / len(self.models)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def fold_ensemble_from_cv(pipe, X, y, n_splits=5, seed=42, n_jobs=-1, cache_dir=None,
+                          groups=None, sample_weight=None):
+    """Roda (ou reaproveita) a CV de uma semente guardando os modelos e monta o ensemble"""
+    from cv_store import CV_CACHE_DIR, repeated_cv, load_fold_models
+
+    results = repeated_cv(pipe, X, y, n_splits=n_splits, seeds=(seed,), n_jobs=n_jobs,
+                          cache_dir=cache_dir or CV_CACHE_DIR, keep_models=True,
+                          groups=groups, sample_weight=sample_weight)
+    models, oof = load_fold_models(results, len(X))
+    return FoldEnsemble(models, oof_metrics(y, oof, models[0].classes_, sample_weight))
+
+
+# =========================================================
+# Benchmark: treino (CV + holdout + refit x só CV) e inferência
+# =========================================================
+def _latency_ms(model, rows, repeat):
+    model.predict_proba(rows)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        model.predict_proba(rows)
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1000
+
+
+if __name__ == "__main__":
+    import argparse, tempfile
+
+    from sklearn.base import clone
+    from sklearn.model_selection import train_test_split
+
+    from cv_store import repeated_cv
+    from obesity_features import build_pipeline, N_EST, DEPTH
+    from obesity_schema import load_features
+
+    parser = argparse.ArgumentParser(description="Ensemble dos folds x refit único")
+    parser.add_argument("dados", nargs="?", default="Obesity.csv")
+    parser.add_argument("--jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    X, y = load_features(args.dados)
+    cat_cols = X.select_dtypes(include=["object", "string"]).columns.tolist()
+    num_cols = X.select_dtypes(include=[np.number]).columns.tolist()
+    pipe = build_pipeline(num_cols, cat_cols, bmi=True, n_estimators=N_EST, max_depth=DEPTH)
+
+    # Caches vazios: os dois caminhos medem o treino completo, sem reaproveitamento
+    with tempfile.TemporaryDirectory() as tmp_refit, tempfile.TemporaryDirectory() as tmp_ens:
+        t0 = time.perf_counter()
+        repeated_cv(pipe, X, y, seeds=(42,), n_jobs=args.jobs, cache_dir=tmp_refit)
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+        holdout_acc = accuracy_score(y_test, clone(pipe).fit(X_train, y_train).predict(X_test))
+        single = clone(pipe).fit(X, y)
+        t_refit = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        ensemble = fold_ensemble_from_cv(pipe, X, y, n_jobs=args.jobs, cache_dir=tmp_ens)
+        t_ens = time.perf_counter() - t0
+
+    print(f"Treino  CV + holdout + refit: {t_refit:.2f}s   só CV (folds exportados): {t_ens:.2f}s "
+          f"({t_refit / t_ens:.2f}x)")
+    print(f"Qualidade  holdout do refit: {holdout_acc:.4f}   OOF do ensemble: "
+          f"{ensemble.oof_metrics['accuracy']:.4f} (log-loss {ensemble.oof_metrics['log_loss']:.4f})")
+
+    row = X.iloc[[0]]
+    batch = X.sample(10_000, replace=True, random_state=0)
+    for nome, rows, rep in (("1 linha", row, 200), ("lote 10k", batch, 10)):
+        a, b = _latency_ms(single, rows, rep), _latency_ms(ensemble, rows, rep)
+        print(f"Inferência {nome:<9} refit: {a:8.2f} ms   ensemble ({len(ensemble.models)}): {b:8.2f} ms ({b / a:.1f}x)")
+    agree = (single.predict(X) == ensemble.predict(X)).mean()
+    print(f"Concordância refit x ensemble no dataset: {agree:.4f}")
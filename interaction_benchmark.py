@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+CPU do servidor por interação no app.py, com várias sessões simultâneas.
+
+Sobe `streamlit run` em modo headless e conversa com ele pelo mesmo websocket
+do navegador (/_stcore/stream, mensagens protobuf BackMsg/ForwardMsg). Cada
+sessão simula o preenchimento de um paciente: muda o peso (métrica de IMC),
+ajusta dois sliders e pede a predição. Widgets dentro de um st.form não geram
+mensagem nenhuma (o navegador só envia no submit) e widgets dentro de um
+fragmento pedem a reexecução apenas daquele fragmento, exatamente como o
+frontend faz. A CPU do processo do servidor (/proc/<pid>/stat) é medida em
+cada etapa, com todas as sessões interagindo ao mesmo tempo.
+
+Uso:
+    python interaction_benchmark.py [app.py] [--sessoes 8] [--ciclos 5]
+    python interaction_benchmark.py --antes HEAD~1    # compara com app.py de outra revisão
+"""
+import argparse, asyncio, os, subprocess, sys, time, urllib.request
+from pathlib import Path
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+# Etapas de um ciclo: (nome, rótulo do widget, valor); valor None = botão de predição
+CICLO = [
+    ("peso", "Peso (kg)", None),
+    ("slider vegetais", "Frequência de consumo de vegetais", 3.0),
+    ("slider atividade", "Frequência de atividade física", 0.5),
+    ("predição", "Realizar Predição", None),
+]
+
+
+def server_cpu_seconds(pid):
+    """utime + stime do processo (Linux)"""
+    fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+
+class Sessao:
+    """Um navegador simulado: guarda widgets vistos e estados enviados"""
+
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+        self.page_hash = ""
+        self.widgets = {}   # rótulo -> (tipo, proto do widget, fragment_id)
+        self.states = {}    # id -> WidgetState persistente
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, max_size=None)
+        return await self.rerun()
+
+    async def close(self):
+        await self.ws.close()
+
+    def _record(self, delta):
+        if delta.WhichOneof("type") != "new_element":
+            return
+        kind = delta.new_element.WhichOneof("type")
+        widget = getattr(delta.new_element, kind)
+        if "id" in widget.DESCRIPTOR.fields_by_name and "label" in widget.DESCRIPTOR.fields_by_name:
+            self.widgets[widget.label] = (kind, widget, delta.fragment_id)
+
+    def _find(self, label):
+        for text, entry in self.widgets.items():
+            if label in text:
+                return entry
+        raise KeyError(f"Widget não encontrado: {label}")
+
+    async def rerun(self, fragment_id="", trigger=None):
+        """Envia rerun_script e espera script_finished; retorna a latência em segundos"""
+        msg = BackMsg()
+        client = msg.rerun_script
+        client.page_script_hash = self.page_hash
+        client.fragment_id = fragment_id
+        client.widget_states.widgets.extend(self.states.values())
+        if trigger is not None:
+            client.widget_states.widgets.append(WidgetState(id=trigger, trigger_value=True))
+        t0 = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            fwd = ForwardMsg.FromString(await self.ws.recv())
+            kind = fwd.WhichOneof("type")
+            if kind == "new_session":
+                self.page_hash = fwd.new_session.page_script_hash
+            elif kind == "delta":
+                self._record(fwd.delta)
+            elif kind == "script_finished":
+                return time.perf_counter() - t0
+
+    async def interact(self, label, value):
+        """Altera um widget como o navegador faria; None se não houve ida ao servidor"""
+        kind, widget, fragment_id = self._find(label)
+        if kind == "button":
+            return await self.rerun(fragment_id, trigger=widget.id)
+        state = WidgetState(id=widget.id)
+        if kind == "slider":
+            state.double_array_value.data.extend(value if isinstance(value, (list, tuple)) else [value])
+        elif kind == "selectbox":
+            state.string_value = str(value)
+        elif kind == "multiselect":
+            state.string_array_value.data.extend(map(str, value))
+        else:
+            state.double_value = value
+        self.states[widget.id] = state
+        if widget.form_id:
+            return None  # fica no navegador até o submit
+        return await self.rerun(fragment_id)
+
+
+def start_server(app, port):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(app), "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(120):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError("Servidor Streamlit não respondeu")
+
+
+async def run_load(app, n_sessions, n_cycles, port):
+    proc = start_server(app, port)
+    try:
+        url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        sessions = [Sessao(url) for _ in range(n_sessions)]
+        await asyncio.gather(*(s.connect() for s in sessions))  # carga inicial, fora da medição
+
+        stats = {name: {"cpu": 0.0, "interacoes": 0, "reruns": 0, "latencias": []} for name, _, _ in CICLO}
+        for cycle in range(n_cycles):
+            for name, label, value in CICLO:
+                if name == "peso":
+                    value = 70.0 + cycle + 1
+                cpu0 = server_cpu_seconds(proc.pid)
+                lat = await asyncio.gather(*(s.interact(label, value) for s in sessions))
+                stats[name]["cpu"] += server_cpu_seconds(proc.pid) - cpu0
+                stats[name]["interacoes"] += len(sessions)
+                done = [x for x in lat if x is not None]
+                stats[name]["reruns"] += len(done)
+                stats[name]["latencias"] += done
+        await asyncio.gather(*(s.close() for s in sessions))
+    finally:
+        proc.terminate()
+        proc.wait()
+    return stats
+
+
+def report(title, stats):
+    print(f"\n{title}")
+    print(f"{'etapa':<18}{'reruns':>8}{'CPU/interação':>16}{'latência p50':>15}")
+    total = 0.0
+    for name, st in stats.items():
+        per = st["cpu"] / st["interacoes"] * 1000
+        total += per
+        p50 = f"{np.median(st['latencias']) * 1000:.0f} ms" if st["latencias"] else "-"
+        print(f"{name:<18}{st['reruns']:>8}{per:>13.1f} ms{p50:>15}")
+    print(f"{'ciclo completo':<18}{'':>8}{total:>13.1f} ms")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU do servidor por interação no app Streamlit")
+    parser.add_argument("app", nargs="?", default="app.py")
+    parser.add_argument("--sessoes", type=int, default=8)
+    parser.add_argument("--ciclos", type=int, default=5)
+    parser.add_argument("--porta", type=int, default=8599)
+    parser.add_argument("--antes", metavar="REVISAO", help="mede também o app.py desta revisão git")
+    args = parser.parse_args()
+
+    apps = [(args.app, args.app)]
+    old_app = None
+    if args.antes:
+        # Na mesma pasta, para que os imports e caminhos relativos continuem valendo
+        old_app = Path(args.app).with_name(f".app_{args.antes.replace('/', '_')}.py")
+        old_app.write_bytes(subprocess.run(["git", "show", f"{args.antes}:app.py"],
+                                           check=True, capture_output=True).stdout)
+        apps.insert(0, (f"{args.antes}:app.py", old_app))
+    try:
+        totals = {}
+        for title, path in apps:
+            stats = asyncio.run(run_load(path, args.sessoes, args.ciclos, args.porta))
+            totals[title] = report(f"{title} ({args.sessoes} sessões x {args.ciclos} ciclos)", stats)
+    finally:
+        if old_app is not None:
+            old_app.unlink(missing_ok=True)
+    if len(totals) == 2:
+        before, after = totals.values()
+        print(f"\nCPU por ciclo: {before:.1f} ms -> {after:.1f} ms ({before / after:.1f}x menos)")
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Teste de capacidade local: quantas sessões simultâneas um processo atende.
+
+Para cada nível de concorrência sobe um processo `streamlit run` novo e abre N
+sessões headless pelo websocket do navegador (driver de interaction_benchmark.py).
+Cada sessão repete, por --duracao segundos, o fluxo de um usuário real com
+tempo de reflexão aleatório entre ações:
+
+    app.py            peso novo (fragmento do IMC), preenche o formulário com
+                      valores sorteados e envia a predição
+    app_dashboard.py  troca o filtro de gênero, a faixa etária e o zoom de IMC
+
+Relata vazão (interações/s), latência p50/p95/p99 por ação e a memória
+residente do servidor: pico, e o acréscimo médio por sessão em relação ao
+processo aquecido com uma sessão.
+
+Uso:
+    python load_test.py app.py --sessoes 1,4,8,16 --duracao 60 --pensar 2
+    python load_test.py app_dashboard.py --sessoes 4 --duracao 30 --pensar 1 --json carga.json
+"""
+import argparse, asyncio, json, random, time
+from pathlib import Path
+
+import numpy as np
+
+from interaction_benchmark import Sessao, start_server, server_cpu_seconds
+
+
+def server_rss_mb(pid):
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+# =========================================================
+# Roteiros de usuário
+# =========================================================
+async def roteiro_app(sessao, rng):
+    """Um paciente: medidas (fragmento do IMC), formulário e envio"""
+    yield "peso", await sessao.interact("Peso (kg)", round(rng.uniform(45, 140), 1))
+    for label, (kind, widget, _) in list(sessao.widgets.items()):
+        if not widget.form_id or kind == "button":
+            continue
+        if kind == "slider":
+            valor = rng.choice(np.arange(widget.min, widget.max + widget.step / 2, widget.step).tolist())
+        elif kind == "selectbox":
+            valor = rng.choice(list(widget.options))
+        elif kind == "number_input":
+            valor = float(rng.randint(int(widget.min), int(min(widget.max, 70))))
+        else:
+            continue
+        await sessao.interact(label, valor)  # widgets do form: sem ida ao servidor
+    yield "predição", await sessao.interact("Realizar Predição", None)
+
+
+async def roteiro_dashboard(sessao, rng):
+    """Um analista trocando filtros do painel"""
+    _, generos, _ = sessao._find("Gênero")
+    opcoes = list(generos.options)
+    yield "filtro gênero", await sessao.interact("Gênero", rng.sample(opcoes, rng.randint(1, len(opcoes))))
+    _, idade, _ = sessao._find("Faixa Etária")
+    lo = rng.randint(int(idade.min), int(idade.max) - 10)
+    yield "faixa etária", await sessao.interact("Faixa Etária", (float(lo), float(rng.randint(lo + 5, int(idade.max)))))
+    _, imc, _ = sessao._find("Faixa de IMC")
+    lo = rng.uniform(imc.min, imc.max - 10)
+    yield "zoom IMC", await sessao.interact("Faixa de IMC", (round(lo * 2) / 2, round(min(lo + 15, imc.max) * 2) / 2))
+
+
+ROTEIROS = {"app.py": roteiro_app, "app_dashboard.py": roteiro_dashboard}
+
+
+# =========================================================
+# Execução
+# =========================================================
+async def usuario(url, roteiro, fim, pensar, seed, latencias, erros):
+    rng = random.Random(seed)
+    await asyncio.sleep(rng.uniform(0, pensar))  # chegadas escalonadas
+    sessao = Sessao(url)
+    try:
+        latencias.setdefault("carga inicial", []).append(await sessao.connect())
+        while time.perf_counter() < fim:
+            async for acao, lat in roteiro(sessao, rng):
+                if lat is not None:
+                    latencias.setdefault(acao, []).append(lat)
+                await asyncio.sleep(rng.expovariate(1 / pensar) if pensar > 0 else 0)
+                if time.perf_counter() >= fim:
+                    break
+        await sessao.close()
+    except Exception as exc:
+        erros.append(repr(exc))
+
+
+async def run_level(app, n_sessions, duration, think, port, seed=0):
+    proc = start_server(app, port)
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    roteiro = ROTEIROS[Path(app).name]
+    try:
+        # Aquecimento: modelo, dados e caches carregados por uma sessão descartável
+        aquecimento = Sessao(url)
+        await aquecimento.connect()
+        async for _ in roteiro(aquecimento, random.Random(seed)):
+            pass
+        await aquecimento.close()
+        rss_base = server_rss_mb(proc.pid)
+
+        latencias, erros, pico = {}, [], [rss_base]
+
+        async def monitor():
+            while True:
+                pico.append(server_rss_mb(proc.pid))
+                await asyncio.sleep(0.5)
+
+        mon = asyncio.create_task(monitor())
+        cpu0, t0 = server_cpu_seconds(proc.pid), time.perf_counter()
+        await asyncio.gather(*(
+            usuario(url, roteiro, t0 + duration, think, seed + i + 1, latencias, erros)
+            for i in range(n_sessions)
+        ))
+        elapsed = time.perf_counter() - t0
+        cpu = server_cpu_seconds(proc.pid) - cpu0
+        mon.cancel()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    acoes = {}
+    for acao, lats in latencias.items():
+        ms = np.array(lats) * 1000
+        acoes[acao] = {"n": len(ms), "p50_ms": float(np.percentile(ms, 50)),
+                       "p95_ms": float(np.percentile(ms, 95)), "p99_ms": float(np.percentile(ms, 99))}
+    todas = np.concatenate([np.array(v) for k, v in latencias.items() if k != "carga inicial"] or [np.array([])]) * 1000
+    return {
+        "sessoes": n_sessions,
+        "duracao_s": elapsed,
+        "interacoes": int(len(todas)),
+        "vazao_por_s": len(todas) / elapsed,
+        "p50_ms": float(np.percentile(todas, 50)) if len(todas) else None,
+        "p95_ms": float(np.percentile(todas, 95)) if len(todas) else None,
+        "p99_ms": float(np.percentile(todas, 99)) if len(todas) else None,
+        "cpu_servidor": cpu / elapsed,
+        "rss_base_mb": rss_base,
+        "rss_pico_mb": max(pico),
+        "mb_por_sessao": (max(pico) - rss_base) / n_sessions,
+        "acoes": acoes,
+        "erros": erros,
+    }
+
+
+def print_level(res):
+    print(f"\n{res['sessoes']} sessões: {res['interacoes']} interações em {res['duracao_s']:.0f}s "
+          f"-> {res['vazao_por_s']:.2f}/s, CPU do servidor {res['cpu_servidor'] * 100:.0f}%, "
+          f"RSS {res['rss_base_mb']:.0f} -> {res['rss_pico_mb']:.0f} MiB "
+          f"({res['mb_por_sessao']:.1f} MiB/sessão)")
+    print(f"  {'ação':<16}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for acao, st in res["acoes"].items():
+        print(f"  {acao:<16}{st['n']:>6}{st['p50_ms']:>8.0f}ms{st['p95_ms']:>8.0f}ms{st['p99_ms']:>8.0f}ms")
+    if res["erros"]:
+        print(f"  {len(res['erros'])} sessões com erro, ex.: {res['erros'][0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga com sessões Streamlit simuladas")
+    parser.add_argument("app", nargs="?", default="app.py", choices=sorted(ROTEIROS))
+    parser.add_argument("--sessoes", default="1,4,8", help="níveis de concorrência (lista separada por vírgula)")
+    parser.add_argument("--duracao", type=float, default=30.0, help="segundos por nível")
+    parser.add_argument("--pensar", type=float, default=2.0, help="tempo médio de reflexão entre ações (s)")
+    parser.add_argument("--porta", type=int, default=8598)
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    resultados = []
+    for n in [int(x) for x in args.sessoes.split(",")]:
+        res = asyncio.run(run_level(args.app, n, args.duracao, args.pensar, args.porta))
+        print_level(res)
+        resultados.append(res)
+
+    print(f"\n{'sessões':>8}{'vazão/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'CPU':>7}{'MiB/sessão':>12}")
+    for r in resultados:
+        print(f"{r['sessoes']:>8}{r['vazao_por_s']:>10.2f}{r['p50_ms']:>7.0f}ms{r['p95_ms']:>7.0f}ms"
+              f"{r['p99_ms']:>7.0f}ms{r['cpu_servidor'] * 100:>6.0f}%{r['mb_por_sessao']:>12.1f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
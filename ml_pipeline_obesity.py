@@ -1,43 +1,52 @@
 # -*- coding: utf-8 -*-
 import pandas as pd, numpy as np
 from pathlib import Path
-from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_score
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.compose import ColumnTransformer
+from sklearn.base import clone
 from sklearn.pipeline import Pipeline
-from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-from packaging import version
-import sklearn, joblib
+import joblib
 
 # =========================================================
 # 1) Leitura
 # =========================================================
-CSV_PATH = Path("Obesity.csv")  # garanta que está na mesma pasta
-df = pd.read_csv(CSV_PATH)
+import argparse
+parser = argparse.ArgumentParser(description="Treino do modelo de predição de obesidade")
+parser.add_argument("dados", nargs="?", default="Obesity.csv",
+                    help="CSV, Parquet ou Arrow IPC com os dados rotulados")
+parser.add_argument("--memoria-mb", type=float, default=None,
+                    help="ingestão out-of-core: lê em chunks e treina numa amostra estratificada deste tamanho")
+parser.add_argument("--repeticoes", type=int, default=3,
+                    help="repetições da CV estratificada de 5 folds (sementes 42, 43, ...)")
+parser.add_argument("--jobs", type=int, default=-1, help="jobs paralelos da CV (-1 = todos os núcleos)")
+parser.add_argument("--somente-exportar", action="store_true",
+                    help="pula CV e holdout: só o fit final (ou o cache dele) e a exportação; "
+                         "etapas derivadas só são reaproveitadas do cache, nunca recalculadas")
+parser.add_argument("--ensemble-folds", action="store_true",
+                    help="exporta os 5 modelos da CV (semente 42) como ensemble, sem holdout nem fit final")
+parser.add_argument("--duplicatas", choices=["pesos", "grupos", "manter"], default="pesos",
+                    help="linhas repetidas: deduplica com pesos, agrupa nas partições ou mantém como estão")
+args = parser.parse_args()
+
+CSV_PATH = Path(args.dados)  # padrão: Obesity.csv na mesma pasta
+stream_scaler = None
+if args.memoria_mb:
+    # Arquivos maiores que a RAM: amostra reservatório por classe + scaler por partial_fit
+    from streaming_ingest import stream_ingest
+    df, stream_scaler, ingest_report = stream_ingest(CSV_PATH, budget_mb=args.memoria_mb)
+    print("Ingestão out-of-core:", ingest_report["linhas_lidas"], "linhas lidas,",
+          ingest_report["linhas_invalidas"], "inválidas, amostra de", len(df), "linhas")
+elif CSV_PATH.suffix.lower() in (".parquet", ".arrow", ".feather", ".ipc"):
+    from arrow_io import read_table  # extratos do warehouse
+    df = read_table(CSV_PATH)
+else:
+    df = pd.read_csv(CSV_PATH)
 
 # =========================================================
 # 2) Renomear colunas (PT-BR)
 # =========================================================
-col_map_pt = {
-    "Gender": "Gênero",
-    "Age": "Idade",
-    "Height": "Altura",
-    "Weight": "Peso",
-    "family_history": "Histórico Familiar",
-    "FAVC": "FAVC",
-    "FCVC": "FCVC",
-    "NCP": "NCP",
-    "CAEC": "CAEC",
-    "SMOKE": "Fuma",
-    "CH2O": "Água por dia",
-    "SCC": "Conta Calorias",
-    "FAF": "Atividade Física",
-    "TUE": "Tempo em Telas",
-    "CALC": "Álcool",
-    "MTRANS": "Transporte",
-    "Obesity": "Obesidade"
-}
+# Mapeamentos de colunas/categorias ficam em obesity_schema.py, compartilhados
+# com os utilitários de pontuação em lote e benchmarks.
+from obesity_schema import col_map_pt, value_maps_pt, target_col, target_map_pt, numeric_features
 df = df.rename(columns=col_map_pt)
 
 # =========================================================
@@ -47,87 +56,284 @@ def map_vals(col, mapping):
     if col in df.columns:
         df[col] = df[col].map(mapping).fillna(df[col])
 
-map_vals("Gênero", {"Male": "Masculino", "Female": "Feminino"})
-map_vals("Histórico Familiar", {"yes": "Sim", "no": "Não"})
-map_vals("FAVC", {"yes": "Sim", "no": "Não"})
-map_vals("Fuma", {"yes": "Sim", "no": "Não"})
-map_vals("Conta Calorias", {"yes": "Sim", "no": "Não"})
-map_vals("CAEC", {"Sometimes": "Às vezes", "Frequently": "Frequentemente", "Always": "Sempre", "no": "Não"})
-map_vals("Álcool", {"no": "Não", "Sometimes": "Às vezes", "Frequently": "Frequentemente", "Always": "Sempre"})
-map_vals("Transporte", {
-    "Public_Transportation": "Transporte público",
-    "Walking": "Caminhada",
-    "Automobile": "Automóvel",
-    "Motorbike": "Motocicleta",
-    "Bike": "Bicicleta"
-})
+for col, mapping in value_maps_pt.items():
+    map_vals(col, mapping)
 
 # =========================================================
 # 4) Target e features (em PT-BR) + tradução das CLASSES do alvo
 # =========================================================
-target_col = "Obesidade"
-
-# Traduz as classes do alvo para PT-BR
-target_map_pt = {
-    "Insufficient_Weight": "Baixo_peso",
-    "Normal_Weight": "Peso_normal",
-    "Overweight_Level_I": "Sobrepeso_I",
-    "Overweight_Level_II": "Sobrepeso_II",
-    "Obesity_Type_I": "Obesidade_I",
-    "Obesity_Type_II": "Obesidade_II",
-    "Obesity_Type_III": "Obesidade_III",
-}
 y = df[target_col].map(target_map_pt).astype("category")
 
 X = df.drop(columns=[target_col])
 
 # Garante tipos numéricos corretos (evita problemas de vírgula/locale)
 num_cols = X.select_dtypes(include=[np.number]).columns.tolist()
-for c in ["Idade", "Altura", "Peso", "FCVC", "NCP", "Água por dia", "Atividade Física", "Tempo em Telas"]:
+for c in numeric_features:
     if c in X.columns:
         X[c] = pd.to_numeric(X[c], errors="coerce")
 
-cat_cols = X.select_dtypes(include=["object"]).columns.tolist()
+cat_cols = X.select_dtypes(include=["object", "string"]).columns.tolist()
 num_cols = X.select_dtypes(include=[np.number]).columns.tolist()
 
+# Linhas repetidas (hash vetorizado por linha, row_dedup.py): partições linha a
+# linha deixariam cópias no treino e no teste. "pesos" mantém uma linha por
+# (features, classe) com sample_weight = nº de cópias; "grupos" mantém as
+# linhas. Nos dois, o hash das features é o grupo em todas as partições.
+from row_dedup import holdout_split, prepare_rows
+X, y, sample_weight, groups, dedup_report = prepare_rows(X, y, args.duplicatas)
+if args.duplicatas == "pesos":
+    print(f"Duplicatas: {dedup_report['duplicatas']} de {dedup_report['linhas']} linhas, "
+          f"treino com {dedup_report['unicas']} linhas únicas e pesos "
+          f"({dedup_report['conflitantes']} conflitantes agrupadas)")
+elif args.duplicatas == "grupos":
+    print(f"Duplicatas: {dedup_report['duplicatas']} de {len(X)} linhas, partições por grupo de hash")
+
 # =========================================================
 # 5) Pré-processamento (compatível com várias versões do sklearn)
 # =========================================================
-from sklearn.preprocessing import OneHotEncoder
-ohe_kwargs = {"handle_unknown": "ignore"}
-if version.parse(sklearn.__version__) >= version.parse("1.2"):
-    ohe_kwargs["sparse_output"] = False
-else:
-    ohe_kwargs["sparse"] = False
-ohe = OneHotEncoder(**ohe_kwargs)
-
-preprocess = ColumnTransformer([
-    ("num", StandardScaler(), num_cols),
-    ("cat", ohe, cat_cols)
-])
-
-pipe = Pipeline([("prep", preprocess), ("clf", GradientBoostingClassifier(random_state=42))])
+# O passo "feat" acrescenta IMC, Peso/Altura e excesso de peso (obesity_features.py).
+# Com essas features o ensemble atinge a mesma acurácia de CV com menos árvores
+# e mais rasas (ver bmi_feature_study.py), reduzindo a latência de inferência.
+from obesity_features import build_pipeline, N_EST, DEPTH
+pipe = build_pipeline(num_cols, cat_cols, bmi=True, n_estimators=N_EST, max_depth=DEPTH)
 
 # =========================================================
 # 6) Validação (CV) + Holdout
 # =========================================================
-cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-scores = cross_val_score(pipe, X, y, cv=cv, scoring="accuracy")
-print("CV mean acc:", scores.mean(), "folds:", scores)
+# Holdout, fit final e destilação ficam em .train_cache/ (train_cache.py), com
+# chave nos dados, parâmetros, código e versões: rodar de novo sem mudanças só
+# recarrega os resultados.
+from train_cache import TrainCache
+from cv_store import fit_params
+train_cache = TrainCache(X, y, pipe, sample_weight=sample_weight, groups=groups)
+# Com --somente-exportar as etapas derivadas (dependência parcial, importância,
+# destilação) vêm do cache quando existem e, fora dele, ficam de fora
+calcular_derivadas = not args.somente_exportar
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42, stratify=y
-)
-pipe.fit(X_train, y_train)
-y_pred = pipe.predict(X_test)
-print("Holdout acc:", accuracy_score(y_test, y_pred))
-print("Report:\n", classification_report(y_test, y_pred, zero_division=0))
-print("CM:\n", confusion_matrix(y_test, y_pred))
+if not args.somente_exportar:
+    # CV estratificada repetida (sementes x 5 folds), em paralelo e com cache por fold
+    # em .cv_cache/: rodar de novo só calcula os folds que ainda não existem.
+    from cv_store import repeated_cv, summarize
+    cv_seeds = tuple(range(42, 42 + args.repeticoes))
+    cv_results = repeated_cv(pipe, X, y, n_splits=5, seeds=cv_seeds, n_jobs=args.jobs,
+                             keep_models=args.ensemble_folds, groups=groups, sample_weight=sample_weight)
+    scores = cv_results["accuracy"].to_numpy()
+    print("CV mean acc:", scores.mean(), "folds:", scores,
+          f"({cv_results.attrs['computed']} calculados, {cv_results.attrs['cached']} do cache)")
+    print(f"Fit médio por fold: {cv_results['fit_seconds'].mean():.2f}s ({len(X)} linhas, duplicatas: {args.duplicatas})")
+    print("CV resumo (IC 95%):\n", summarize(cv_results).round(4))
+
+    def holdout():
+        tr, te = holdout_split(X, y, groups)
+        w_train, w_test = (None, None) if sample_weight is None else (sample_weight[tr], sample_weight[te])
+        y_test = y.iloc[te]
+        y_pred = clone(pipe).fit(X.iloc[tr], y.iloc[tr], **fit_params(pipe, w_train)).predict(X.iloc[te])
+        return {
+            "acc": accuracy_score(y_test, y_pred, sample_weight=w_test),
+            "report": classification_report(y_test, y_pred, sample_weight=w_test, zero_division=0),
+            "cm": confusion_matrix(y_test, y_pred, sample_weight=w_test),
+        }
+
+    # Com --ensemble-folds as métricas out-of-fold substituem o holdout (seção 7)
+    if not args.ensemble_folds:
+        holdout_res, _ = train_cache.get_or_compute("holdout", holdout)
+        print("Holdout acc:", holdout_res["acc"])
+        print("Report:\n", holdout_res["report"])
+        print("CM:\n", holdout_res["cm"])
 
 # =========================================================
 # 7) Exporta modelo PT-BR
 # =========================================================
 MODEL_PATH = Path("obesity_pipeline.pkl")
-pipe.fit(X, y)
-joblib.dump(pipe, MODEL_PATH)
+
+def fit_final():
+    model = clone(pipe)
+    if stream_scaler is None:
+        return model.fit(X, y, **fit_params(model, sample_weight))
+    # Padronização com as estatísticas do arquivo completo (partial_fit), não só da amostra
+    X_feat = model.named_steps["feat"].fit_transform(X)
+    prep = model.named_steps["prep"].fit(X_feat)
+    num_scaler = prep.named_transformers_["num"]
+    # Estatísticas casadas por nome: a ordem do bloco "num" segue as colunas de X
+    stream_cols = list(stream_scaler.feature_names_in_)
+    faltando = set(num_scaler.feature_names_in_) - set(stream_cols)
+    if faltando:
+        raise ValueError(f"Scaler da ingestão sem as colunas {sorted(faltando)}")
+    order = [stream_cols.index(c) for c in num_scaler.feature_names_in_]
+    for attr in ("mean_", "var_", "scale_"):
+        setattr(num_scaler, attr, getattr(stream_scaler, attr)[order])
+    num_scaler.n_samples_seen_ = stream_scaler.n_samples_seen_
+    model.named_steps["clf"].fit(prep.transform(X_feat), y, sample_weight=sample_weight)
+    return model
+
+def build_ensemble():
+    # Os folds já estão no .cv_cache/ quando a CV rodou acima: nenhum fit extra
+    from fold_ensemble import fold_ensemble_from_cv
+    return fold_ensemble_from_cv(pipe, X, y, n_splits=5, seed=42, n_jobs=args.jobs,
+                                 groups=groups, sample_weight=sample_weight)
+
+scaler_stats = None if stream_scaler is None else (stream_scaler.mean_, stream_scaler.var_, stream_scaler.n_samples_seen_)
+if args.ensemble_folds:
+    if stream_scaler is not None:
+        print("Aviso: no ensemble dos folds cada fold usa o scaler da própria amostra (sem partial_fit)")
+    final_stage, final_fn, final_extra = "ensemble", build_ensemble, None
+else:
+    final_stage, final_fn, final_extra = "final", fit_final, scaler_stats
+pipe, _ = train_cache.get_or_compute(final_stage, final_fn, extra=final_extra)
+train_cache.export(final_stage, MODEL_PATH)
+if args.ensemble_folds:
+    oof = pipe.oof_metrics
+    print(f"Ensemble de {len(pipe.models)} folds - OOF acc: {oof['accuracy']:.4f}, log-loss: {oof['log_loss']:.4f}")
+    print("OOF recall por classe:", {c: round(r, 4) for c, r in oof["recall"].items()})
 print("Modelo PT salvo em", MODEL_PATH.resolve())
+
+# Publica no registro local: as apps em execução trocam para esta versão sem reiniciar
+from model_registry import publish
+versao_publicada = publish(MODEL_PATH)
+print("Versão publicada no registro:", versao_publicada)
+
+# Índice de pacientes semelhantes (k-NN) no espaço de features deste modelo, para o app
+from similar_patients import SimilarPatients
+print("Índice de vizinhos salvo em",
+      SimilarPatients.from_model(pipe, X, y, model_version=versao_publicada).save().resolve())
+
+# Dependência parcial (PDP/ICE e superfícies 2-D) deste modelo, para o painel
+# desenhar as curvas sem chamar o modelo; em cache junto da etapa final
+from partial_dependence import PartialDependence
+
+def partial_dependence():
+    return PartialDependence.from_model(pipe, X, n_jobs=args.jobs)
+
+pdp, _ = train_cache.get_or_compute(
+    "dependencia_parcial", partial_dependence, extra=train_cache.key(final_stage, final_fn, final_extra),
+    compute_missing=calcular_derivadas,
+)
+if pdp is None:
+    print("Dependência parcial: fora do cache, pulada (--somente-exportar)")
+else:
+    pdp.model_version = versao_publicada
+    print("Dependência parcial salva em", pdp.save().resolve())
+
+# Importância por permutação das features de entrada: mesma configuração do
+# modelo, ajustada no split do holdout e avaliada nos 20% restantes (o painel
+# mostra as importâncias só quando são da versão publicada)
+from permutation_importance import permutation_importance, save_importance
+
+def importance():
+    tr, te = holdout_split(X, y, groups)
+    template = clone(pipe if isinstance(pipe, Pipeline) else pipe.models[0])
+    w_train = None if sample_weight is None else sample_weight[tr]
+    model = template.fit(X.iloc[tr], y.iloc[tr], **fit_params(template, w_train))
+    w_test = None if sample_weight is None else sample_weight[te]
+    return permutation_importance(model, X.iloc[te], y.iloc[te], n_jobs=args.jobs, sample_weight=w_test)
+
+importancias, _ = train_cache.get_or_compute(
+    "importancia", importance, extra=train_cache.key(final_stage, final_fn, final_extra),
+    compute_missing=calcular_derivadas,
+)
+if importancias is None:
+    print("Importância por permutação: fora do cache, pulada (--somente-exportar)")
+else:
+    print("Importância por permutação (queda de acurácia):\n",
+          importancias.set_index("Feature")[["Importância", "Desvio"]].head(5).round(4))
+    print("Importâncias salvas em", save_importance(importancias, versao_publicada).resolve())
+
+# =========================================================
+# 8) Destilação: modelo compacto (tier de baixa latência)
+# =========================================================
+# O "aluno" é uma árvore rasa treinada sobre as mesmas features do `prep`,
+# imitando o predict_proba do "professor" (o ensemble acima) em dados reais
+# e sintéticos. Os rótulos suaves entram via replicação das linhas por classe
+# com sample_weight = probabilidade, mantendo um DecisionTreeClassifier comum.
+import json, time
+from sklearn.tree import DecisionTreeClassifier
+from obesity_features import DirectPrep
+
+LITE_MODEL_PATH = Path("obesity_pipeline_lite.pkl")
+LITE_REPORT_PATH = Path("obesity_pipeline_lite_report.json")
+N_SYNTH = 20000
+
+def distill():
+    """Treina o aluno e mede fidelidade/latência; retorna (lite_pipe, relatório)"""
+    rng = np.random.default_rng(42)
+
+    def synth_inputs(X_ref, n, rng):
+        """Gera pacientes sintéticos: reamostra linhas reais, perturba numéricas e troca categorias"""
+        base = X_ref.iloc[rng.integers(0, len(X_ref), n)].reset_index(drop=True)
+        for c in num_cols:
+            col = base[c].to_numpy(dtype=float)
+            noise = rng.normal(0.0, 0.15 * X_ref[c].std(), n)
+            base[c] = np.clip(col + noise, X_ref[c].min(), X_ref[c].max())
+        for c in cat_cols:
+            swap = rng.random(n) < 0.2
+            base.loc[swap, c] = X_ref[c].sample(int(swap.sum()), replace=True, random_state=int(rng.integers(1 << 31))).to_numpy()
+        return base
+
+    # Ensemble dos folds: o aluno usa as features do prefixo do primeiro fold
+    teacher_prep = pipe[:-1] if isinstance(pipe, Pipeline) else pipe.models[0][:-1]
+    X_distill = pd.concat([X, synth_inputs(X, N_SYNTH, rng)], ignore_index=True)
+    P_distill = pipe.predict_proba(X_distill)
+    Z_distill = teacher_prep.transform(X_distill)
+
+    n_cls = len(pipe.classes_)
+    student = DecisionTreeClassifier(max_depth=10, min_samples_leaf=5, random_state=42)
+    student.fit(
+        np.repeat(Z_distill, n_cls, axis=0),
+        np.tile(pipe.classes_, len(Z_distill)),
+        sample_weight=P_distill.ravel(),
+    )
+    # Frente NumPy equivalente a teacher_prep: o ColumnTransformer custaria mais que a árvore
+    lite_pipe = Pipeline([("direct", DirectPrep.from_prefix(teacher_prep)), ("clf", student)])
+    assert np.allclose(lite_pipe[:-1].transform(X), Z_distill[:len(X)])
+
+    # Fidelidade medida em dados reais e em um conjunto sintético não visto no treino
+    X_fid = pd.concat([X, synth_inputs(X, 5000, np.random.default_rng(7))], ignore_index=True)
+    teacher_pred = pipe.predict(X_fid)
+    student_pred = lite_pipe.predict(X_fid)
+
+    def bench(model, rows, repeat=20):
+        """Tempo médio (ms) de predict_proba para o lote informado"""
+        model.predict_proba(rows)
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            model.predict_proba(rows)
+        return (time.perf_counter() - t0) / repeat * 1000
+
+    one_row, batch = X.iloc[[0]], X_fid.iloc[:1000]
+    lat = {
+        "teacher_row_ms": bench(pipe, one_row),
+        "student_row_ms": bench(lite_pipe, one_row),
+        "teacher_batch1000_ms": bench(pipe, batch, 5),
+        "student_batch1000_ms": bench(lite_pipe, batch, 5),
+    }
+    lite_report = {
+        "agreement_real": float((teacher_pred[:len(X)] == student_pred[:len(X)]).mean()),
+        "agreement_synthetic": float((teacher_pred[len(X):] == student_pred[len(X):]).mean()),
+        "accuracy_vs_labels": float(accuracy_score(y, student_pred[:len(X)])),
+        "classes": list(pipe.classes_),
+        "confusion_vs_teacher": confusion_matrix(teacher_pred, student_pred, labels=pipe.classes_).tolist(),
+        "latency": lat,
+        "latency_ratio_row": lat["teacher_row_ms"] / lat["student_row_ms"],
+        "latency_ratio_batch": lat["teacher_batch1000_ms"] / lat["student_batch1000_ms"],
+        "student": {"max_depth": student.get_depth(), "n_leaves": int(student.get_n_leaves())},
+    }
+    return lite_pipe, lite_report
+
+# O aluno depende do modelo final: a chave da etapa final entra na chave da destilação
+destilado, _ = train_cache.get_or_compute(
+    "destilacao", distill, extra=(train_cache.key(final_stage, final_fn, final_extra), N_SYNTH),
+    compute_missing=calcular_derivadas,
+)
+if destilado is None:
+    print(f"Destilação: fora do cache, pulada (--somente-exportar); {LITE_MODEL_PATH} não foi atualizado")
+else:
+    lite_pipe, lite_report = destilado
+    print("Destilação - concordância real:", lite_report["agreement_real"],
+          "sintética:", lite_report["agreement_synthetic"],
+          "ganho de latência (linha/lote):", round(lite_report["latency_ratio_row"], 1),
+          round(lite_report["latency_ratio_batch"], 1))
+
+    joblib.dump(lite_pipe, LITE_MODEL_PATH)
+    LITE_REPORT_PATH.write_text(json.dumps(lite_report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print("Modelo compacto salvo em", LITE_MODEL_PATH.resolve())
+print("Cache de treino:", train_cache.summary())
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Registro local de modelos versionados com ponteiro "CURRENT" e troca a quente.
+
+Estrutura em disco:
+    model_registry/
+        versions/<hash>.pkl   # artefatos imutáveis, nomeados pelo hash do conteúdo
+        CURRENT               # texto com a versão ativa
+
+Publicar um modelo (o pipeline de treino já faz isso ao exportar):
+    python model_registry.py obesity_pipeline.pkl
+
+As apps mantêm um ModelRegistry por processo (via st.cache_resource). Uma thread
+em segundo plano observa o ponteiro, carrega a nova versão fora do caminho das
+requisições e troca a referência ativa de forma atômica.
+"""
+import hashlib, os, shutil, sys, tempfile, threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+
+import joblib
+
+REGISTRY_DIR = Path("model_registry")
+CURRENT_FILE = "CURRENT"
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Modo de um arquivo criado com open() sob a umask do processo. mkstemp cria
+# 0600 e os.replace mantém o modo: sem o chmod, apps rodando com outro usuário
+# não leriam os artefatos
+FILE_MODE = 0o666 & ~_umask()
+
+
+def content_hash(path, length=12):
+    """Hash SHA-256 (prefixo) do conteúdo do arquivo, usado como id de versão"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:length]
+
+
+def _atomic_write(path, data):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(tmp, FILE_MODE)
+    os.replace(tmp, path)
+
+
+def publish(model_path, registry_dir=REGISTRY_DIR, make_current=True):
+    """Copia o artefato para o registro e (opcionalmente) aponta CURRENT para ele"""
+    registry_dir = Path(registry_dir)
+    versions_dir = registry_dir / "versions"
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    version = content_hash(model_path)
+    target = versions_dir / f"{version}.pkl"
+    if not target.exists():
+        fd, tmp = tempfile.mkstemp(dir=versions_dir, prefix=".tmp-")
+        os.close(fd)
+        shutil.copyfile(model_path, tmp)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, target)
+    if make_current:
+        _atomic_write(registry_dir / CURRENT_FILE, version.encode())
+    return version
+
+
+def current_version(registry_dir=REGISTRY_DIR):
+    try:
+        return (Path(registry_dir) / CURRENT_FILE).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """Versões publicadas, da mais recente para a mais antiga"""
+    versions_dir = Path(registry_dir) / "versions"
+    if not versions_dir.exists():
+        return []
+    files = sorted(versions_dir.glob("*.pkl"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [p.stem for p in files]
+
+
+class ModelRegistry:
+    """Mantém o modelo ativo em memória e o troca quando CURRENT muda
+
+    Sem registro publicado, observa o arquivo `fallback_path` pelo hash do
+    conteúdo, de modo que sobrescrever obesity_pipeline.pkl também é detectado.
+    Versões fixadas (pin/shadow) ficam em memória em ordem LRU, no máximo
+    `max_pinned`; uma versão descartada é recarregada no próximo pedido.
+    """
+
+    def __init__(self, registry_dir=REGISTRY_DIR, fallback_path="obesity_pipeline.pkl", poll_interval=5.0,
+                 max_pinned=3):
+        self.registry_dir = Path(registry_dir)
+        self.fallback_path = Path(fallback_path)
+        self.poll_interval = poll_interval
+        self.max_pinned = max_pinned
+        self._models = {}               # versão -> modelo (ativo + versões fixadas)
+        self._loading = {}              # versão -> Future do carregamento em andamento
+        self._lock = threading.Lock()   # protege os dicionários; joblib.load roda fora dele
+        self._stop = threading.Event()
+        self._thread = None
+        self._fallback_stat = None
+        self._pinned = OrderedDict()    # versões fixadas na sidebar, da menos à mais recente
+        self._active = self._resolve()  # tupla (versão, modelo), trocada atomicamente
+
+    def _source(self):
+        version = current_version(self.registry_dir)
+        if version is not None:
+            return version, self.registry_dir / "versions" / f"{version}.pkl"
+        if not self.fallback_path.exists():
+            return None, None
+        stat = self.fallback_path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self._fallback_stat is None or self._fallback_stat[0] != key:
+            self._fallback_stat = (key, content_hash(self.fallback_path))
+        return self._fallback_stat[1], self.fallback_path
+
+    def _load(self, version, path):
+        # Um único carregamento por versão: quem chega depois espera o mesmo Future,
+        # e o lock só é tomado para consultar e publicar o resultado
+        with self._lock:
+            if version in self._models:
+                return self._models[version]
+            future = self._loading.get(version)
+            owner = future is None
+            if owner:
+                future = self._loading[version] = Future()
+        if not owner:
+            return future.result()
+        try:
+            model = joblib.load(path)
+        except BaseException as exc:
+            with self._lock:
+                del self._loading[version]
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._models[version] = model
+            del self._loading[version]
+        future.set_result(model)
+        return model
+
+    def _evict(self, version):
+        # Chamado com o lock: descarta a versão, a menos que seja a ativa ou esteja fixada
+        if version != self._active[0] and version not in self._pinned:
+            self._models.pop(version, None)
+
+    def _resolve(self):
+        version, path = self._source()
+        if version is None:
+            return None, None
+        return version, self._load(version, path)
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                version, path = self._source()
+                if version is not None and version != self._active[0]:
+                    new_active = (version, self._load(version, path))
+                    old_version = self._active[0]
+                    self._active = new_active
+                    # Libera a versão anterior, a menos que esteja fixada por alguém
+                    with self._lock:
+                        self._evict(old_version)
+            except Exception as exc:  # mantém o modelo atual se a nova versão falhar
+                print(f"[model_registry] falha ao trocar modelo: {exc}", file=sys.stderr)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="model-registry-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self, version=None):
+        """Retorna (versão, modelo): o ativo, ou uma versão fixada para shadow/A-B"""
+        if version is None or version == self._active[0]:
+            return self._active
+        with self._lock:
+            self._pinned[version] = True
+            self._pinned.move_to_end(version)
+            while len(self._pinned) > self.max_pinned:
+                self._evict(self._pinned.popitem(last=False)[0])
+        return version, self._load(version, self.registry_dir / "versions" / f"{version}.pkl")
+
+    def unpin(self, version):
+        """Desfaz a fixação de uma versão e a libera da memória (se não for a ativa)"""
+        with self._lock:
+            self._pinned.pop(version, None)
+            self._evict(version)
+
+    def versions(self):
+        return list_versions(self.registry_dir)
+
+
+if __name__ == "__main__":
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("obesity_pipeline.pkl")
+    print("Versão publicada:", publish(path))
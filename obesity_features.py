@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Features derivadas de Altura e Peso, aplicadas dentro do Pipeline do sklearn.
+
+O IMC é uma razão (Peso / Altura²) que árvores só conseguem aproximar com muitos
+cortes alinhados aos eixos. Calculá-lo explicitamente no Pipeline garante que
+treino, app.py e pontuação em lote usem exatamente a mesma transformação.
+"""
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+
+# Meio da faixa de IMC saudável (18.5 - 24.9), a mesma usada no card de Peso Ideal
+IMC_REFERENCIA = 21.7
+
+# Gradient Boosting de produção (ver bmi_feature_study.py), também usado pelos
+# benchmarks para medirem o mesmo modelo que o treino exporta
+N_EST, DEPTH = 50, 2  # antes: 100 árvores de profundidade 3, sem as features derivadas
+
+
+def derived_features(cols):
+    """Calcula as features derivadas a partir de um mapeamento coluna -> vetor
+
+    Funciona tanto com DataFrame quanto com dicionário de arrays NumPy (caminho Arrow).
+    """
+    altura2 = cols["Altura"] ** 2
+    return {
+        "IMC": cols["Peso"] / altura2,
+        "Peso por Altura": cols["Peso"] / cols["Altura"],
+        "Excesso de Peso": cols["Peso"] - IMC_REFERENCIA * altura2,
+    }
+
+
+DERIVED_COLUMNS = ["IMC", "Peso por Altura", "Excesso de Peso"]
+
+
+class BMIFeatures(BaseEstimator, TransformerMixin):
+    """Adiciona IMC, Peso/Altura e excesso de peso em relação ao IMC de referência"""
+
+    def fit(self, X, y=None):
+        self.feature_names_in_ = list(X.columns)
+        return self
+
+    def transform(self, X):
+        X = X.copy()
+        for name, values in derived_features(X).items():
+            X[name] = values
+        return X
+
+    def get_feature_names_out(self, input_features=None):
+        return list(input_features if input_features is not None else self.feature_names_in_) + DERIVED_COLUMNS
+
+
+def build_pipeline(num_cols, cat_cols, bmi=True, **clf_params):
+    """Monta o Pipeline de treino: [feat] -> prep (scaler + one-hot) -> Gradient Boosting"""
+    import sklearn
+    from packaging import version
+    from sklearn.compose import ColumnTransformer
+    from sklearn.ensemble import GradientBoostingClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    # Compatível com várias versões do sklearn
+    ohe_kwargs = {"handle_unknown": "ignore"}
+    if version.parse(sklearn.__version__) >= version.parse("1.2"):
+        ohe_kwargs["sparse_output"] = False
+    else:
+        ohe_kwargs["sparse"] = False
+
+    num = list(num_cols) + (DERIVED_COLUMNS if bmi else [])
+    preprocess = ColumnTransformer([
+        ("num", StandardScaler(), num),
+        ("cat", OneHotEncoder(**ohe_kwargs), list(cat_cols))
+    ])
+    steps = [("feat", BMIFeatures())] if bmi else []
+    steps += [("prep", preprocess), ("clf", GradientBoostingClassifier(random_state=42, **clf_params))]
+    return Pipeline(steps)
+
+
+class DirectPrep(BaseEstimator, TransformerMixin):
+    """[feat BMIFeatures] -> prep já ajustados, reduzidos a operações NumPy
+
+    Reproduz prep.transform (StandardScaler + OneHotEncoder com handle_unknown="ignore")
+    sem copiar o DataFrame nem passar pelo ColumnTransformer, cujo custo fixo domina a
+    predição de uma linha. Usado na frente do modelo destilado (tier rápido do app).
+    """
+
+    def __init__(self, num_cols, mean, scale, cat_cols, categories):
+        self.num_cols = num_cols
+        self.mean = mean
+        self.scale = scale
+        self.cat_cols = cat_cols
+        self.categories = categories
+
+    @classmethod
+    def from_prefix(cls, prefix):
+        """Extrai os parâmetros do prefixo [feat] -> prep de um Pipeline treinado"""
+        prep = prefix.named_steps["prep"]
+        blocks = {name: (est, cols) for name, est, cols in prep.transformers_ if est != "drop"}
+        scaler, num_cols = blocks["num"]
+        ohe, cat_cols = blocks["cat"]
+        return cls(list(num_cols), scaler.mean_, scaler.scale_, list(cat_cols),
+                   [list(c) for c in ohe.categories_])
+
+    def fit(self, X, y=None):
+        return self
+
+    def __sklearn_is_fitted__(self):
+        return True  # os parâmetros já vêm do prep treinado
+
+    def transform(self, X):
+        raw = [c for c in self.num_cols if c not in DERIVED_COLUMNS]
+        cols = dict(zip(raw, X[raw].to_numpy(dtype=float).T))
+        if len(raw) < len(self.num_cols):
+            cols.update(derived_features(cols))
+        num = np.column_stack([cols[c] for c in self.num_cols])
+        onehot = [X[c].to_numpy()[:, None] == np.asarray(cats, dtype=object)
+                  for c, cats in zip(self.cat_cols, self.categories)]
+        return np.hstack([(num - self.mean) / self.scale] + onehot)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Esquema compartilhado do dataset: nomes de colunas e categorias em PT-BR.
+
+Usado pelo pipeline de treino e pelos utilitários de pontuação/benchmark, para
+que todos traduzam o Obesity.csv exatamente da mesma forma.
+"""
+import pandas as pd
+
+col_map_pt = {
+    "Gender": "Gênero",
+    "Age": "Idade",
+    "Height": "Altura",
+    "Weight": "Peso",
+    "family_history": "Histórico Familiar",
+    "FAVC": "FAVC",
+    "FCVC": "FCVC",
+    "NCP": "NCP",
+    "CAEC": "CAEC",
+    "SMOKE": "Fuma",
+    "CH2O": "Água por dia",
+    "SCC": "Conta Calorias",
+    "FAF": "Atividade Física",
+    "TUE": "Tempo em Telas",
+    "CALC": "Álcool",
+    "MTRANS": "Transporte",
+    "Obesity": "Obesidade"
+}
+
+value_maps_pt = {
+    "Gênero": {"Male": "Masculino", "Female": "Feminino"},
+    "Histórico Familiar": {"yes": "Sim", "no": "Não"},
+    "FAVC": {"yes": "Sim", "no": "Não"},
+    "Fuma": {"yes": "Sim", "no": "Não"},
+    "Conta Calorias": {"yes": "Sim", "no": "Não"},
+    "CAEC": {"Sometimes": "Às vezes", "Frequently": "Frequentemente", "Always": "Sempre", "no": "Não"},
+    "Álcool": {"no": "Não", "Sometimes": "Às vezes", "Frequently": "Frequentemente", "Always": "Sempre"},
+    "Transporte": {
+        "Public_Transportation": "Transporte público",
+        "Walking": "Caminhada",
+        "Automobile": "Automóvel",
+        "Motorbike": "Motocicleta",
+        "Bike": "Bicicleta"
+    },
+}
+
+target_col = "Obesidade"
+
+# Classes do alvo em PT-BR
+target_map_pt = {
+    "Insufficient_Weight": "Baixo_peso",
+    "Normal_Weight": "Peso_normal",
+    "Overweight_Level_I": "Sobrepeso_I",
+    "Overweight_Level_II": "Sobrepeso_II",
+    "Obesity_Type_I": "Obesidade_I",
+    "Obesity_Type_II": "Obesidade_II",
+    "Obesity_Type_III": "Obesidade_III",
+}
+
+numeric_features = ["Idade", "Altura", "Peso", "FCVC", "NCP", "Água por dia", "Atividade Física", "Tempo em Telas"]
+
+
+def translate_frame(df):
+    """Renomeia colunas e categorias do CSV original para PT-BR (retorna um novo DataFrame)"""
+    df = df.rename(columns=col_map_pt)
+    for col, mapping in value_maps_pt.items():
+        if col in df.columns:
+            df[col] = df[col].map(mapping).fillna(df[col])
+    # Garante tipos numéricos corretos (evita problemas de vírgula/locale)
+    for c in numeric_features:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df
+
+
+def load_features(csv_path="Obesity.csv"):
+    """Lê o CSV e devolve (X, y) já traduzidos, no formato esperado pelo modelo"""
+    df = translate_frame(pd.read_csv(csv_path))
+    y = df[target_col].map(target_map_pt).astype("category")
+    return df.drop(columns=[target_col]), y
+
+
+# Faixas e opções aceitas na entrada (as mesmas dos widgets do app.py)
+input_ranges = {
+    "Idade": (0.0, 120.0),
+    "Altura": (1.0, 2.3),
+    "Peso": (20.0, 300.0),
+    "FCVC": (0.0, 3.0),
+    "NCP": (1.0, 4.0),
+    "Água por dia": (1.0, 3.0),
+    "Atividade Física": (0.0, 3.0),
+    "Tempo em Telas": (0.0, 3.0),
+}
+
+input_categories = {
+    "Gênero": ["Masculino", "Feminino"],
+    "Histórico Familiar": ["Sim", "Não"],
+    "FAVC": ["Sim", "Não"],
+    "CAEC": ["Não", "Às vezes", "Frequentemente", "Sempre"],
+    "Fuma": ["Não", "Sim"],
+    "Conta Calorias": ["Sim", "Não"],
+    "Álcool": ["Não", "Às vezes", "Frequentemente", "Sempre"],
+    "Transporte": ["Transporte público", "Caminhada", "Automóvel", "Motocicleta", "Bicicleta"],
+}
+
+# Ordem das colunas de entrada do modelo
+feature_order = [
+    "Gênero", "Idade", "Altura", "Peso", "Histórico Familiar", "FAVC", "FCVC", "NCP",
+    "CAEC", "Fuma", "Água por dia", "Conta Calorias", "Atividade Física", "Tempo em Telas",
+    "Álcool", "Transporte",
+]
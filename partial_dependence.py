@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Dependência parcial (PDP), curvas individuais (ICE) e superfícies 2-D do modelo.
+
+Calculadas uma vez no treino (ml_pipeline_obesity.py) e salvas junto do modelo
+com a versão dele, para o painel desenhar as curvas sem chamar o modelo.
+
+Para cada feature, uma amostra fixa de pacientes de referência é replicada uma
+vez por ponto da grade, com a feature sobrescrita pelo valor do ponto, e tudo
+vai num único predict_proba (grade x amostra linhas). A média sobre a amostra é
+a PDP; as linhas dos primeiros pacientes são as curvas ICE. Os pares de features
+usam a grade cartesiana das duas. Features e pares são distribuídos entre
+processos com joblib; chamar o modelo ponto a ponto, como faz
+sklearn.inspection.partial_dependence (method="brute"), paga o custo fixo do
+Pipeline a cada ponto e não aceita o FoldEnsemble.
+
+Uso (benchmark em lote x ponto a ponto, com conferência dos valores):
+    python partial_dependence.py [obesity_pipeline.pkl] [Obesity.csv]
+"""
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from obesity_schema import feature_order, input_categories, numeric_features
+
+PDP_PATH = Path("obesity_pipeline_pdp.joblib")
+
+# Pares com superfície 2-D no painel
+PAIRS = [("Atividade Física", "Peso"), ("Altura", "Peso"), ("Idade", "Atividade Física")]
+
+GRID_RESOLUTION = 20       # pontos da grade por feature numérica (1-D)
+PAIR_RESOLUTION = 15       # pontos por eixo nas superfícies 2-D
+N_BACKGROUND = 400         # pacientes da amostra de referência
+N_ICE = 40                 # curvas ICE guardadas por feature
+PERCENTILES = (2.5, 97.5)  # grade numérica entre estes percentis (caudas extremas fora)
+
+
+def feature_grid(values, feature, resolution=GRID_RESOLUTION):
+    """Valores da grade: categorias presentes ou pontos entre os percentis da coluna"""
+    if feature not in numeric_features:
+        presentes = set(values.dropna())
+        ordem = [c for c in input_categories.get(feature, []) if c in presentes]
+        return np.array(ordem + sorted(presentes - set(ordem)), dtype=object)
+    v = values.dropna().to_numpy(dtype=float)
+    unicos = np.unique(v)
+    if len(unicos) <= resolution:
+        return unicos
+    lo, hi = np.percentile(v, PERCENTILES)
+    return np.linspace(lo, hi, resolution)
+
+
+def _replicate(background, settings):
+    """Amostra repetida uma vez por ponto; `settings` = {feature: valor por ponto}"""
+    n_points = len(next(iter(settings.values())))
+    X = background.iloc[np.tile(np.arange(len(background)), n_points)].reset_index(drop=True)
+    for feature, valores in settings.items():
+        X[feature] = pd.Series(np.repeat(valores, len(background)), dtype=background[feature].dtype)
+    return X
+
+
+def _curve(model, background, feature, grid, n_ice):
+    """(pdp, ice): médias (pontos x classes) e curvas dos primeiros n_ice pacientes"""
+    proba = model.predict_proba(_replicate(background, {feature: grid}))
+    proba = proba.reshape(len(grid), len(background), -1)
+    return proba.mean(axis=1).astype(np.float32), proba[:, :n_ice].transpose(1, 0, 2).astype(np.float32)
+
+
+def _surface(model, background, pair, grids):
+    """PDP 2-D (pontos de a x pontos de b x classes)"""
+    a, b = pair
+    ga, gb = grids
+    proba = model.predict_proba(_replicate(background, {a: np.repeat(ga, len(gb)), b: np.tile(gb, len(ga))}))
+    return proba.reshape(len(ga), len(gb), len(background), -1).mean(axis=2).astype(np.float32)
+
+
+class PartialDependence:
+    """Curvas PDP/ICE por feature e superfícies por par, já calculadas para uma versão do modelo"""
+
+    def __init__(self, classes, curves, surfaces, n_background, model_version=None):
+        self.classes = list(classes)
+        self.curves = curves      # {feature: {"grid", "pdp" (pontos x classes), "ice" (n_ice x pontos x classes)}}
+        self.surfaces = surfaces  # {(a, b): {"grid_a", "grid_b", "pdp" (pontos_a x pontos_b x classes)}}
+        self.n_background = n_background
+        self.model_version = model_version
+
+    @classmethod
+    def from_model(cls, model, X, features=feature_order, pairs=PAIRS, n_background=N_BACKGROUND,
+                   n_ice=N_ICE, resolution=GRID_RESOLUTION, pair_resolution=PAIR_RESOLUTION,
+                   n_jobs=-1, seed=0, model_version=None):
+        background = X.sample(min(n_background, len(X)), random_state=seed).reset_index(drop=True)
+        features = [f for f in features if f in X.columns]
+        grids = {f: feature_grid(X[f], f, resolution) for f in features}
+        pair_grids = {p: tuple(feature_grid(X[f], f, pair_resolution) for f in p) for p in pairs}
+        tasks = [delayed(_curve)(model, background, f, grids[f], n_ice) for f in features]
+        tasks += [delayed(_surface)(model, background, p, pair_grids[p]) for p in pairs]
+        results = Parallel(n_jobs=n_jobs)(tasks)
+        curves = {
+            f: {"grid": grids[f], "pdp": pdp, "ice": ice}
+            for f, (pdp, ice) in zip(features, results[:len(features)])
+        }
+        surfaces = {
+            p: {"grid_a": pair_grids[p][0], "grid_b": pair_grids[p][1], "pdp": pdp}
+            for p, pdp in zip(pairs, results[len(features):])
+        }
+        return cls(model.classes_, curves, surfaces, len(background), model_version)
+
+    def curve(self, feature, classe):
+        """PDP de uma classe: DataFrame (valor, probabilidade)"""
+        c = self.curves[feature]
+        return pd.DataFrame({feature: c["grid"], "Probabilidade": c["pdp"][:, self.classes.index(classe)]})
+
+    def ice(self, feature, classe):
+        """Curvas ICE de uma classe: array (pacientes x pontos da grade)"""
+        return self.curves[feature]["ice"][:, :, self.classes.index(classe)]
+
+    def surface(self, pair, classe):
+        """(grid_a, grid_b, matriz pontos_a x pontos_b) da probabilidade de uma classe"""
+        s = self.surfaces[tuple(pair)]
+        return s["grid_a"], s["grid_b"], s["pdp"][:, :, self.classes.index(classe)]
+
+    def save(self, path=PDP_PATH):
+        joblib.dump(self, path)
+        return path
+
+
+def load_partial_dependence(model_version, path=PDP_PATH):
+    """Curvas salvas para esta versão do modelo, ou None se ausentes/de outra versão"""
+    try:
+        pdp = joblib.load(path)
+    except FileNotFoundError:
+        return None
+    return pdp if pdp.model_version == model_version else None
+
+
+if __name__ == "__main__":
+    import argparse, pickle
+
+    from obesity_schema import load_features
+
+    parser = argparse.ArgumentParser(description="PDP/ICE em lote x ponto a ponto: benchmark")
+    parser.add_argument("modelo", nargs="?", default="obesity_pipeline.pkl")
+    parser.add_argument("dados", nargs="?", default="Obesity.csv")
+    parser.add_argument("--jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    model = joblib.load(args.modelo)
+    X, _ = load_features(args.dados)
+
+    t0 = time.perf_counter()
+    pdp = PartialDependence.from_model(model, X, n_jobs=args.jobs)
+    t_batch = time.perf_counter() - t0
+    n_pontos = sum(len(c["grid"]) for c in pdp.curves.values()) + sum(
+        len(s["grid_a"]) * len(s["grid_b"]) for s in pdp.surfaces.values())
+
+    # Referência: um predict_proba por ponto da grade, sequencial
+    background = X.sample(pdp.n_background, random_state=0).reset_index(drop=True)
+    t0 = time.perf_counter()
+    for f, c in pdp.curves.items():
+        ref = np.array([model.predict_proba(_replicate(background, {f: [v]})).mean(axis=0) for v in c["grid"]])
+        assert np.allclose(ref, c["pdp"], atol=1e-5), f
+    for (a, b), s in pdp.surfaces.items():
+        ref = np.array([[model.predict_proba(_replicate(background, {a: [va], b: [vb]})).mean(axis=0)
+                         for vb in s["grid_b"]] for va in s["grid_a"]])
+        assert np.allclose(ref, s["pdp"], atol=1e-5), (a, b)
+    t_loop = time.perf_counter() - t0
+
+    print(f"{len(pdp.curves)} features + {len(pdp.surfaces)} pares, {n_pontos} pontos de grade, "
+          f"amostra de {pdp.n_background} pacientes")
+    print(f"{'em lote (joblib)':<22}{t_batch:8.2f}s")
+    print(f"{'ponto a ponto':<22}{t_loop:8.2f}s  ({t_loop / t_batch:.1f}x)")
+    print(f"Artefato: {len(pickle.dumps(pdp)) / 1024:.0f} KiB")
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Índice de percentis da população de referência (Obesity.csv) por segmento.
+
+Para cada segmento (gênero x faixa etária, só gênero e a população inteira) e
+cada feature numérica do app.py, guarda os valores ordenados num array NumPy.
+O percentil de um paciente é uma busca binária (np.searchsorted) nesse array,
+sem filtrar o DataFrame a cada requisição. Empates usam o meio da faixa
+empatada (midrank), já que FCVC, NCP, FAF e afins têm muitos valores repetidos.
+Segmentos com poucos pacientes caem para o nível seguinte, mais amplo.
+
+Uso (benchmark busca binária x filtro no DataFrame):
+    python percentile_index.py [Obesity.csv]
+"""
+import numpy as np
+import pandas as pd
+
+# Features com percentil no painel do app (IMC é calculado de Peso/Altura)
+PERCENTILE_FEATURES = ["Idade", "Altura", "Peso", "IMC", "FCVC", "NCP", "Água por dia",
+                       "Atividade Física", "Tempo em Telas"]
+
+# Faixas etárias: (início inclusivo, fim exclusivo, rótulo)
+FAIXAS_IDADE = [
+    (0, 20, "até 20 anos"),
+    (20, 30, "20–30 anos"),
+    (30, 40, "30–40 anos"),
+    (40, np.inf, "40+ anos"),
+]
+
+MIN_SEGMENT_ROWS = 30  # abaixo disso o percentil usa o segmento mais amplo
+
+
+def faixa_idade(idade):
+    """Rótulo da faixa etária (None para idade ausente)"""
+    for inicio, fim, rotulo in FAIXAS_IDADE:
+        if inicio <= idade < fim:
+            return rotulo
+    return None
+
+
+class PercentileIndex:
+    """Valores ordenados por (gênero, faixa) -> feature; consultas O(log n)"""
+
+    def __init__(self, sorted_values):
+        self.sorted_values = sorted_values  # {(gênero|None, faixa|None): {feature: array ordenado}}
+
+    @classmethod
+    def from_frame(cls, X, features=PERCENTILE_FEATURES, min_rows=MIN_SEGMENT_ROWS):
+        """Constrói o índice a partir das features já traduzidas (obesity_schema.load_features)"""
+        X = X.copy()
+        X["IMC"] = X["Peso"] / X["Altura"] ** 2
+        X["Faixa"] = pd.cut(X["Idade"], [f[0] for f in FAIXAS_IDADE] + [np.inf], right=False,
+                            labels=[f[2] for f in FAIXAS_IDADE])
+        grupos = [(None, None)]
+        grupos += [(g, None) for g in X["Gênero"].dropna().unique()]
+        grupos += [(g, f) for g, f in X[["Gênero", "Faixa"]].dropna().drop_duplicates().itertuples(index=False)]
+        sorted_values = {}
+        for genero, faixa in grupos:
+            mask = np.ones(len(X), dtype=bool)
+            if genero is not None:
+                mask &= (X["Gênero"] == genero).to_numpy()
+            if faixa is not None:
+                mask &= (X["Faixa"] == faixa).to_numpy()
+            if mask.sum() < min_rows and genero is not None:
+                continue
+            seg = X.loc[mask, features]
+            sorted_values[(genero, faixa)] = {
+                f: np.sort(seg[f].dropna().to_numpy(dtype=float)) for f in features
+            }
+        return cls(sorted_values)
+
+    @classmethod
+    def from_csv(cls, csv_path="Obesity.csv", **kwargs):
+        from obesity_schema import load_features
+        return cls.from_frame(load_features(csv_path)[0], **kwargs)
+
+    def segment(self, genero=None, idade=None):
+        """Chave do segmento mais específico disponível para o paciente"""
+        faixa = faixa_idade(idade) if idade is not None else None
+        for key in ((genero, faixa), (genero, None), (None, None)):
+            if key in self.sorted_values:
+                return key
+        raise KeyError("Índice sem a população de referência")
+
+    def percentile(self, feature, value, genero=None, idade=None):
+        """(percentil 0-100, segmento, n) do valor no segmento do paciente"""
+        key = self.segment(genero, idade)
+        values = self.sorted_values[key][feature]
+        lo = np.searchsorted(values, value, side="left")
+        hi = np.searchsorted(values, value, side="right")
+        return 100.0 * (lo + hi) / (2 * len(values)), key, len(values)
+
+    def profile(self, row, features=PERCENTILE_FEATURES):
+        """Percentis de todas as features de um paciente (dict/Series com colunas PT-BR)"""
+        row = dict(row)
+        row.setdefault("IMC", row["Peso"] / row["Altura"] ** 2)
+        genero, idade = row.get("Gênero"), row.get("Idade")
+        linhas = []
+        for f in features:
+            pct, key, n = self.percentile(f, float(row[f]), genero, idade)
+            linhas.append({"Feature": f, "Valor": float(row[f]), "Percentil": pct,
+                           "Segmento": segment_label(key), "N": n})
+        return pd.DataFrame(linhas)
+
+
+def segment_label(key):
+    genero, faixa = key
+    if genero is None:
+        return "população inteira"
+    return f"{genero}, {faixa}" if faixa is not None else f"{genero}, todas as idades"
+
+
+if __name__ == "__main__":
+    import sys, time
+
+    from obesity_schema import load_features
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "Obesity.csv"
+    X, _ = load_features(csv_path)
+    t0 = time.perf_counter()
+    index = PercentileIndex.from_frame(X)
+    print(f"Índice: {len(index.sorted_values)} segmentos construídos em {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    paciente = X.iloc[0].to_dict()
+    print(index.profile(paciente).round(1).to_string(index=False))
+
+    # Alternativa ingênua: filtrar o segmento e comparar a coluna a cada consulta
+    X_imc = X.assign(IMC=X["Peso"] / X["Altura"] ** 2)
+    def scan(feature, value, genero, idade):
+        inicio, fim, _ = next(f for f in FAIXAS_IDADE if f[0] <= idade < f[1])
+        seg = X_imc[(X_imc["Gênero"] == genero) & (X_imc["Idade"] >= inicio) & (X_imc["Idade"] < fim)][feature]
+        return 100.0 * ((seg < value).mean() + (seg <= value).mean()) / 2
+
+    g, i = paciente["Gênero"], paciente["Idade"]
+    for nome, fn in (("busca binária", index.percentile), ("filtro no DataFrame", scan)):
+        n = 2000 if nome == "busca binária" else 200
+        t0 = time.perf_counter()
+        for k in range(n):
+            fn("Atividade Física", 0.5 + (k % 5) * 0.5, g, i)
+        print(f"{nome:<20} {(time.perf_counter() - t0) / n * 1e6:8.1f} µs por feature")
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Importância por permutação das 16 features de entrada, em paralelo e sobre uma
+única matriz pré-processada do holdout.
+
+O pré-processamento do modelo (features de IMC, StandardScaler, OneHotEncoder)
+roda uma vez sobre o holdout. Permutar uma feature de entrada equivale a
+permutar as linhas das colunas que dependem dela nessa matriz: a coluna
+padronizada de uma numérica ou o bloco one-hot de uma categórica. Altura e
+Peso também alimentam IMC, Peso/Altura e excesso de peso, recalculados a partir
+dos valores brutos permutados com a média/escala do scaler. Cada par
+(feature, repetição) é uma tarefa independente que só chama o classificador,
+distribuída entre processos com joblib.
+
+sklearn.inspection.permutation_importance sobre o Pipeline refaz o
+pré-processamento do holdout inteiro em cada permutação; é a referência do
+benchmark. Pipelines sem o pré-processamento padrão usam esse caminho.
+
+Uso (benchmark paralelo x sequencial ingênuo, com conferência dos valores):
+    python permutation_importance.py [Obesity.csv] [--repeticoes 10] [--jobs -1]
+"""
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from joblib import Parallel, delayed
+from sklearn.metrics import accuracy_score
+
+from arrow_io import batch_model_matrix, direct_prep
+from obesity_features import DERIVED_COLUMNS, derived_features
+from similar_patients import feature_prefix
+
+IMPORTANCE_PATH = Path("obesity_pipeline_importance.joblib")
+N_REPEATS = 10
+
+
+def column_groups(prep, features):
+    """Colunas da matriz pré-processada que dependem de cada feature de entrada"""
+    blocks = {name: (est, cols) for name, est, cols in prep.transformers_ if est != "drop"}
+    _, num_cols = blocks["num"]
+    ohe, cat_cols = blocks["cat"]
+    groups = {f: [j] for j, f in enumerate(num_cols) if f in features}
+    base = len(num_cols)
+    for col, cats in zip(cat_cols, ohe.categories_):
+        groups[col] = list(range(base, base + len(cats)))
+        base += len(cats)
+    return groups
+
+
+class HoldoutMatrix:
+    """Holdout pré-processado uma vez; gera a matriz com uma feature de entrada permutada"""
+
+    def __init__(self, prep, X, features):
+        self.Z, _ = batch_model_matrix(pa.RecordBatch.from_pandas(X, preserve_index=False), prep)
+        self.groups = column_groups(prep, features)
+        scaler, num_cols = next((est, cols) for name, est, cols in prep.transformers_ if name == "num")
+        self.derived = [(num_cols.index(c), scaler.mean_[num_cols.index(c)], scaler.scale_[num_cols.index(c)], c)
+                        for c in DERIVED_COLUMNS if c in num_cols]
+        self.raw = {c: X[c].to_numpy(dtype=float) for c in ("Altura", "Peso")}
+
+    def permuted(self, feature, perm):
+        Z = self.Z.copy()
+        cols = self.groups[feature]
+        Z[:, cols] = self.Z[perm][:, cols]
+        if feature in self.raw and self.derived:
+            raw = dict(self.raw)
+            raw[feature] = raw[feature][perm]
+            values = derived_features(raw)
+            for j, mean, scale, c in self.derived:
+                Z[:, j] = (values[c] - mean) / scale
+        return Z
+
+
+def _permuted_score(clf, holdout, y, feature, seed, sample_weight=None):
+    perm = np.random.default_rng(seed).permutation(len(y))
+    return accuracy_score(y, clf.predict(holdout.permuted(feature, perm)), sample_weight=sample_weight)
+
+
+def permutation_importance(model, X, y, n_repeats=N_REPEATS, n_jobs=-1, seed=0, sample_weight=None):
+    """Queda de acurácia ao permutar cada feature: DataFrame ordenado (média, desvio, por repetição)
+
+    Modelos Pipeline com o pré-processamento padrão usam a matriz única do
+    holdout; os demais caem no sklearn.inspection.permutation_importance.
+    Com sample_weight (linhas deduplicadas com pesos) a acurácia é ponderada,
+    como no fit.
+    """
+    t0 = time.perf_counter()
+    features = list(X.columns)
+    y = np.asarray(y, dtype=object)
+    prep = direct_prep(feature_prefix(model)) if hasattr(model, "steps") else None
+    if prep is None:
+        from sklearn.inspection import permutation_importance as sk_permutation_importance
+        baseline = accuracy_score(y, model.predict(X), sample_weight=sample_weight)
+        drops = sk_permutation_importance(model, X, y, n_repeats=n_repeats, n_jobs=n_jobs,
+                                          random_state=seed, sample_weight=sample_weight).importances
+    else:
+        clf = model[-1]
+        holdout = HoldoutMatrix(prep, X, features)
+        baseline = accuracy_score(y, clf.predict(holdout.Z), sample_weight=sample_weight)
+        seeds = np.random.SeedSequence(seed).generate_state(n_repeats)
+        scores = Parallel(n_jobs=n_jobs)(
+            delayed(_permuted_score)(clf, holdout, y, f, int(s), sample_weight) for f in features for s in seeds
+        )
+        drops = baseline - np.asarray(scores).reshape(len(features), n_repeats)
+    out = pd.DataFrame({
+        "Feature": features,
+        "Importância": drops.mean(axis=1),
+        "Desvio": drops.std(axis=1),
+    })
+    out["Repetições"] = list(drops)
+    out = out.sort_values("Importância", ascending=False, ignore_index=True)
+    out.attrs.update(acuracia_base=float(baseline), linhas=len(y), repeticoes=n_repeats,
+                     segundos=time.perf_counter() - t0)
+    return out
+
+
+def save_importance(importances, model_version, path=IMPORTANCE_PATH):
+    joblib.dump({"model_version": model_version, "importancias": importances}, path)
+    return path
+
+
+def load_importance(model_version, path=IMPORTANCE_PATH):
+    """Importâncias salvas para esta versão do modelo, ou None se ausentes/de outra versão"""
+    try:
+        saved = joblib.load(path)
+    except FileNotFoundError:
+        return None
+    return saved["importancias"] if saved["model_version"] == model_version else None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sklearn.base import clone
+    from sklearn.inspection import permutation_importance as sk_permutation_importance
+    from sklearn.model_selection import train_test_split
+
+    from obesity_features import build_pipeline, N_EST, DEPTH
+    from obesity_schema import load_features, numeric_features
+
+    parser = argparse.ArgumentParser(description="Importância por permutação: paralela x sequencial ingênua")
+    parser.add_argument("dados", nargs="?", default="Obesity.csv")
+    parser.add_argument("--repeticoes", type=int, default=N_REPEATS)
+    parser.add_argument("--jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    X, y = load_features(args.dados)
+    cat_cols = [c for c in X.columns if c not in numeric_features]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    model = clone(build_pipeline(numeric_features, cat_cols, n_estimators=N_EST, max_depth=DEPTH)).fit(X_train, y_train)
+    y_test = np.asarray(y_test, dtype=object)
+    print(f"Holdout: {len(X_test)} linhas, {X.shape[1]} features x {args.repeticoes} repetições")
+
+    # A matriz permutada deve ser igual a pré-processar o holdout com a coluna permutada
+    holdout = HoldoutMatrix(direct_prep(feature_prefix(model)), X_test, list(X.columns))
+    perm = np.random.default_rng(0).permutation(len(X_test))
+    for f in X.columns:
+        X_perm = X_test.copy()
+        X_perm[f] = X_test[f].to_numpy()[perm]
+        assert np.allclose(holdout.permuted(f, perm), feature_prefix(model).transform(X_perm)), f
+
+    tempos = {}
+    t0 = time.perf_counter()
+    sk = sk_permutation_importance(model, X_test, y_test, n_repeats=args.repeticoes, n_jobs=1, random_state=0)
+    tempos["sklearn no Pipeline (sequencial)"] = time.perf_counter() - t0
+    for nome, jobs in (("matriz única, 1 processo", 1), (f"matriz única, jobs={args.jobs}", args.jobs)):
+        t0 = time.perf_counter()
+        res = permutation_importance(model, X_test, y_test, n_repeats=args.repeticoes, n_jobs=jobs)
+        tempos[nome] = time.perf_counter() - t0
+
+    base = tempos["sklearn no Pipeline (sequencial)"]
+    for nome, t in tempos.items():
+        print(f"{nome:<36}{t:8.2f}s  ({base / t:.1f}x)")
+
+    # Sementes diferentes: as médias devem coincidir dentro do ruído da permutação
+    sk_media = pd.Series(sk.importances_mean, index=X.columns)
+    comparacao = res.set_index("Feature")[["Importância", "Desvio"]].assign(sklearn=sk_media)
+    print(f"Acurácia base: {res.attrs['acuracia_base']:.4f}")
+    print(comparacao.round(4).to_string())
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de regras vetorizado: categoria de IMC e fatores de risco por paciente.
+
+As faixas de IMC e os fatores de risco são tabelas declarativas avaliadas com
+numpy.select e máscaras booleanas sobre colunas inteiras, de modo que o mesmo
+código atende um paciente no app.py, cada chunk da pontuação em lote e as
+coortes do painel. As colunas esperadas são as do esquema PT-BR
+(obesity_schema.translate_frame); o IMC é calculado de Peso/Altura se faltar.
+
+Uso (benchmark em milhões de linhas):
+    python risk_rules.py [Obesity.csv] [--linhas 2000000]
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Faixas de IMC: (limite superior exclusivo, categoria, cor)
+IMC_FAIXAS = [
+    (18.5, "Baixo Peso", "🟢"),
+    (25.0, "Peso Normal", "🟢"),
+    (30.0, "Sobrepeso", "🟡"),
+    (35.0, "Obesidade I", "🟠"),
+    (40.0, "Obesidade II", "🔴"),
+    (np.inf, "Obesidade III", "🔴"),
+]
+
+Regra = namedtuple("Regra", "id coluna operador limiar cor descricao")
+
+REGRAS_RISCO = [
+    Regra("imc_elevado", "IMC", ">=", 30, "🔴", "IMC elevado (≥30)"),
+    Regra("historico_familiar", "Histórico Familiar", "==", "Sim", "🟡", "Histórico familiar de obesidade"),
+    Regra("hipercaloricos", "FAVC", "==", "Sim", "🟡", "Consumo frequente de alimentos hipercalóricos"),
+    Regra("poucos_vegetais", "FCVC", "<", 2, "🟡", "Baixo consumo de vegetais"),
+    Regra("sedentarismo", "Atividade Física", "<", 1, "🔴", "Sedentarismo (atividade física insuficiente)"),
+    Regra("hidratacao", "Água por dia", "<", 2, "🟡", "Hidratação inadequada"),
+    Regra("telas", "Tempo em Telas", ">=", 1.5, "🟡", "Tempo excessivo em telas"),
+    Regra("tabagismo", "Fuma", "==", "Sim", "🔴", "Tabagismo"),
+    Regra("alcool", "Álcool", "in", ("Frequentemente", "Sempre"), "🟠", "Consumo frequente de álcool"),
+    Regra("transporte_passivo", "Transporte", "==", "Automóvel", "🟡", "Baixa atividade física no transporte"),
+]
+
+# Colunas acrescentadas aos arquivos da pontuação em lote (colunas_saida)
+COLUNAS_SAIDA = ["categoria_imc", "n_fatores_risco"] + [f"risco_{r.id}" for r in REGRAS_RISCO]
+
+# Métodos de Series: comparações de texto rodam nos kernels do pandas, não em
+# arrays object do NumPy, e NaN nunca dispara a regra
+_OPERADORES = {
+    ">=": lambda s, t: s.ge(t),
+    "<": lambda s, t: s.lt(t),
+    "==": lambda s, t: s.eq(t),
+    "in": lambda s, t: s.isin(list(t)),
+}
+
+
+def imc_values(df):
+    """IMC como vetor float (coluna IMC, se existir, ou Peso / Altura²)"""
+    if "IMC" in df:
+        return np.asarray(df["IMC"], dtype=float)
+    return np.asarray(df["Peso"], dtype=float) / np.asarray(df["Altura"], dtype=float) ** 2
+
+
+def categoria_imc(imc):
+    """(categoria, cor) por linha como Categorical; IMC ausente/NaN fica sem categoria
+
+    O np.select escolhe só o código int8 da faixa; os rótulos entram uma vez
+    nas categorias, sem materializar milhões de strings.
+    """
+    imc = np.atleast_1d(np.asarray(imc, dtype=float))
+    conds = [imc < limite for limite, _, _ in IMC_FAIXAS]
+    conds[-1] = imc >= IMC_FAIXAS[-2][0]  # última faixa fechada, para NaN não cair nela
+    codes = np.select(conds, np.arange(len(IMC_FAIXAS), dtype=np.int8), default=-1).astype(np.int8)
+    categoria = pd.Categorical.from_codes(codes, [c for _, c, _ in IMC_FAIXAS])
+    # Cores se repetem entre faixas: categorias únicas + remapeamento dos códigos
+    cores = list(dict.fromkeys(c for _, _, c in IMC_FAIXAS))
+    cor_code = np.array([cores.index(c) for _, _, c in IMC_FAIXAS] + [-1], dtype=np.int8)
+    cor = pd.Categorical.from_codes(cor_code[codes], cores)
+    return categoria, cor
+
+
+def risk_flags(df, regras=REGRAS_RISCO):
+    """DataFrame booleano (linhas x regras); coluna ausente ou valor NaN não dispara a regra"""
+    flags = {}
+    for r in regras:
+        if r.coluna == "IMC":
+            valores = pd.Series(imc_values(df), index=df.index)
+        elif r.coluna in df:
+            valores = df[r.coluna]
+        else:
+            flags[r.id] = np.zeros(len(df), dtype=bool)
+            continue
+        flags[r.id] = _OPERADORES[r.operador](valores, r.limiar).to_numpy(dtype=bool)
+    return pd.DataFrame(flags, index=df.index)
+
+
+def avaliar(df, regras=REGRAS_RISCO):
+    """IMC, categoria, uma coluna booleana por regra e o total de fatores de cada linha"""
+    imc = imc_values(df)
+    categoria, cor = categoria_imc(imc)
+    flags = risk_flags(df, regras)
+    out = pd.DataFrame({"IMC": imc, "Categoria IMC": categoria, "Cor IMC": cor}, index=df.index)
+    out = out.join(flags)
+    out["N Fatores"] = flags.to_numpy().sum(axis=1)
+    return out
+
+
+def colunas_saida(avaliacao):
+    """Colunas de avaliar() com os nomes de COLUNAS_SAIDA (arquivos da pontuação em lote)"""
+    out = pd.DataFrame({
+        "categoria_imc": avaliacao["Categoria IMC"],
+        "n_fatores_risco": avaliacao["N Fatores"].astype(np.int8),
+    }, index=avaliacao.index)
+    for r in REGRAS_RISCO:
+        out[f"risco_{r.id}"] = avaliacao[r.id]
+    return out
+
+
+def fatores_do_paciente(flags_row, regras=REGRAS_RISCO):
+    """Lista '<cor> <descrição>' das regras disparadas numa linha de risk_flags/avaliar"""
+    return [f"{r.cor} {r.descricao}" for r in regras if bool(flags_row[r.id])]
+
+
+def prevalencia(flags, grupos=None, regras=REGRAS_RISCO):
+    """Fração de pacientes com cada fator, no total ou por grupo (colunas = descrições)"""
+    nomes = {r.id: r.descricao for r in regras}
+    flags = flags[[r.id for r in regras]]
+    if grupos is None:
+        return flags.mean().rename(nomes)
+    return flags.groupby(grupos, observed=True).mean().rename(columns=nomes)
+
+
+if __name__ == "__main__":
+    import argparse, time
+
+    from obesity_schema import load_features
+
+    parser = argparse.ArgumentParser(description="Benchmark do motor de regras de risco")
+    parser.add_argument("dados", nargs="?", default="Obesity.csv")
+    parser.add_argument("--linhas", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    X, _ = load_features(args.dados)
+    big = X.iloc[np.random.default_rng(0).integers(0, len(X), args.linhas)].reset_index(drop=True)
+    t0 = time.perf_counter()
+    res = avaliar(big)
+    dt = time.perf_counter() - t0
+    print(f"{len(big):,} linhas avaliadas em {dt:.2f}s ({len(big) / dt:,.0f} linhas/s)")
+    print("Categorias de IMC:\n", res["Categoria IMC"].value_counts(normalize=True).round(4))
+    print("Prevalência dos fatores:\n", prevalencia(res).round(4))
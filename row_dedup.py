@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Linhas duplicadas no treino: hash vetorizado por linha, deduplicação com pesos
+e partições por grupo.
+
+O Obesity.csv tem linhas exatamente repetidas. Com partições linha a linha
+(StratifiedKFold, train_test_split) uma cópia cai no treino e a outra no teste,
+inflando a acurácia, e cada cópia ainda custa tempo de fit. Cada linha é
+normalizada (numéricas arredondadas, textos sem espaços nas pontas e em caixa
+baixa) e vira um hash de 64 bits com pd.util.hash_pandas_object, sem laço
+Python; textos são normalizados uma vez por valor distinto. Dois tratamentos:
+
+    "pesos"   uma linha por (features, classe), com sample_weight = nº de cópias,
+              e o hash só das features como grupo: o fit fica mais barato e
+              cópias com classes diferentes também ficam do mesmo lado
+    "grupos"  mantém as linhas e usa o hash das features como grupo
+              (StratifiedGroupKFold): cópias nunca ficam dos dois lados
+
+Uso (duplicatas, custo do hash e efeito na CV: partição cega x grupos x pesos):
+    python row_dedup.py [Obesity.csv] [--linhas 1000000] [--jobs -1]
+"""
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedGroupKFold, train_test_split
+
+DEDUP_MODES = ("pesos", "grupos", "manter")
+DECIMALS = 6  # numéricas iguais até esta casa decimal contam como o mesmo valor
+
+
+def _column_keys(df):
+    """Colunas prontas para o hash: numéricas arredondadas (e -0.0 -> 0.0); textos viram o
+    hash do valor aparado em caixa baixa, normalizado só uma vez por valor distinto"""
+    out = {}
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_numeric_dtype(s):
+            out[c] = s.to_numpy(dtype=float).round(DECIMALS) + 0.0
+        else:
+            codes, uniques = pd.factorize(s, use_na_sentinel=False)
+            normalizados = pd.Series(uniques, dtype="string").str.strip().str.casefold()
+            out[c] = pd.util.hash_pandas_object(normalizados, index=False).to_numpy()[codes]
+    return pd.DataFrame(out)
+
+
+def row_hashes(df):
+    """Hash uint64 de cada linha normalizada (independe do índice)"""
+    return pd.util.hash_pandas_object(_column_keys(df), index=False).to_numpy()
+
+
+def duplicate_groups(X):
+    """Id de grupo por linha: linhas com as mesmas features normalizadas têm o mesmo id"""
+    return pd.factorize(row_hashes(X))[0]
+
+
+def deduplicate(X, y):
+    """(X_único, y_único, pesos, relatório): primeira ocorrência de cada (features, classe)
+
+    Linhas com as mesmas features e classes diferentes são mantidas separadas
+    (contadas como conflitantes no relatório).
+    """
+    y_arr = np.asarray(y, dtype=object)
+    h_feat = row_hashes(X)
+    h_row = pd.util.hash_pandas_object(
+        pd.DataFrame({"f": h_feat, "y": pd.Series(y_arr, dtype="string")}), index=False
+    ).to_numpy()
+    _, first, counts = np.unique(h_row, return_index=True, return_counts=True)
+    order = np.argsort(first)  # mantém a ordem original do arquivo
+    keep, weights = first[order], counts[order].astype(float)
+    labels_per_feat = pd.Series(h_row).groupby(h_feat).transform("nunique").to_numpy()
+    report = {
+        "linhas": len(X),
+        "unicas": len(keep),
+        "duplicatas": len(X) - len(keep),
+        "conflitantes": int((labels_per_feat > 1).sum()),
+    }
+    y_out = y.iloc[keep].reset_index(drop=True) if isinstance(y, pd.Series) else y_arr[keep]
+    return X.iloc[keep].reset_index(drop=True), y_out, weights, report
+
+
+def prepare_rows(X, y, mode="pesos"):
+    """(X, y, sample_weight, groups, relatório) para um dos DEDUP_MODES
+
+    Em "pesos" as linhas deduplicadas ainda levam o hash das features como
+    grupo, para que linhas conflitantes (mesmas features, classes diferentes)
+    não fiquem dos dois lados de uma partição.
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"mode deve ser um de {DEDUP_MODES}")
+    if mode == "pesos":
+        X, y, weights, report = deduplicate(X, y)
+        return X, y, weights, duplicate_groups(X), report
+    if mode == "grupos":
+        groups = duplicate_groups(X)
+        return X, y, None, groups, {"linhas": len(X), "duplicatas": len(X) - groups.max() - 1}
+    return X, y, None, None, {"linhas": len(X), "duplicatas": 0}
+
+
+def holdout_split(X, y, groups=None, test_size=0.2, seed=42):
+    """(índices de treino, índices de teste) estratificados; com grupos, um grupo fica de um lado só"""
+    if groups is None:
+        return train_test_split(np.arange(len(X)), test_size=test_size, random_state=seed, stratify=y)
+    cv = StratifiedGroupKFold(n_splits=round(1 / test_size), shuffle=True, random_state=seed)
+    return next(cv.split(X, y, groups))
+
+
+if __name__ == "__main__":
+    import argparse, tempfile, time
+
+    from cv_store import repeated_cv
+    from obesity_features import build_pipeline, N_EST, DEPTH
+    from obesity_schema import load_features
+
+    parser = argparse.ArgumentParser(description="Duplicatas no treino: hash e efeito na CV")
+    parser.add_argument("dados", nargs="?", default="Obesity.csv")
+    parser.add_argument("--linhas", type=int, default=1_000_000, help="tamanho do benchmark de hash")
+    parser.add_argument("--jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    X, y = load_features(args.dados)
+    X_u, y_u, w, g_u, rep = prepare_rows(X, y, "pesos")
+    print(f"{rep['linhas']} linhas, {rep['unicas']} únicas, {rep['duplicatas']} duplicatas, "
+          f"{rep['conflitantes']} com features iguais e classes diferentes")
+
+    big = X.iloc[np.random.default_rng(0).integers(0, len(X), args.linhas)].reset_index(drop=True)
+    t0 = time.perf_counter()
+    row_hashes(big)
+    t_vec = time.perf_counter() - t0
+    amostra = big.iloc[:100_000]
+    t0 = time.perf_counter()
+    [hash(tuple(r)) for r in amostra.itertuples(index=False)]
+    t_loop = (time.perf_counter() - t0) * len(big) / len(amostra)
+    print(f"Hash de {len(big):,} linhas: vetorizado {t_vec:.2f}s, laço Python (extrapolado) {t_loop:.2f}s "
+          f"({t_loop / t_vec:.0f}x)")
+
+    # CV sem cache para os três tratamentos, mesmas sementes
+    cat_cols = X.select_dtypes(include=["object", "string"]).columns.tolist()
+    num_cols = X.select_dtypes(include=[np.number]).columns.tolist()
+    pipe = build_pipeline(num_cols, cat_cols, bmi=True, n_estimators=N_EST, max_depth=DEPTH)
+    cenarios = {
+        "partição cega": dict(X=X, y=y),
+        "grupos por hash": dict(X=X, y=y, groups=duplicate_groups(X)),
+        "deduplicado + pesos": dict(X=X_u, y=y_u, sample_weight=w, groups=g_u),
+    }
+    print(f"{'':<22}{'linhas':>8}{'acurácia CV':>13}{'fit/fold':>10}{'CV total':>10}")
+    for nome, kwargs in cenarios.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = time.perf_counter()
+            res = repeated_cv(pipe, n_jobs=args.jobs, cache_dir=tmp, **kwargs)
+            total = time.perf_counter() - t0
+        print(f"{nome:<22}{len(kwargs['X']):>8}{res['accuracy'].mean():>13.4f}"
+              f"{res['fit_seconds'].mean():>9.2f}s{total:>9.2f}s")
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Pacientes históricos mais parecidos com o paciente avaliado (k-NN com árvore espacial).
+
+Os pacientes de referência são projetados uma vez pelo pré-processamento do
+próprio modelo (pipe[:-1]: features de IMC, StandardScaler e OneHotEncoder
+ajustados), de modo que a distância usa exatamente o espaço em que o modelo foi
+treinado: numéricas em desvios-padrão e cada categoria diferente somando 2 ao
+quadrado da distância (duas colunas do one-hot). Sobre essa matriz é construída
+uma KDTree (ou BallTree) do sklearn, salva junto do modelo com a versão dele;
+consultas em lote usam a mesma árvore.
+
+Projetar uma linha pelo ColumnTransformer custa ~10 ms, muito mais que a busca
+na árvore. Por isso lotes usam o caminho direto do arrow_io (batch_model_matrix)
+e um paciente avulso (dict) é codificado com as médias, escalas e categorias
+já extraídas do `prep`, em microssegundos; as três formas dão a mesma matriz.
+
+Uso (benchmark de construção e consulta, dataset real e referência ampliada):
+    python similar_patients.py [obesity_pipeline.pkl] [Obesity.csv] [--linhas 1000000]
+"""
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sklearn.neighbors import BallTree, KDTree
+
+from arrow_io import batch_model_matrix, direct_prep
+from obesity_features import derived_features
+
+NEIGHBORS_PATH = Path("obesity_pipeline_neighbors.joblib")
+TREES = {"kd_tree": KDTree, "ball_tree": BallTree}
+
+# Colunas do paciente de referência mostradas junto de cada vizinho
+DISPLAY_COLUMNS = ["Gênero", "Idade", "Altura", "Peso", "Histórico Familiar", "Atividade Física"]
+
+
+def feature_prefix(model):
+    """Pré-processamento ajustado do modelo (Pipeline ou FoldEnsemble: primeiro fold)"""
+    if hasattr(model, "steps"):
+        return model[:-1]
+    return model.models[0][:-1]
+
+
+class SimilarPatients:
+    """Árvore espacial sobre os pacientes de referência no espaço de features do modelo"""
+
+    def __init__(self, prefix, X_ref, y_ref, algorithm="kd_tree", leaf_size=40, model_version=None):
+        self.prefix = prefix
+        self.prep = direct_prep(prefix)
+        if self.prep is not None:
+            self._unpack_prep()
+        self.model_version = model_version
+        Z = np.ascontiguousarray(self.transform(X_ref), dtype=np.float64)
+        self.tree = TREES[algorithm](Z, leaf_size=leaf_size)
+        self.labels = np.asarray(y_ref, dtype=object)
+        self.reference = X_ref[[c for c in DISPLAY_COLUMNS if c in X_ref.columns]].reset_index(drop=True)
+
+    @classmethod
+    def from_model(cls, model, X_ref, y_ref, **kwargs):
+        return cls(feature_prefix(model), X_ref, y_ref, **kwargs)
+
+    def _unpack_prep(self):
+        """Parâmetros do StandardScaler/OneHotEncoder para codificar um paciente sem pandas"""
+        blocks = {name: (est, cols) for name, est, cols in self.prep.transformers_ if est != "drop"}
+        scaler, self._num_cols = blocks["num"]
+        ohe, self._cat_cols = blocks["cat"]
+        self._mean, self._scale = scaler.mean_, scaler.scale_
+        self._positions = [{v: i for i, v in enumerate(cats)} for cats in ohe.categories_]
+        widths = [len(cats) for cats in ohe.categories_]
+        self._offsets = np.cumsum([len(self._num_cols)] + widths)[:-1]
+        self._width = len(self._num_cols) + sum(widths)
+
+    def encode_patient(self, paciente):
+        """Vetor (1, n_features) de um paciente (dict com colunas PT-BR)"""
+        if self.prep is None:
+            return self.prefix.transform(pd.DataFrame([paciente]))
+        cols = {c: float(paciente[c]) for c in self._num_cols if c in paciente}
+        if len(cols) < len(self._num_cols):
+            cols.update(derived_features(cols))
+        z = np.zeros(self._width)
+        z[:len(self._num_cols)] = (np.array([cols[c] for c in self._num_cols]) - self._mean) / self._scale
+        for c, positions, offset in zip(self._cat_cols, self._positions, self._offsets):
+            k = positions.get(paciente[c])
+            if k is not None:  # categoria desconhecida: zeros, como handle_unknown="ignore"
+                z[offset + k] = 1.0
+        return z[None, :]
+
+    def transform(self, X):
+        """Features do modelo para as linhas de X (caminho Arrow quando o prefixo permite)"""
+        if self.prep is None:
+            return self.prefix.transform(X)
+        Z, _ = batch_model_matrix(pa.RecordBatch.from_pandas(X, preserve_index=False), self.prep)
+        return Z
+
+    def query(self, X, k=5):
+        """(distâncias, índices) dos k vizinhos de cada linha de X; uma única chamada à árvore"""
+        return self.tree.query(self.transform(X), k=k)
+
+    def neighbors(self, paciente, k=5):
+        """Tabela dos k pacientes de referência mais próximos de um paciente (dict)"""
+        dist, idx = self.tree.query(self.encode_patient(paciente), k=k)
+        out = self.reference.iloc[idx[0]].reset_index(drop=True)
+        out.insert(0, "Classe Real", self.labels[idx[0]])
+        out.insert(1, "Distância", dist[0])
+        return out
+
+    def save(self, path=NEIGHBORS_PATH):
+        joblib.dump(self, path)
+        return path
+
+
+def load_neighbors(model_version, path=NEIGHBORS_PATH):
+    """Índice salvo para esta versão do modelo, ou None se ausente/de outra versão"""
+    try:
+        index = joblib.load(path)
+    except FileNotFoundError:
+        return None
+    return index if index.model_version == model_version else None
+
+
+# =========================================================
+# Benchmark: construção, consulta unitária e em lote
+# =========================================================
+def _bench(index, X_query, k=5):
+    pacientes = X_query.iloc[:200].to_dict("records")
+    times = []
+    for paciente in pacientes:
+        t0 = time.perf_counter()
+        index.tree.query(index.encode_patient(paciente), k=k)
+        times.append(time.perf_counter() - t0)
+    Z = index.transform(X_query)
+    t_tree = []
+    for _ in range(200):
+        z = Z[np.random.randint(len(Z))][None, :]
+        t0 = time.perf_counter()
+        index.tree.query(z, k=k)
+        t_tree.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    index.query(X_query, k)
+    t_batch = time.perf_counter() - t0
+    return np.median(times) * 1000, np.median(t_tree) * 1000, len(X_query) / t_batch
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from obesity_schema import load_features, numeric_features
+
+    parser = argparse.ArgumentParser(description="k-NN de pacientes parecidos: benchmark")
+    parser.add_argument("modelo", nargs="?", default="obesity_pipeline.pkl")
+    parser.add_argument("dados", nargs="?", default="Obesity.csv")
+    parser.add_argument("--linhas", type=int, default=1_000_000, help="tamanho da referência ampliada")
+    args = parser.parse_args()
+
+    model = joblib.load(args.modelo)
+    X, y = load_features(args.dados)
+
+    # Referência ampliada: reamostra o dataset e perturba as numéricas (sem pontos duplicados)
+    rng = np.random.default_rng(0)
+    idx = rng.integers(0, len(X), args.linhas)
+    X_big = X.iloc[idx].reset_index(drop=True)
+    for c in numeric_features:
+        X_big[c] = X_big[c] + rng.normal(0, 0.05 * X[c].std(), len(X_big))
+    y_big = y.to_numpy()[idx]
+    X_query = X.sample(10_000, replace=True, random_state=1).reset_index(drop=True)
+
+    print(f"{'referência':>12}{'árvore':>11}{'construção':>12}{'paciente (app)':>16}{'só árvore':>11}{'lote 10k':>14}")
+    for nome, Xr, yr in (("dataset", X, y), (f"{args.linhas:,}", X_big, y_big)):
+        for algo in TREES:
+            t0 = time.perf_counter()
+            index = SimilarPatients.from_model(model, Xr, yr, algorithm=algo)
+            t_build = time.perf_counter() - t0
+            ms_row, ms_tree, rps = _bench(index, X_query)
+            print(f"{nome:>12}{algo:>11}{t_build:>11.2f}s{ms_row:>14.3f}ms{ms_tree:>9.3f}ms{rps:>10,.0f} q/s")
+
+    # Sanidade: concordância da classe dos vizinhos com a predição do modelo
+    index = SimilarPatients.from_model(model, X, y)
+    _, nn = index.query(X, k=6)
+    vizinhos = index.labels[nn[:, 1:]]  # descarta o próprio paciente
+    pred = np.asarray(model.predict(X), dtype=object)
+    print(f"Classe predita igual à maioria dos 5 vizinhos: "
+          f"{np.mean([pd.Series(v).mode()[0] == p for v, p in zip(vizinhos, pred)]):.3f}")
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Fronteira acurácia x latência por número de estágios do Gradient Boosting.
+
+Um clone do pipeline é treinado no split de treino do holdout (o mesmo de
+ml_pipeline_obesity.py: linhas deduplicadas com pesos e partição por grupo de
+hash, row_dedup.py) e `staged_predict_proba` percorre o conjunto de teste
+uma única vez, dando acurácia e log-loss para cada número de estágios. A
+latência (uma linha e lote) é medida em alguns pontos de truncamento, a
+fronteira de Pareto é salva em HTML (plotly) e, com --slo, o modelo de produção
+é truncado no menor número de estágios que atinge a acurácia exigida.
+
+Uso:
+    python stage_frontier.py [--modelo obesity_pipeline.pkl] [--pontos 5,10,20,30,50]
+    python stage_frontier.py --slo 0.97 [--max-log-loss 0.15] [--publicar]
+"""
+import argparse, copy, json, time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import log_loss
+from cv_store import fit_params
+from obesity_schema import load_features
+from row_dedup import DEDUP_MODES, holdout_split, prepare_rows
+
+FRONTIER_HTML = Path("stage_frontier.html")
+FRONTIER_JSON = Path("stage_frontier.json")
+TRUNCATED_PATH = Path("obesity_pipeline_truncated.pkl")
+
+
+def truncate_pipeline(pipe, n_stages):
+    """Cópia do pipeline com apenas os primeiros n_stages estágios do ensemble"""
+    clf = pipe.steps[-1][1]
+    if not 1 <= n_stages <= clf.n_estimators_:
+        raise ValueError(f"n_stages deve estar entre 1 e {clf.n_estimators_}")
+    short = copy.deepcopy(clf)
+    short.estimators_ = short.estimators_[:n_stages]
+    short.train_score_ = short.train_score_[:n_stages]
+    if hasattr(short, "oob_improvement_"):  # só existe com subsample < 1
+        short.oob_improvement_ = short.oob_improvement_[:n_stages]
+    short.n_estimators = short.n_estimators_ = n_stages
+    return type(pipe)(pipe.steps[:-1] + [(pipe.steps[-1][0], short)])
+
+
+def staged_metrics(pipe, X, y, sample_weight=None, groups=None, test_size=0.2, seed=42):
+    """Acurácia e log-loss (ponderados) no holdout para cada número de estágios (uma passada)"""
+    tr, te = holdout_split(X, y, groups, test_size=test_size, seed=seed)
+    w_train, w_test = (None, None) if sample_weight is None else (sample_weight[tr], sample_weight[te])
+    model = clone(pipe)
+    model.fit(X.iloc[tr], y.iloc[tr], **fit_params(model, w_train))
+    clf = model.steps[-1][1]
+    Z_test = model[:-1].transform(X.iloc[te])
+    y_true = np.asarray(y.iloc[te], dtype=object)
+    rows = []
+    for k, proba in enumerate(clf.staged_predict_proba(Z_test), start=1):
+        rows.append({
+            "estagios": k,
+            "acuracia": float(np.average(clf.classes_[proba.argmax(axis=1)] == y_true, weights=w_test)),
+            "log_loss": log_loss(y_true, proba, labels=clf.classes_, sample_weight=w_test),
+        })
+    return pd.DataFrame(rows)
+
+
+def measure_latency(pipe, X, n_stages, repeat=50, batch_rows=10_000):
+    """Mediana (ms) de predict_proba de uma linha e de um lote, por ponto de truncamento"""
+    row = X.iloc[[0]]
+    batch = X.sample(batch_rows, replace=True, random_state=0)
+    out = []
+    for k in n_stages:
+        model = truncate_pipeline(pipe, k)
+        model.predict_proba(row)
+        per_row, per_batch = [], []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            model.predict_proba(row)
+            per_row.append(time.perf_counter() - t0)
+        for _ in range(5):
+            t0 = time.perf_counter()
+            model.predict_proba(batch)
+            per_batch.append(time.perf_counter() - t0)
+        out.append({"estagios": k, "linha_ms": np.median(per_row) * 1000,
+                    "lote_ms": np.median(per_batch) * 1000})
+    return pd.DataFrame(out)
+
+
+def pareto_front(points, cost="lote_ms", gain="acuracia"):
+    """Marca os pontos não dominados (nenhum outro é mais barato e ao menos tão preciso)"""
+    order = points.sort_values([cost, gain], ascending=[True, False])
+    best, keep = -np.inf, []
+    for idx, g in zip(order.index, order[gain]):
+        if g > best:
+            keep.append(idx)
+            best = g
+    return points.index.isin(keep)
+
+
+def plot_frontier(curve, points, path=FRONTIER_HTML):
+    """Curva acurácia/log-loss por estágio + pontos de latência com a fronteira destacada"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=1, cols=2, subplot_titles=("Holdout por número de estágios",
+                                                        "Acurácia x latência (lote)"),
+                        specs=[[{"secondary_y": True}, {}]])
+    fig.add_trace(go.Scatter(x=curve["estagios"], y=curve["acuracia"], name="Acurácia"), row=1, col=1)
+    fig.add_trace(go.Scatter(x=curve["estagios"], y=curve["log_loss"], name="Log-loss",
+                             line=dict(dash="dot")), row=1, col=1, secondary_y=True)
+    front = points[points["pareto"]].sort_values("lote_ms")
+    fig.add_trace(go.Scatter(x=points["lote_ms"], y=points["acuracia"], mode="markers+text",
+                             text=points["estagios"], textposition="top center",
+                             name="Pontos medidos"), row=1, col=2)
+    fig.add_trace(go.Scatter(x=front["lote_ms"], y=front["acuracia"], mode="lines",
+                             name="Fronteira de Pareto"), row=1, col=2)
+    fig.update_xaxes(title_text="Estágios", row=1, col=1)
+    fig.update_xaxes(title_text="Latência do lote (ms)", row=1, col=2)
+    fig.update_yaxes(title_text="Acurácia", row=1, col=1)
+    fig.update_yaxes(title_text="Log-loss", row=1, col=1, secondary_y=True)
+    fig.write_html(path, include_plotlyjs="cdn")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fronteira acurácia x latência por estágios do ensemble")
+    parser.add_argument("--modelo", default="obesity_pipeline.pkl")
+    parser.add_argument("--dados", default="Obesity.csv")
+    parser.add_argument("--pontos", default=None,
+                        help="estágios onde medir latência (ex.: 5,10,20,30,50); padrão: 6 pontos até o total")
+    parser.add_argument("--slo", type=float, default=None,
+                        help="acurácia mínima no holdout; exporta o modelo truncado no menor número de estágios")
+    parser.add_argument("--max-log-loss", type=float, default=None,
+                        help="log-loss máximo no holdout (evita truncar até probabilidades mal calibradas)")
+    parser.add_argument("--publicar", action="store_true", help="publica o modelo truncado no registro")
+    parser.add_argument("--duplicatas", choices=DEDUP_MODES, default="pesos",
+                        help="tratamento das linhas repetidas (o mesmo usado no treino do modelo)")
+    args = parser.parse_args()
+
+    pipe = joblib.load(args.modelo)
+    if not hasattr(pipe, "steps"):
+        raise SystemExit(f"{args.modelo} não é um Pipeline (ensemble dos folds?): a truncagem exige o refit único")
+    X, y = load_features(args.dados)
+    X, y, sample_weight, groups, _ = prepare_rows(X, y, args.duplicatas)
+    n_total = pipe.steps[-1][1].n_estimators_
+
+    curve = staged_metrics(pipe, X, y, sample_weight, groups)
+    if args.pontos:
+        pontos = sorted({int(p) for p in args.pontos.split(",") if 1 <= int(p) <= n_total})
+    else:
+        pontos = sorted(set(np.linspace(1, n_total, 6).round().astype(int)))
+    points = measure_latency(pipe, X, pontos).merge(curve, on="estagios")
+    points["pareto"] = pareto_front(points)
+    print(points.round(4).to_string(index=False))
+    print("Gráfico salvo em", plot_frontier(curve, points).resolve())
+
+    report = {"modelo": args.modelo, "estagios_total": int(n_total),
+              "curva": curve.to_dict(orient="records"), "pontos": points.to_dict(orient="records")}
+    if args.slo is not None:
+        ok = curve[curve["acuracia"] >= args.slo]
+        if args.max_log_loss is not None:
+            ok = ok[ok["log_loss"] <= args.max_log_loss]
+        if ok.empty:
+            raise SystemExit(f"Nenhum número de estágios atinge o SLO (acurácia máxima "
+                             f"{curve['acuracia'].max():.4f}, menor log-loss {curve['log_loss'].min():.4f})")
+        k = int(ok["estagios"].iloc[0])
+        joblib.dump(truncate_pipeline(pipe, k), TRUNCATED_PATH)
+        report["exportado"] = {"estagios": k, "acuracia_holdout": float(ok["acuracia"].iloc[0]),
+                               "slo": args.slo, "max_log_loss": args.max_log_loss,
+                               "log_loss_holdout": float(ok["log_loss"].iloc[0]), "arquivo": str(TRUNCATED_PATH)}
+        print(f"SLO {args.slo}: {k} de {n_total} estágios (acurácia {ok['acuracia'].iloc[0]:.4f}) "
+              f"-> {TRUNCATED_PATH.resolve()}")
+        if args.publicar:
+            from model_registry import publish
+            print("Versão publicada no registro:", publish(TRUNCATED_PATH))
+    FRONTIER_JSON.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Ingestão out-of-core de dados rotulados para o treino.
+
+Lê arquivos muito maiores que a RAM em chunks com dtypes explícitos, traduz e
+valida cada chunk, mantém uma amostra reservatório estratificada por classe de
+`Obesidade` (cotas proporcionais às linhas vistas de cada classe) dentro de um
+orçamento de memória e ajusta as estatísticas do StandardScaler com partial_fit
+sobre *todas* as linhas válidas (numéricas e features derivadas de IMC, com os
+nomes em feature_names_in_ para casar com o bloco "num" do pipeline).
+
+Usado por ml_pipeline_obesity.py com a opção --memoria-mb.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from obesity_schema import translate_frame, target_col, target_map_pt, numeric_features
+from obesity_features import derived_features
+from batch_scoring import validate_chunk
+
+CHUNK_ROWS = 100_000
+
+# Dtypes explícitos das colunas originais: evita inferência (e upcasts) por chunk
+RAW_DTYPES = {
+    "Gender": "str", "Age": "float64", "Height": "float64", "Weight": "float64",
+    "family_history": "str", "FAVC": "str", "FCVC": "float64", "NCP": "float64",
+    "CAEC": "str", "SMOKE": "str", "CH2O": "float64", "SCC": "str", "FAF": "float64",
+    "TUE": "float64", "CALC": "str", "MTRANS": "str", "Obesity": "str",
+}
+
+
+class StratifiedReservoir:
+    """Amostra reservatório estratificada por classe, com alocação proporcional
+
+    Cada linha recebe uma chave U(0, 1) e só as `capacity` menores chaves do
+    arquivo ficam guardadas (bottom-k: amostra aleatória simples de todas as
+    linhas vistas). Em frame() cada classe recebe uma cota proporcional às suas
+    linhas vistas (maiores restos), preenchida pelas suas menores chaves: a
+    amostra mantém a distribuição de classes do arquivo em vez de igualá-las.
+    """
+
+    def __init__(self, capacity, seed=42):
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        self.samples = {}   # classe -> DataFrame
+        self.keys = {}      # classe -> chave de cada linha guardada
+        self.seen = {}      # classe -> linhas vistas
+        self.threshold = 1.0  # maior chave que ainda pode entrar na amostra
+
+    def add(self, label, rows):
+        keys = self.rng.random(len(rows))
+        self.seen[label] = self.seen.get(label, 0) + len(rows)
+        enter = np.flatnonzero(keys <= self.threshold)
+        rows, keys = rows.iloc[enter], keys[enter]
+        if label in self.samples:
+            rows = pd.concat([self.samples[label], rows], ignore_index=True)
+            keys = np.concatenate([self.keys[label], keys])
+        self.samples[label], self.keys[label] = rows.reset_index(drop=True), keys
+        self._prune()
+
+    def _prune(self):
+        """Mantém só as `capacity` menores chaves, somando todas as classes"""
+        all_keys = np.concatenate(list(self.keys.values()))
+        if len(all_keys) <= self.capacity:
+            return
+        self.threshold = np.partition(all_keys, self.capacity - 1)[self.capacity - 1]
+        for label, keys in self.keys.items():
+            keep = np.flatnonzero(keys <= self.threshold)
+            if len(keep) < len(keys):
+                self.samples[label] = self.samples[label].iloc[keep].reset_index(drop=True)
+                self.keys[label] = keys[keep]
+
+    def quotas(self):
+        """Linhas por classe na amostra final: proporcionais às vistas, somando a capacidade
+
+        Uma classe com menos linhas guardadas que a cota (flutuação da amostra
+        aleatória) fica com todas as que tem.
+        """
+        total = sum(self.seen.values())
+        n = min(self.capacity, total)
+        exact = {k: n * v / total for k, v in self.seen.items()}
+        quota = {k: int(e) for k, e in exact.items()}
+        for k in sorted(exact, key=lambda k: quota[k] - exact[k])[:n - sum(quota.values())]:
+            quota[k] += 1
+        return {k: min(q, len(self.keys[k])) for k, q in quota.items()}
+
+    def frame(self):
+        parts = [self.samples[k].iloc[np.sort(np.argsort(self.keys[k])[:q])]
+                 for k, q in self.quotas().items()]
+        return pd.concat(parts, ignore_index=True)
+
+
+def iter_raw_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Chunks do arquivo bruto: CSV com dtypes explícitos, ou Parquet/Arrow em lotes"""
+    suffix = str(path).lower().rsplit(".", 1)[-1]
+    if suffix in ("parquet", "arrow", "feather", "ipc"):
+        from arrow_io import iter_batches
+        for batch in iter_batches(path, chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, dtype=RAW_DTYPES, chunksize=chunk_rows)
+
+
+def stream_ingest(path, budget_mb=512, chunk_rows=CHUNK_ROWS, seed=42):
+    """Percorre o arquivo uma vez; retorna (amostra traduzida, scaler, relatório)
+
+    A amostra mantém a coluna alvo original (`Obesidade`), no mesmo formato que
+    o pipeline de treino recebe do pd.read_csv + tradução.
+    """
+    scaler = StandardScaler()
+    reservoir = None
+    report = {"linhas_lidas": 0, "linhas_invalidas": 0, "por_classe": {}}
+
+    for chunk in iter_raw_chunks(path, chunk_rows):
+        chunk = translate_frame(chunk)
+        report["linhas_lidas"] += len(chunk)
+        valid, _ = validate_chunk(chunk)
+        valid &= chunk[target_col].isin(list(target_map_pt)).to_numpy()
+        report["linhas_invalidas"] += int((~valid).sum())
+        chunk = chunk.loc[valid].reset_index(drop=True)
+        if chunk.empty:
+            continue
+
+        num = chunk[numeric_features].astype(float)
+        scaler.partial_fit(num.assign(**derived_features(num)))
+
+        if reservoir is None:
+            # Orçamento em linhas estimado pelo tamanho real do primeiro chunk
+            bytes_per_row = chunk.memory_usage(deep=True).sum() / len(chunk)
+            capacity = int(budget_mb * 2**20 / bytes_per_row)
+            reservoir = StratifiedReservoir(max(capacity, 1), seed)
+            report["capacidade"] = reservoir.capacity
+
+        for label, rows in chunk.groupby(target_col, sort=False):
+            reservoir.add(label, rows.reset_index(drop=True))
+
+    if reservoir is None:
+        raise ValueError(f"Nenhuma linha válida encontrada em {path}")
+    quotas = reservoir.quotas()
+    report["por_classe"] = {k: {"vistas": v, "amostradas": quotas[k]} for k, v in reservoir.seen.items()}
+    return reservoir.frame(), scaler, report
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de treino endereçado por conteúdo.
+
+Cada etapa cara do ml_pipeline_obesity.py (holdout, fit final, destilação) é
+gravada em .train_cache/ sob uma chave que combina
+    hash dos dados + hash dos parâmetros do pipeline (inclui o código dos módulos
+    do projeto que ele usa, cv_store.code_hash) + versões das bibliotecas
+    + código-fonte da função que calcula a etapa e dos módulos do projeto que
+      ela usa (cv_store.referenced_modules) + partes extras da etapa
+de modo que rodar o script de novo, sem mudar o CSV, o pipeline ou o código,
+apenas recarrega os artefatos. Os folds da CV têm cache próprio (cv_store.py).
+"""
+import inspect, os, shutil, tempfile, time
+from pathlib import Path
+
+import joblib
+
+from cv_store import data_hash, library_versions, params_hash, referenced_modules, source_hash
+from model_registry import FILE_MODE
+
+TRAIN_CACHE_DIR = Path(".train_cache")
+
+
+class TrainCache:
+    """Artefatos por etapa, invalidados por qualquer mudança em dados, parâmetros, código ou versões"""
+
+    def __init__(self, X, y, pipe, cache_dir=TRAIN_CACHE_DIR, sample_weight=None, groups=None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.base = (data_hash(X, y), params_hash(pipe), library_versions())
+        if sample_weight is not None or groups is not None:
+            # Pesos das linhas deduplicadas e grupos das partições mudam os fits
+            self.base += (joblib.hash((sample_weight, groups)),)
+        self.log = []    # (etapa, acerto, segundos)
+        self.paths = {}  # etapa -> arquivo no cache
+
+    def key(self, stage, compute, extra=()):
+        try:
+            source = inspect.getsource(compute)
+        except (OSError, TypeError):
+            source = getattr(compute, "__qualname__", repr(compute))
+        modules = source_hash(referenced_modules(compute))
+        return f"{stage}-{joblib.hash((self.base, source, modules, extra))[:16]}"
+
+    def get_or_compute(self, stage, compute, extra=(), compute_missing=True):
+        """Retorna (valor, veio_do_cache); `compute()` só roda quando a chave é nova
+
+        Com compute_missing=False uma etapa fora do cache não é calculada e o
+        valor é None (ex.: --somente-exportar reaproveita, mas não recalcula).
+        """
+        path = self.paths[stage] = self.cache_dir / f"{self.key(stage, compute, extra)}.joblib"
+        t0 = time.perf_counter()
+        if path.exists():
+            value = joblib.load(path)
+            self.log.append((stage, True, time.perf_counter() - t0))
+            return value, True
+        if not compute_missing:
+            self.log.append((stage, None, 0.0))
+            return None, False
+        value = compute()
+        # Escrita atômica: uma execução interrompida nunca deixa entrada corrompida
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-")
+        os.close(fd)
+        joblib.dump(value, tmp)
+        os.chmod(tmp, FILE_MODE)  # mkstemp cria 0600
+        os.replace(tmp, path)
+        self.log.append((stage, False, time.perf_counter() - t0))
+        return value, False
+
+    def export(self, stage, dest):
+        """Copia o artefato da etapa byte a byte para `dest`
+
+        Repetir joblib.dump no mesmo modelo não gera bytes idênticos (memo do
+        pickle), e o hash do arquivo é a versão publicada no registro: a cópia
+        garante a mesma versão em toda execução sem mudanças.
+        """
+        dest = Path(dest)
+        fd, tmp = tempfile.mkstemp(dir=dest.resolve().parent, prefix=".tmp-")
+        os.close(fd)
+        shutil.copyfile(self.paths[stage], tmp)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, dest)
+        return dest
+
+    def summary(self):
+        status = {True: "cache", False: "calculado", None: "pulado"}
+        return ", ".join(f"{s}: {status[hit]} ({sec:.1f}s)" for s, hit, sec in self.log)